@@ -0,0 +1,84 @@
+import json
+import subprocess
+import sys
+from typing import Dict, Tuple
+
+REPEAT = 5
+
+# run in a fresh interpreter, so nothing is imported already
+CONSTRUCT = """
+import json, sys, time
+from anchorpy import Wallet
+from solders.keypair import Keypair
+from solders.pubkey import Pubkey
+from solana.rpc.async_api import AsyncClient
+connection = AsyncClient("http://localhost:8899")
+wallet = Wallet(Keypair())
+start = time.perf_counter()
+from futarchy.client import ProposalClient
+from futarchy.portfolio import PortfolioClient
+imported = time.perf_counter()
+client = ProposalClient(connection, wallet, Pubkey.default())
+portfolio = PortfolioClient(connection, wallet, [Pubkey.default()])
+constructed = time.perf_counter()
+lazy = client._programs is None and portfolio._programs is None
+client.programs
+programs = time.perf_counter()
+print(json.dumps({
+    "import": imported - start,
+    "construct": constructed - imported,
+    "programs": programs - constructed,
+    "lazy": lazy,
+}))
+"""
+
+LOADED = """
+import json, sys
+import {module}
+print(json.dumps([name for name in ("anchorpy", "numpy", "solana", "solders") if name in sys.modules]))
+"""
+
+
+def python(code: str, *flags: str) -> Tuple[str, str]:
+    result = subprocess.run([sys.executable, *flags, "-c", code], capture_output=True, text=True, check=True)
+    return result.stdout, result.stderr
+
+
+def importtime(module: str) -> Dict[str, int]:
+    # cumulative microseconds by module, from python -X importtime
+    _, stderr = python(f"import {module}", "-X", "importtime")
+    cumulative = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, total, name = line[len("import time:"):].split("|")
+        cumulative[name.strip()] = int(total)
+    return cumulative
+
+
+def main():
+    for module in ("futarchy", "futarchy.portfolio"):
+        loaded = json.loads(python(LOADED.format(module=module))[0])
+        print(f"loaded by import {module}: {', '.join(loaded) or 'nothing heavy'}")
+        if "anchorpy" in loaded or "numpy" in loaded:
+            raise AssertionError(f"import {module} pulled in anchorpy or numpy")
+
+    print(f"{'module':<24} {'import ms':>10}")
+    for module in ("futarchy", "futarchy.client", "futarchy.portfolio", "anchorpy", "numpy"):
+        total = min(importtime(module)[module] for _ in range(REPEAT))
+        print(f"{module:<24} {total / 1e3:10.1f}")
+
+    runs = [json.loads(python(CONSTRUCT)[0]) for _ in range(REPEAT)]
+    if not all(run["lazy"] for run in runs):
+        raise AssertionError("constructing a client built the anchorpy Programs")
+    print(f"{'first use':<24} {'ms':>10}")
+    for key, name in (
+        ("import", "import clients"),
+        ("construct", "construct clients"),
+        ("programs", "first .programs"),
+    ):
+        print(f"{name:<24} {min(run[key] for run in runs) * 1e3:10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import asyncio
+import timeit
+
+from anchorpy import Context, Wallet
+from solders.keypair import Keypair
+from spl.token.constants import TOKEN_PROGRAM_ID
+from spl.token.instructions import get_associated_token_address
+
+from futarchy.client import OutcomeType, ProposalClient, TokenType
+from futarchy.math import get_output_tokens_buy, get_output_tokens_sell
+from futarchy.simulator import MarketSimulator, SimulatedProposalClient
+from futarchy.types import SwapArgs, SwapType
+
+NUMBER = 2000
+REPEAT = 5
+
+
+# the anchorpy path the templates replaced, accounts derived on every call
+
+def anchorpy_vault_accounts(client: ProposalClient) -> dict:
+    vault = client.base_vault
+    pass_token_mint = client.base_pass_token_mint
+    fail_token_mint = client.base_fail_token_mint
+    return {
+        "vault": vault,
+        "conditional_on_finalize_token_mint": pass_token_mint,
+        "conditional_on_revert_token_mint": fail_token_mint,
+        "vault_underlying_token_account": get_associated_token_address(vault, client.base_underlying_token_mint),
+        "authority": client.authority,
+        "user_conditional_on_finalize_token_account": get_associated_token_address(client.authority, pass_token_mint),
+        "user_conditional_on_revert_token_account": get_associated_token_address(client.authority, fail_token_mint),
+        "user_underlying_token_account": get_associated_token_address(client.authority, client.base_underlying_token_mint),
+        "token_program": TOKEN_PROGRAM_ID,
+    }
+
+def anchorpy_swap_accounts(client: ProposalClient, amm) -> dict:
+    return {
+        "user": client.authority,
+        "amm": client.pass_amm,
+        "user_base_account": get_associated_token_address(client.authority, amm.base_mint),
+        "user_quote_account": get_associated_token_address(client.authority, amm.quote_mint),
+        "vault_ata_base": get_associated_token_address(client.pass_amm, amm.base_mint),
+        "vault_ata_quote": get_associated_token_address(client.pass_amm, amm.quote_mint),
+        "token_program": TOKEN_PROGRAM_ID,
+    }
+
+def anchorpy_mint_ix(client: ProposalClient, amount: int):
+    return client.vault_program.instruction["mint_conditional_tokens"](
+        amount,
+        ctx=Context(accounts=anchorpy_vault_accounts(client)),
+    )
+
+def anchorpy_buy_ix(client: ProposalClient, amount: int, amm):
+    min_output = get_output_tokens_buy(amount, amm, 10)
+    return client.amm_program.instruction["swap"](
+        SwapArgs(SwapType.Buy(), amount, min_output),
+        ctx=Context(accounts=anchorpy_swap_accounts(client, amm)),
+    )
+
+def anchorpy_sell_ix(client: ProposalClient, amount: int, amm):
+    min_output = get_output_tokens_sell(amount, amm, 10)
+    return client.amm_program.instruction["swap"](
+        SwapArgs(SwapType.Sell(), amount, min_output),
+        ctx=Context(accounts=anchorpy_swap_accounts(client, amm)),
+    )
+
+
+def rate(fn) -> float:
+    return NUMBER / min(timeit.repeat(fn, number=NUMBER, repeat=REPEAT))
+
+
+async def make_client() -> ProposalClient:
+    sim = MarketSimulator(seed=0)
+    client = SimulatedProposalClient(sim, Wallet(Keypair()), sim.create_proposal())
+    await client.get_proposal_info()
+    return client
+
+
+def main():
+    client = asyncio.run(make_client())
+    amm = client.pass_amm_account
+    cases = [
+        (
+            "get_buy_ix",
+            lambda: anchorpy_buy_ix(client, 10 ** 6, amm),
+            lambda: client.get_buy_ix(10 ** 6, OutcomeType.PASS, amm),
+        ),
+        (
+            "get_sell_ix",
+            lambda: anchorpy_sell_ix(client, 10 ** 9, amm),
+            lambda: client.get_sell_ix(10 ** 9, OutcomeType.PASS, amm),
+        ),
+        (
+            "get_mint_conditional_tokens_ix",
+            lambda: anchorpy_mint_ix(client, 10 ** 6),
+            lambda: client.get_mint_conditional_tokens_ix(10 ** 6, TokenType.BASE),
+        ),
+    ]
+
+    print(f"{'instruction':<32} {'anchorpy/s':>12} {'template/s':>12} {'speedup':>8}")
+    for name, anchorpy, template in cases:
+        if anchorpy() != template():
+            raise AssertionError(f"{name}: the template and anchorpy instructions differ")
+        before = rate(anchorpy)
+        after = rate(template)
+        print(f"{name:<32} {before:12.0f} {after:12.0f} {after / before:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
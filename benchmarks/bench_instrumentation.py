@@ -0,0 +1,163 @@
+import asyncio
+import base64
+import json
+import threading
+import time
+import timeit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from anchorpy import Wallet
+from solders.keypair import Keypair
+from solders.pubkey import Pubkey
+from solders.signature import Signature
+from solana.rpc.async_api import AsyncClient
+
+from futarchy.client import ProposalClient
+from futarchy.compute_units import ComputeUnitEstimator
+from futarchy.instrumentation import Hook, Instrumentation, span
+from futarchy.simulator import MarketSimulator
+
+TRADES = 500
+REPEAT = 5
+SPANS = 1_000_000
+
+
+def account_json(account) -> dict:
+    if account is None:
+        return None
+    return {
+        "data": [base64.b64encode(account.data).decode(), "base64"],
+        "executable": account.executable,
+        "lamports": account.lamports,
+        "owner": str(account.owner),
+        "rentEpoch": account.rent_epoch,
+        "space": len(account.data),
+    }
+
+
+class StubRpc:
+    # a local json-rpc server answering from accounts made by the simulator, so
+    # requests go through the http client and the response parsing like they
+    # would against a node, sent transactions are only acknowledged
+    def __init__(self, sim: MarketSimulator):
+        self.sim = sim
+        self.accounts = {}
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # the headers and the body are written separately
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                body = json.dumps({"jsonrpc": "2.0", "id": request["id"], "result": stub.answer(request)}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = "http://127.0.0.1:%d" % self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+
+    def account(self, address: str) -> dict:
+        if address not in self.accounts:
+            self.accounts[address] = account_json(self.sim.get_account(Pubkey.from_string(address)))
+        return self.accounts[address]
+
+    def answer(self, request: dict):
+        method, params = request["method"], request.get("params")
+        context = {"slot": self.sim.slot}
+        if method == "getAccountInfo":
+            return {"context": context, "value": self.account(params[0])}
+        if method == "getMultipleAccounts":
+            return {"context": context, "value": [self.account(address) for address in params[0]]}
+        if method == "getLatestBlockhash":
+            blockhash = str(self.sim.get_blockhash())
+            return {"context": context, "value": {"blockhash": blockhash, "lastValidBlockHeight": self.sim.slot + 150}}
+        if method == "simulateTransaction":
+            return {"context": context, "value": {"err": None, "logs": [], "unitsConsumed": 60_000}}
+        if method == "sendTransaction":
+            return str(Signature.default())
+        raise ValueError(f"unexpected method {method}")
+
+
+async def make_client(rpc: StubRpc) -> ProposalClient:
+    client = ProposalClient(AsyncClient(rpc.url), Wallet(Keypair()), rpc.sim.create_proposal())
+    await client.get_proposal_info()
+    return client
+
+
+async def trade_seconds(client: ProposalClient, instrumentation) -> float:
+    # fetch the amm, quote, build, size, compile, sign and send a buy, per trade
+    client.instrumentation = instrumentation
+    start = time.perf_counter()
+    for _ in range(TRADES):
+        ix = await client.get_buy_pass_ix(10 ** 6)
+        await client.send_ix(ix, compute_unit_limit=None)
+    return (time.perf_counter() - start) / TRADES
+
+
+def span_seconds(instrumentation) -> float:
+    def run():
+        with span(instrumentation, "build_ix"):
+            pass
+    return min(timeit.repeat(run, number=SPANS, repeat=REPEAT)) / SPANS
+
+
+def bare_seconds() -> float:
+    def run():
+        pass
+    return min(timeit.repeat(run, number=SPANS, repeat=REPEAT)) / SPANS
+
+
+async def main():
+    rpc = StubRpc(MarketSimulator(seed=0))
+    client = await make_client(rpc)
+    configs = [
+        ("off", lambda: None),
+        ("histograms", lambda: Instrumentation()),
+        ("histograms + hook", lambda: Instrumentation([Hook()])),
+    ]
+
+    print(f"per span, {SPANS} spans")
+    bare = bare_seconds()
+    print(f"{'no span':<24} {bare * 1e9:10.1f} ns")
+    for name, make in configs:
+        print(f"{name:<24} {(span_seconds(make()) - bare) * 1e9:10.1f} ns overhead")
+
+    print(f"per trade, {TRADES} buys against {rpc.url}")
+    # warms the connection pool and the compute unit estimates before anything is timed
+    await trade_seconds(client, None)
+    # configs take turns within each repeat so drift hits them all alike
+    instrumentations = [make() for _, make in configs]
+    best = [float("inf")] * len(configs)
+    for _ in range(REPEAT):
+        for i, instrumentation in enumerate(instrumentations):
+            best[i] = min(best[i], await trade_seconds(client, instrumentation))
+    for (name, _), instrumentation, seconds in zip(configs, instrumentations, best):
+        spans = sum(count for count, _, _ in instrumentation.summary().values()) // (TRADES * REPEAT) if instrumentation else 0
+        print(f"{name:<24} {seconds * 1e6:10.1f} us {(seconds / best[0] - 1) * 100:+6.2f}%  {spans} spans/trade")
+
+    # a fresh run so the estimator's one simulation shows up too
+    instrumentation = Instrumentation()
+    client.compute_unit_estimator = ComputeUnitEstimator()
+    await trade_seconds(client, instrumentation)
+    print(f"spans over {TRADES} buys")
+    print(f"{'span':<16} {'count':>8} {'p50 us':>10} {'p99 us':>10}")
+    for name, (count, p50, p99) in instrumentation.summary().items():
+        print(f"{name:<16} {count:8d} {p50 * 1e6:10.1f} {p99 * 1e6:10.1f}")
+
+    await client.connection.close()
+    rpc.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,71 @@
+import timeit
+
+from solders.pubkey import Pubkey
+
+from futarchy.math import calculate_amm_output_exact, apply_slippage, get_quote_grid_buy
+from futarchy.types import Amm, TwapOracle
+
+SIZES = 5000
+SNAPSHOTS = 100
+
+
+def make_amm(base_amount: int, quote_amount: int) -> Amm:
+    oracle = TwapOracle(
+        last_updated_slot=0,
+        last_price=0,
+        last_observation=0,
+        aggregator=0,
+        max_observation_change_per_update=0,
+        initial_observation=0,
+    )
+    return Amm(
+        bump=0,
+        created_at_slot=0,
+        lp_mint=Pubkey.default(),
+        base_mint=Pubkey.default(),
+        quote_mint=Pubkey.default(),
+        base_mint_decimals=9,
+        quote_mint_decimals=6,
+        base_amount=base_amount,
+        quote_amount=quote_amount,
+        oracle=oracle,
+    )
+
+
+def bench(name: str, fn, number: int):
+    seconds = min(timeit.repeat(fn, number=number, repeat=5)) / number
+    print(f"{name:<40} {seconds * 1e3:10.3f} ms")
+    return seconds
+
+
+def main():
+    amm = make_amm(10 ** 15, 2 * 10 ** 12)
+    sizes = [10 ** 6 + i * 10 ** 6 for i in range(SIZES)]
+    snapshots = [make_amm(10 ** 15 + i * 10 ** 12, 2 * 10 ** 12 - i * 10 ** 9) for i in range(SNAPSHOTS)]
+
+    def exact():
+        return [apply_slippage(calculate_amm_output_exact(size, amm.quote_amount, amm.base_amount), 30) for size in sizes]
+
+    def grid():
+        return get_quote_grid_buy(sizes, amm)
+
+    def exact_snapshots():
+        return [
+            [apply_slippage(calculate_amm_output_exact(size, snapshot.quote_amount, snapshot.base_amount), 30) for size in sizes]
+            for snapshot in snapshots
+        ]
+
+    def grid_snapshots():
+        return get_quote_grid_buy(sizes, snapshots)
+
+    print(f"{SIZES} sizes, {SNAPSHOTS} snapshots")
+    loop = bench("exact, one amm", exact, 20)
+    vectorized = bench("grid, one amm", grid, 20)
+    print(f"speedup {loop / vectorized:.1f}x")
+    loop = bench("exact, snapshots", exact_snapshots, 1)
+    vectorized = bench("grid, snapshots", grid_snapshots, 1)
+    print(f"speedup {loop / vectorized:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
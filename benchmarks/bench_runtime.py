@@ -0,0 +1,98 @@
+import asyncio
+import time
+from typing import List, Tuple
+
+from anchorpy import Wallet
+from solders.keypair import Keypair
+
+from futarchy.runtime import Strategy, StrategyRuntime
+from futarchy.simulator import MarketSimulator, SimulatedProposalClient
+
+PROPOSALS = 50
+UPDATES = 200_000
+# a slot tick and a fill every this many amm updates
+TICK_EVERY = 20
+FILL_EVERY = 100
+# what one callback costs the strategy
+CALLBACK_SECONDS = 0.0005
+
+
+class SlowStrategy(Strategy):
+    def __init__(self):
+        self.amm_updates = 0
+        self.ticks = 0
+        self.fills = 0
+
+    async def on_amm(self, client, event):
+        self.amm_updates += 1
+        await asyncio.sleep(CALLBACK_SECONDS)
+
+    async def on_slot(self, client, event):
+        self.ticks += 1
+        await asyncio.sleep(CALLBACK_SECONDS)
+
+    async def on_fill(self, client, event):
+        self.fills += 1
+
+
+async def make_clients() -> Tuple[MarketSimulator, List[SimulatedProposalClient]]:
+    sim = MarketSimulator(seed=0)
+    dao = sim.create_dao()
+    wallet = Wallet(Keypair())
+    clients = []
+    for _ in range(PROPOSALS):
+        client = SimulatedProposalClient(sim, wallet, sim.create_proposal(dao))
+        await client.get_proposal_info()
+        clients.append(client)
+    return sim, clients
+
+
+async def run(sim, clients, max_slot_lag) -> dict:
+    runtime = StrategyRuntime(clients, max_slot_lag=max_slot_lag)
+    strategy = SlowStrategy()
+    runtime.register(strategy)
+    runtime.start()
+    fills = 0
+    start = time.perf_counter()
+    for i in range(UPDATES):
+        # the feed runs ahead of the strategies, a new slot every tick
+        slot = i // TICK_EVERY
+        client = clients[i % PROPOSALS]
+        amm = client.pass_amm if i % 2 else client.fail_amm
+        runtime.on_amm(amm, slot, sim.amms[amm])
+        if i % TICK_EVERY == 0:
+            runtime.on_slot(slot)
+        if i % FILL_EVERY == 0:
+            runtime.on_fill(client.proposal, None, tag=i)
+            fills += 1
+        if i % PROPOSALS == 0:
+            await asyncio.sleep(0)
+    emitted = time.perf_counter() - start
+    await runtime.drain()
+    elapsed = time.perf_counter() - start
+    await runtime.stop()
+    if strategy.fills != fills:
+        raise AssertionError(f"{fills - strategy.fills} fills were dropped")
+    return {
+        "emit": UPDATES / emitted,
+        "elapsed": elapsed,
+        "dispatched": runtime.processed,
+        "dropped": runtime.dropped,
+        "fills": strategy.fills,
+    }
+
+
+async def main():
+    sim, clients = await make_clients()
+    print(f"{UPDATES} amm updates over {PROPOSALS} proposals, {CALLBACK_SECONDS * 1e3} ms per callback")
+    print(f"{'max_slot_lag':<14} {'events/s in':>12} {'drain s':>9} {'dispatched':>11} {'dropped':>9} {'fills':>7}")
+    for max_slot_lag in (None, 100, 10):
+        result = await run(sim, clients, max_slot_lag)
+        print(
+            f"{str(max_slot_lag):<14} {result['emit']:12.0f} {result['elapsed']:9.2f} "
+            f"{result['dispatched']:11d} {result['dropped']:9d} {result['fills']:7d}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1 +1,43 @@
+import importlib
 
+# submodules are imported on first access, so `import futarchy` doesn't pull in
+# solana, anchorpy or numpy
+SUBMODULES = {
+    "amm_cache",
+    "arbitrage",
+    "blockhash",
+    "client",
+    "composer",
+    "compute_units",
+    "confirmation",
+    "constants",
+    "decoders",
+    "discovery",
+    "fees",
+    "get_accounts",
+    "history",
+    "instructions",
+    "instrumentation",
+    "keypair",
+    "lookup_tables",
+    "math",
+    "portfolio",
+    "rpc",
+    "runtime",
+    "positions",
+    "sender",
+    "settlement",
+    "simulator",
+    "subscriptions",
+    "twap",
+    "types",
+    "wallets",
+}
+
+def __getattr__(name: str):
+    if name in SUBMODULES:
+        return importlib.import_module(f"{__name__}.{name}")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def __dir__():
+    return sorted(set(globals()) | SUBMODULES)
@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import time
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional
+from solders.pubkey import Pubkey
+from solana.rpc.commitment import Commitment, Processed
+
+from futarchy.decoders import decode_amm
+from futarchy.get_accounts import get_account_data_and_slot, get_multiple_accounts_data_and_slot
+from futarchy.subscriptions import subscribe_accounts
+from futarchy.types import Amm, DataAndSlot
+
+if TYPE_CHECKING:
+    from anchorpy import Program
+
+logger = logging.getLogger(__name__)
+
+
+class AmmCache:
+    def __init__(
+        self,
+        amm_program: "Program",
+        ws_url: str,
+        amms: Iterable[Pubkey] = (),
+        max_lag: float = 2.0,
+        commitment: Commitment = Processed,
+    ):
+        self.amm_program = amm_program
+        self.ws_url = ws_url
+        self.max_lag = max_lag
+        self.commitment = commitment
+        self.amms: Dict[Pubkey, Optional[DataAndSlot[Amm]]] = {amm: None for amm in amms}
+        self.last_slot = 0
+        self.last_slot_time = 0.0
+        # called with (pubkey, slot, amm) for every accepted update and with the
+        # slot for every slot notification
+        self.listeners: List[Callable[[Pubkey, int, Amm], None]] = []
+        self.slot_listeners: List[Callable[[int], None]] = []
+        self._task: Optional[asyncio.Task] = None
+        self._refetch_task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(subscribe_accounts(
+                self.ws_url,
+                list(self.amms),
+                self._on_account,
+                self._on_slot,
+                self.commitment,
+                on_connect=self._on_connect,
+            ))
+
+    async def stop(self):
+        for task in (self._task, self._refetch_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = None
+        self._refetch_task = None
+
+    async def add(self, amm: Pubkey):
+        if amm in self.amms:
+            return
+        self.amms[amm] = None
+        # subscriptions are made on connect, so resubscribe with the new set
+        if self._task is not None:
+            await self.stop()
+            self.start()
+
+    def _on_connect(self):
+        # updates while disconnected were missed, so nothing cached before the
+        # connect is served, get_amm reads over rpc until the refetch lands
+        for amm in self.amms:
+            self.amms[amm] = None
+        if self._refetch_task is None or self._refetch_task.done():
+            self._refetch_task = asyncio.create_task(self._refetch())
+
+    async def _refetch(self):
+        amms = list(self.amms)
+        try:
+            results = await get_multiple_accounts_data_and_slot(
+                self.amm_program.provider.connection,
+                amms,
+                [decode_amm] * len(amms),
+                self.commitment,
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("amm refetch failed: %r", e)
+            return
+        for amm, data_and_slot in zip(amms, results):
+            if data_and_slot is not None:
+                self.update(amm, data_and_slot)
+
+    def _on_account(self, pubkey: Pubkey, slot: int, data: bytes):
+        self.update(pubkey, DataAndSlot(slot, decode_amm(data)))
+
+    def _on_slot(self, slot: int):
+        self.last_slot = max(self.last_slot, slot)
+        self.last_slot_time = time.monotonic()
+        for listener in self.slot_listeners:
+            listener(slot)
+
+    def update(self, pubkey: Pubkey, data_and_slot: DataAndSlot[Amm]):
+        current = self.amms.get(pubkey)
+        if current is None or data_and_slot.slot >= current.slot:
+            self.amms[pubkey] = data_and_slot
+            for listener in self.listeners:
+                listener(pubkey, data_and_slot.slot, data_and_slot.data)
+
+    @property
+    def is_stale(self) -> bool:
+        # account notifications only arrive on change, so freshness is judged
+        # by the slot stream on the same socket
+        return time.monotonic() - self.last_slot_time > self.max_lag
+
+    def get(self, pubkey: Pubkey) -> Optional[DataAndSlot[Amm]]:
+        if self.is_stale:
+            return None
+        return self.amms.get(pubkey)
+
+    async def get_amm(self, pubkey: Pubkey) -> Amm:
+        data_and_slot = self.get(pubkey)
+        if data_and_slot is None:
+            data_and_slot = await get_account_data_and_slot(pubkey, self.amm_program, self.commitment, decode_amm)
+            if data_and_slot is None:
+                raise ValueError(f"amm account {pubkey} not found")
+            self.update(pubkey, data_and_slot)
+            data_and_slot = self.amms[pubkey]
+        return data_and_slot.data
@@ -0,0 +1,149 @@
+import asyncio
+from dataclasses import dataclass
+from enum import Enum
+from math import sqrt
+from typing import List, Optional, Tuple
+from solders.instruction import Instruction
+
+from futarchy.client import ProposalClient, OutcomeType
+from futarchy.math import MAX_BPS, FEE_BPS, calculate_amm_output_exact
+from futarchy.types import Amm
+
+class ArbitrageDirection(Enum):
+    # mint base, sell pass and fail base, merge conditional quote
+    MINT_SELL = 0
+    # mint quote, buy pass and fail base, merge conditional base
+    BUY_MERGE = 1
+
+@dataclass
+class ArbitrageOpportunity:
+    direction: ArbitrageDirection
+    # base atoms minted for MINT_SELL, quote atoms minted for BUY_MERGE
+    amount: int
+    pass_output: int
+    fail_output: int
+    # in quote atoms, with the underlying base valued at the spot price
+    profit: float
+
+
+def _optimal_leg_input(input_reserves: int, output_reserves: int, output_value: float, input_cost: float) -> float:
+    # maximises output_value * out(x) - input_cost * x for the fee-adjusted
+    # constant product curve out(x) = R_out * g x / (R_in + g x)
+    g = (MAX_BPS - FEE_BPS) / MAX_BPS
+    return (sqrt(output_value * input_reserves * output_reserves * g / input_cost) - input_reserves) / g
+
+def _crossing_input(
+    pass_input_reserves: int,
+    pass_output_reserves: int,
+    fail_input_reserves: int,
+    fail_output_reserves: int
+) -> Optional[float]:
+    # the input at which both legs return the same output
+    if pass_output_reserves == fail_output_reserves:
+        return None
+    g = (MAX_BPS - FEE_BPS) / MAX_BPS
+    numerator = fail_output_reserves * pass_input_reserves - pass_output_reserves * fail_input_reserves
+    return numerator / (pass_output_reserves - fail_output_reserves) / g
+
+def _solve(
+    pass_input_reserves: int,
+    pass_output_reserves: int,
+    fail_input_reserves: int,
+    fail_output_reserves: int,
+    output_value: float,
+    input_cost: float,
+    max_amount: int,
+) -> Optional[Tuple[int, int, int, float]]:
+    # profit(x) = output_value * min(out_pass(x), out_fail(x)) - input_cost * x is
+    # concave, so its maximum is at one leg's optimum or where the legs cross
+    candidates = [
+        _optimal_leg_input(pass_input_reserves, pass_output_reserves, output_value, input_cost),
+        _optimal_leg_input(fail_input_reserves, fail_output_reserves, output_value, input_cost),
+        _crossing_input(pass_input_reserves, pass_output_reserves, fail_input_reserves, fail_output_reserves),
+    ]
+    best = None
+    for candidate in candidates:
+        if candidate is None or candidate < 1:
+            continue
+        for amount in {min(int(candidate), max_amount), min(int(candidate) + 1, max_amount)}:
+            if amount < 1:
+                continue
+            try:
+                pass_output = calculate_amm_output_exact(amount, pass_input_reserves, pass_output_reserves)
+                fail_output = calculate_amm_output_exact(amount, fail_input_reserves, fail_output_reserves)
+            except ValueError:
+                continue
+            profit = output_value * min(pass_output, fail_output) - input_cost * amount
+            if best is None or profit > best[3]:
+                best = (amount, pass_output, fail_output, profit)
+    return best
+
+def find_arbitrage(
+    pass_amm: Amm,
+    fail_amm: Amm,
+    spot_price: float,
+    max_base_amount: int = 2 ** 63,
+    max_quote_amount: int = 2 ** 63,
+) -> Optional[ArbitrageOpportunity]:
+    # spot_price is the UI price of the underlying base in quote, the reference
+    # both cycles are valued against
+    price = spot_price * 10 ** pass_amm.quote_mint_decimals / 10 ** pass_amm.base_mint_decimals
+    if price <= 0:
+        raise ValueError("spot price must be positive")
+
+    opportunities = []
+    mint_sell = _solve(
+        pass_amm.base_amount, pass_amm.quote_amount,
+        fail_amm.base_amount, fail_amm.quote_amount,
+        1.0, price, max_base_amount,
+    )
+    if mint_sell is not None:
+        opportunities.append(ArbitrageOpportunity(ArbitrageDirection.MINT_SELL, *mint_sell))
+    buy_merge = _solve(
+        pass_amm.quote_amount, pass_amm.base_amount,
+        fail_amm.quote_amount, fail_amm.base_amount,
+        price, 1.0, max_quote_amount,
+    )
+    if buy_merge is not None:
+        opportunities.append(ArbitrageOpportunity(ArbitrageDirection.BUY_MERGE, *buy_merge))
+
+    opportunities = [o for o in opportunities if o.profit > 0]
+    if not opportunities:
+        return None
+    return max(opportunities, key=lambda o: o.profit)
+
+def get_arbitrage_ixs(
+    client: ProposalClient,
+    opportunity: ArbitrageOpportunity,
+    pass_amm: Amm,
+    fail_amm: Amm,
+    slippage_bps: int = 10,
+) -> List[Instruction]:
+    amount = opportunity.amount
+    if opportunity.direction == ArbitrageDirection.MINT_SELL:
+        mint_ix = client.get_mint_base_conditional_tokens_ix(amount)
+        pass_ix, pass_min_out = client.get_sell_ix(amount, OutcomeType.PASS, pass_amm, slippage_bps, True)
+        fail_ix, fail_min_out = client.get_sell_ix(amount, OutcomeType.FAIL, fail_amm, slippage_bps, True)
+        merge_ix = client.get_merge_quote_conditional_tokens_ix(min(pass_min_out, fail_min_out))
+    else:
+        mint_ix = client.get_mint_quote_conditional_tokens_ix(amount)
+        pass_ix, pass_min_out = client.get_buy_ix(amount, OutcomeType.PASS, pass_amm, slippage_bps, True)
+        fail_ix, fail_min_out = client.get_buy_ix(amount, OutcomeType.FAIL, fail_amm, slippage_bps, True)
+        merge_ix = client.get_merge_base_conditional_tokens_ix(min(pass_min_out, fail_min_out))
+    return [mint_ix, pass_ix, fail_ix, merge_ix]
+
+async def get_arbitrage(
+    client: ProposalClient,
+    spot_price: float,
+    slippage_bps: int = 10,
+    max_base_amount: int = 2 ** 63,
+    max_quote_amount: int = 2 ** 63,
+) -> Optional[Tuple[ArbitrageOpportunity, List[Instruction]]]:
+    pass_amm, fail_amm = await asyncio.gather(
+        client.get_amm(client.pass_amm),
+        client.get_amm(client.fail_amm),
+    )
+    opportunity = find_arbitrage(pass_amm, fail_amm, spot_price, max_base_amount, max_quote_amount)
+    if opportunity is None:
+        return None
+    return opportunity, get_arbitrage_ixs(client, opportunity, pass_amm, fail_amm, slippage_bps)
@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Optional
+from solders.hash import Hash
+from solana.rpc.async_api import AsyncClient
+from solana.rpc.commitment import Commitment, Confirmed
+
+logger = logging.getLogger(__name__)
+
+# average slot time, used to estimate the block height between refreshes
+SLOT_TIME = 0.4
+
+@dataclass
+class RecentBlockhash:
+    blockhash: Hash
+    last_valid_block_height: int
+
+
+async def fetch_recent_blockhash(connection: AsyncClient, commitment: Commitment = Confirmed) -> RecentBlockhash:
+    resp = await connection.get_latest_blockhash(commitment)
+    return RecentBlockhash(resp.value.blockhash, resp.value.last_valid_block_height)
+
+
+class BlockhashManager:
+    def __init__(
+        self,
+        connection: AsyncClient,
+        refresh_interval: float = 2.0,
+        expiry_margin: int = 30,
+        commitment: Commitment = Confirmed,
+    ):
+        self.connection = connection
+        self.refresh_interval = refresh_interval
+        # blocks before last_valid_block_height at which a hash is no longer handed out
+        self.expiry_margin = expiry_margin
+        self.commitment = commitment
+        self.latest: Optional[RecentBlockhash] = None
+        self.block_height = 0
+        self.block_height_time = 0.0
+        self._refreshing: Optional[asyncio.Task] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("blockhash refresh failed: %r", e)
+            await asyncio.sleep(self.refresh_interval)
+
+    async def refresh(self) -> RecentBlockhash:
+        # concurrent callers share one in-flight refresh, it's forgotten once
+        # done even if every caller was cancelled, so nobody gets an old result
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshing = asyncio.create_task(self._refresh())
+            self._refreshing.add_done_callback(self._on_refreshed)
+        return await asyncio.shield(self._refreshing)
+
+    def _on_refreshed(self, task: asyncio.Task):
+        if self._refreshing is task:
+            self._refreshing = None
+        # retrieved so a failure nobody awaited isn't logged as never retrieved
+        if not task.cancelled():
+            task.exception()
+
+    async def _refresh(self) -> RecentBlockhash:
+        blockhash, block_height = await asyncio.gather(
+            fetch_recent_blockhash(self.connection, self.commitment),
+            self.connection.get_block_height(self.commitment),
+        )
+        self.latest = blockhash
+        self.block_height = block_height.value
+        self.block_height_time = time.monotonic()
+        return blockhash
+
+    def estimated_block_height(self) -> int:
+        return self.block_height + int((time.monotonic() - self.block_height_time) / SLOT_TIME)
+
+    def is_expired(self, last_valid_block_height: int) -> bool:
+        return self.estimated_block_height() > last_valid_block_height - self.expiry_margin
+
+    def get_blockhash_nowait(self) -> Optional[RecentBlockhash]:
+        if self.latest is None or self.is_expired(self.latest.last_valid_block_height):
+            return None
+        return self.latest
+
+    async def get_blockhash(self) -> RecentBlockhash:
+        latest = self.get_blockhash_nowait()
+        if latest is None:
+            latest = await self.refresh()
+        return latest
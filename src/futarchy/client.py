@@ -2,26 +2,56 @@ from solders.pubkey import Pubkey
 from solders.transaction import VersionedTransaction
 from solders.instruction import Instruction
 from solders.message import MessageV0
+from solders.address_lookup_table_account import AddressLookupTableAccount
 from solders.hash import Hash
 from solders.signature import Signature
+from solders.transaction_status import TransactionStatus
+from solders.rpc.errors import SendTransactionPreflightFailureMessage
 from solders.rpc.responses import SendTransactionResp
 from solana.rpc.async_api import AsyncClient
 from solana.rpc.types import TxOpts
 from solana.rpc.commitment import Processed, Confirmed
+from solana.rpc.core import RPCException
 from solders.compute_budget import set_compute_unit_limit, set_compute_unit_price
 from spl.token.constants import TOKEN_PROGRAM_ID, ASSOCIATED_TOKEN_PROGRAM_ID
 from spl.token.instructions import get_associated_token_address, create_associated_token_account, close_account, CloseAccountParams
-from anchorpy import Program, Context, Idl, Provider, Wallet
 from pathlib import Path
-from typing import Optional, Iterable, Union, Tuple
+from typing import TYPE_CHECKING, Optional, Iterable, Union, Tuple, Dict, List, Sequence
+from dataclasses import dataclass
+from functools import lru_cache
 from enum import Enum
 
-import futarchy
-from futarchy.get_accounts import get_amm_account, get_conditional_vault_account, get_proposal_account    
+import asyncio
+import copy
+import time
+from futarchy.get_accounts import fetch_proposals_accounts, get_amm_account, get_dao_account
+from futarchy.amm_cache import AmmCache
+from futarchy.blockhash import BlockhashManager, RecentBlockhash, fetch_recent_blockhash
+from futarchy.confirmation import ConfirmationTracker, TransactionFailedError
+from futarchy.compute_units import ComputeUnitEstimator, MAX_COMPUTE_UNIT_LIMIT, is_compute_budget_exceeded
+from futarchy.fees import PriorityFeeOracle
+from futarchy.instrumentation import Instrumentation, span
+from futarchy.instructions import (
+    InstructionTemplate,
+    SwapAccounts,
+    VaultAccounts,
+    SWAP_ARGS,
+    SWAP_TYPE_BUY,
+    SWAP_TYPE_SELL,
+    U64,
+    get_swap_ix_template,
+    get_vault_ix_template,
+)
+from futarchy.lookup_tables import LookupTableManager
+from futarchy.positions import PositionLedger
+from futarchy.twap import ProposalTwapTracker
 from futarchy.constants import AMM_PROGRAM_ID, CONDITIONAL_VAULT_PROGRAM_ID, AUTOCRAT_PROGRAM_ID
-from futarchy.types import Amm, ConditionalVault, Proposal, SwapArgs, SwapType
+from futarchy.types import Amm, ConditionalVault, Proposal, ProposalAccounts
 from futarchy.math import get_output_tokens_buy, get_output_tokens_sell
 
+if TYPE_CHECKING:
+    from anchorpy import Idl, Program, Provider, Wallet
+
 DEFAULT_TX_OPTIONS = TxOpts(skip_confirmation=False, skip_preflight=False, preflight_commitment=Processed)
 
 class TokenType(Enum):
@@ -32,97 +62,279 @@ class OutcomeType(Enum):
     PASS = 0
     FAIL = 1
 
-def get_program(idl_file: Path, program_id: Pubkey, provider: Provider):
-    raw = idl_file.read_text()
-    idl = Idl.from_json(raw)
+IDL_DIR = Path(__file__).parent / "idl"
+
+# anchorpy is only imported once a Program is needed, it dominated the import time
+
+@lru_cache(maxsize=None)
+def load_idl(idl_file: Path) -> "Idl":
+    from anchorpy import Idl
+    return Idl.from_json(idl_file.read_text())
+
+def get_program(idl_file: Path, program_id: Pubkey, provider: "Provider") -> "Program":
+    from anchorpy import Program
     return Program(
-        idl,
+        load_idl(idl_file),
         program_id,
         provider,
     )
 
+@dataclass
+class Programs:
+    amm: "Program"
+    vault: "Program"
+    autocrat: "Program"
+
+def get_programs(provider: "Provider") -> Programs:
+    return Programs(
+        amm=get_program(IDL_DIR / "amm_v0.3.json", AMM_PROGRAM_ID, provider),
+        vault=get_program(IDL_DIR / "conditional_vault_v0.3.json", CONDITIONAL_VAULT_PROGRAM_ID, provider),
+        autocrat=get_program(IDL_DIR / "autocrat_v0.3.json", AUTOCRAT_PROGRAM_ID, provider),
+    )
+
 
 class ProposalClient:
     def __init__(
         self, 
         connection : AsyncClient, 
-        wallet : Wallet, 
+        wallet : "Wallet", 
         proposal : Pubkey,
         opts: TxOpts = DEFAULT_TX_OPTIONS,
+        programs: Optional[Programs] = None,
     ):
         self.connection = connection
         self.wallet = wallet
         self.authority = wallet.public_key
         self.proposal = proposal
         self.opts = opts
-        provider = Provider(connection, wallet, opts)
+        # built on first use, instructions are encoded without them
+        self._programs = programs
 
         self.amm_program_id = AMM_PROGRAM_ID
-        amm_file = Path(str(futarchy.__path__[0]) + "/idl/amm_v0.3.json")
-        self.amm_program = get_program(amm_file, self.amm_program_id, provider)
-
         self.vault_program_id = CONDITIONAL_VAULT_PROGRAM_ID
-        vault_file = Path(str(futarchy.__path__[0]) + "/idl/conditional_vault_v0.3.json")
-        self.vault_program = get_program(vault_file, self.vault_program_id, provider)
-
         self.autocrat_program_id = AUTOCRAT_PROGRAM_ID
-        autocrat_file = Path(str(futarchy.__path__[0]) + "/idl/autocrat_v0.3.json")
-        self.autocrat_program = get_program(autocrat_file, self.autocrat_program_id, provider)
+
+        self.amm_cache: Optional[AmmCache] = None
+        self.blockhash_manager: Optional[BlockhashManager] = None
+        self.confirmation_tracker: Optional[ConfirmationTracker] = None
+        self.compute_unit_estimator = ComputeUnitEstimator()
+        self.priority_fee_oracle: Optional[PriorityFeeOracle] = None
+        self.lookup_table_manager: Optional[LookupTableManager] = None
+        self.position_ledger: Optional[PositionLedger] = None
+        # spans of the trade path are recorded when set
+        self.instrumentation: Optional[Instrumentation] = None
+        # passed to every message compilation
+        self.address_lookup_tables: List[AddressLookupTableAccount] = []
+
+    @property
+    def programs(self) -> Programs:
+        if self._programs is None:
+            from anchorpy import Provider
+            self._programs = get_programs(Provider(self.connection, self.wallet, self.opts))
+        return self._programs
+
+    @property
+    def amm_program(self) -> "Program":
+        return self.programs.amm
+
+    @property
+    def vault_program(self) -> "Program":
+        return self.programs.vault
+
+    @property
+    def autocrat_program(self) -> "Program":
+        return self.programs.autocrat
+
+    def for_wallet(self, wallet: "Wallet") -> "ProposalClient":
+        # shares the connection, proposal state and background services, only
+        # the account tables are derived again for the new authority
+        client = copy.copy(self)
+        client.wallet = wallet
+        client.authority = wallet.public_key
+        client.position_ledger = None
+        if hasattr(self, "proposal_account"):
+            client.build_account_tables()
+        return client
 
     async def get_proposal_info(self):
-        self.proposal_account : Proposal = await get_proposal_account(self.autocrat_program, self.proposal)
+        accounts = await fetch_proposals_accounts(self.connection, [self.proposal])
+        self.set_proposal_info(accounts[0])
+
+    def set_proposal_info(self, accounts: ProposalAccounts):
+        self.proposal_info_slot = accounts.slot
+        self.proposal_account : Proposal = accounts.proposal
         self.proposal_start_slot = self.proposal_account.slot_enqueued
         self.pass_amm = self.proposal_account.pass_amm
         self.fail_amm = self.proposal_account.fail_amm
         self.base_vault = self.proposal_account.base_vault
         self.quote_vault = self.proposal_account.quote_vault
+        self.pass_amm_account : Amm = accounts.pass_amm
+        self.fail_amm_account : Amm = accounts.fail_amm
 
-        base_vault_account : ConditionalVault = await get_conditional_vault_account(self.vault_program, self.base_vault)
+        base_vault_account : ConditionalVault = accounts.base_vault
         self.base_underlying_token_mint = base_vault_account.underlying_token_mint
         self.base_pass_token_mint = base_vault_account.conditional_on_finalize_token_mint
         self.base_fail_token_mint = base_vault_account.conditional_on_revert_token_mint
         self.base_precision = 10 ** base_vault_account.decimals
 
-        quote_vault_account : ConditionalVault = await get_conditional_vault_account(self.vault_program, self.quote_vault)
+        quote_vault_account : ConditionalVault = accounts.quote_vault
         self.quote_underlying_token_mint = quote_vault_account.underlying_token_mint
         self.quote_pass_token_mint = quote_vault_account.conditional_on_finalize_token_mint
         self.quote_fail_token_mint = quote_vault_account.conditional_on_revert_token_mint
         self.quote_precision = 10 ** quote_vault_account.decimals
 
+        self.build_account_tables()
+
+    def build_account_tables(self):
+        # the addresses never change once the proposal is known, so every ATA
+        # derivation and instruction encoding is done here once
+        self.vault_accounts: Dict[TokenType, VaultAccounts] = {
+            TokenType.BASE: self._get_vault_accounts(
+                self.base_vault, 
+                self.base_pass_token_mint, 
+                self.base_fail_token_mint, 
+                self.base_underlying_token_mint
+            ),
+            TokenType.QUOTE: self._get_vault_accounts(
+                self.quote_vault, 
+                self.quote_pass_token_mint, 
+                self.quote_fail_token_mint, 
+                self.quote_underlying_token_mint
+            ),
+        }
+        self.swap_accounts: Dict[OutcomeType, SwapAccounts] = {
+            OutcomeType.PASS: self._get_swap_accounts(
+                self.pass_amm, 
+                self.base_pass_token_mint, 
+                self.quote_pass_token_mint
+            ),
+            OutcomeType.FAIL: self._get_swap_accounts(
+                self.fail_amm, 
+                self.base_fail_token_mint, 
+                self.quote_fail_token_mint
+            ),
+        }
+
+        self.mint_ix_templates: Dict[TokenType, InstructionTemplate] = {}
+        self.merge_ix_templates: Dict[TokenType, InstructionTemplate] = {}
+        self.redeem_ix_templates: Dict[TokenType, InstructionTemplate] = {}
+        for token_type, vault_accounts in self.vault_accounts.items():
+            self.mint_ix_templates[token_type] = get_vault_ix_template("mint_conditional_tokens", vault_accounts)
+            self.merge_ix_templates[token_type] = get_vault_ix_template(
+                "merge_conditional_tokens_for_underlying_tokens", vault_accounts
+            )
+            self.redeem_ix_templates[token_type] = get_vault_ix_template(
+                "redeem_conditional_tokens_for_underlying_tokens", vault_accounts
+            )
+        self.swap_ix_templates: Dict[OutcomeType, InstructionTemplate] = {
+            outcome_type: get_swap_ix_template(swap_accounts)
+            for outcome_type, swap_accounts in self.swap_accounts.items()
+        }
+
+    def _get_vault_accounts(
+        self, 
+        vault: Pubkey, 
+        pass_token_mint: Pubkey, 
+        fail_token_mint: Pubkey, 
+        underlying_token_mint: Pubkey
+    ) -> VaultAccounts:
+        return VaultAccounts(
+            vault=vault,
+            conditional_on_finalize_token_mint=pass_token_mint,
+            conditional_on_revert_token_mint=fail_token_mint,
+            vault_underlying_token_account=get_associated_token_address(vault, underlying_token_mint),
+            authority=self.authority,
+            user_conditional_on_finalize_token_account=get_associated_token_address(self.authority, pass_token_mint),
+            user_conditional_on_revert_token_account=get_associated_token_address(self.authority, fail_token_mint),
+            user_underlying_token_account=get_associated_token_address(self.authority, underlying_token_mint),
+            token_program=TOKEN_PROGRAM_ID,
+        )
+
+    def _get_swap_accounts(self, amm: Pubkey, base_mint: Pubkey, quote_mint: Pubkey) -> SwapAccounts:
+        return SwapAccounts(
+            user=self.authority,
+            amm=amm,
+            user_base_account=get_associated_token_address(self.authority, base_mint),
+            user_quote_account=get_associated_token_address(self.authority, quote_mint),
+            vault_ata_base=get_associated_token_address(amm, base_mint),
+            vault_ata_quote=get_associated_token_address(amm, quote_mint),
+            token_program=TOKEN_PROGRAM_ID,
+        )
+
+    def start_amm_cache(self, ws_url: str, max_lag: float = 2.0) -> AmmCache:
+        self.amm_cache = AmmCache(self.amm_program, ws_url, [self.pass_amm, self.fail_amm], max_lag)
+        self.amm_cache.start()
+        return self.amm_cache
+
+    async def start_position_ledger(self, ws_url: Optional[str] = None) -> PositionLedger:
+        # without a ws_url the ledger is only reconciled by calling load
+        self.position_ledger = PositionLedger(self, ws_url)
+        await self.position_ledger.load()
+        self.position_ledger.start()
+        return self.position_ledger
+
+    async def get_amm(self, amm: Pubkey) -> Amm:
+        with span(self.instrumentation, "get_amm"):
+            if self.amm_cache is not None:
+                return await self.amm_cache.get_amm(amm)
+            return await get_amm_account(self.amm_program, amm)
+
+    async def get_twap_tracker(self) -> ProposalTwapTracker:
+        dao = await get_dao_account(self.autocrat_program, self.proposal_account.dao)
+        return ProposalTwapTracker.from_proposal(
+            self.proposal_account, 
+            dao, 
+            self.pass_amm_account, 
+            self.fail_amm_account, 
+            self.proposal_info_slot
+        )
+
     async def create_token_accounts(self):
         ixs = await self.get_create_token_accounts_ixs()
         if ixs:
-            return await self.send_ix(ixs, compute_unit_limit=25_000 * len(ixs))
+            return await self.send_ix(ixs, compute_unit_limit=None)
 
-    async def get_create_token_accounts_ixs(self):
-        mints = [
-            self.base_pass_token_mint,
-            self.base_fail_token_mint,
-            self.quote_pass_token_mint,
-            self.quote_fail_token_mint,
-            self.base_underlying_token_mint,
-            self.quote_underlying_token_mint
+    def get_token_account_mints(self) -> List[Tuple[Pubkey, Pubkey]]:
+        # the user's token accounts with their mints
+        base_accounts = self.vault_accounts[TokenType.BASE]
+        quote_accounts = self.vault_accounts[TokenType.QUOTE]
+        return [
+            (base_accounts.user_conditional_on_finalize_token_account, self.base_pass_token_mint),
+            (base_accounts.user_conditional_on_revert_token_account, self.base_fail_token_mint),
+            (quote_accounts.user_conditional_on_finalize_token_account, self.quote_pass_token_mint),
+            (quote_accounts.user_conditional_on_revert_token_account, self.quote_fail_token_mint),
+            (base_accounts.user_underlying_token_account, self.base_underlying_token_mint),
+            (quote_accounts.user_underlying_token_account, self.quote_underlying_token_mint),
         ]
-        accounts = [get_associated_token_address(self.authority, mint) for mint in mints]
-        account_statuses = await self.connection.get_multiple_accounts_json_parsed(accounts, commitment=Confirmed)
+
+    async def get_create_token_accounts_ixs(self):
+        account_mints = self.get_token_account_mints()
+        account_statuses = await self.connection.get_multiple_accounts_json_parsed(
+            [account for account, _ in account_mints], 
+            commitment=Confirmed
+        )
+        return self.get_missing_token_accounts_ixs(account_mints, account_statuses.value)
+
+    def get_missing_token_accounts_ixs(self, account_mints: Sequence[Tuple[Pubkey, Pubkey]], statuses) -> List[Instruction]:
         ixs = []
-        for i, status in enumerate(account_statuses.value):
+        for (_, mint), status in zip(account_mints, statuses):
             if status is None or status.data.parsed["info"]["state"] != "initialized":
                 ixs.append(create_associated_token_account(
                     self.authority, 
                     self.authority, 
-                    mints[i]
+                    mint
                 ))
         return ixs
-        
+
     async def close_conditional_token_accounts(self):
-        mints = [
-            self.base_pass_token_mint,
-            self.base_fail_token_mint,
-            self.quote_pass_token_mint,
-            self.quote_fail_token_mint,
+        base_accounts = self.vault_accounts[TokenType.BASE]
+        quote_accounts = self.vault_accounts[TokenType.QUOTE]
+        accounts = [
+            base_accounts.user_conditional_on_finalize_token_account,
+            base_accounts.user_conditional_on_revert_token_account,
+            quote_accounts.user_conditional_on_finalize_token_account,
+            quote_accounts.user_conditional_on_revert_token_account,
         ]
-        accounts = [get_associated_token_address(self.authority, mint) for mint in mints]
         ixs = [self.get_redeem_base_conditional_tokens_ix(), self.get_redeem_quote_conditional_tokens_ix()]
         for account in accounts:
             ixs.append(close_account(CloseAccountParams(
@@ -131,60 +343,19 @@ class ProposalClient:
                 dest=self.authority,
                 owner=self.authority
             )))
-        return await self.send_ix(ixs, compute_unit_limit=150_000)
+        return await self.send_ix(ixs, compute_unit_limit=None)
 
     def get_mint_conditional_tokens_ix(self, amount: int, token_type: TokenType) -> Instruction:
-        accounts = self.get_accounts_for_vault_ix(token_type)
-        ix = self.vault_program.instruction["mint_conditional_tokens"](
-            amount,
-            ctx=Context(accounts=accounts),
-        )
-        return ix
+        return self.mint_ix_templates[token_type].build(U64.pack(amount))
 
     def get_merge_conditional_tokens_ix(self, amount: int, token_type: TokenType) -> Instruction:
-        accounts = self.get_accounts_for_vault_ix(token_type)
-        ix = self.vault_program.instruction["merge_conditional_tokens_for_underlying_tokens"](
-            amount,
-            ctx=Context(accounts=accounts)
-        )
-        return ix
+        return self.merge_ix_templates[token_type].build(U64.pack(amount))
     
     def get_redeem_conditional_tokens_ix(self, token_type: TokenType) -> Instruction:
-        accounts = self.get_accounts_for_vault_ix(token_type)
-        ix = self.vault_program.instruction["redeem_conditional_tokens_for_underlying_tokens"](
-            ctx=Context(accounts=accounts)
-        )
-        return ix
+        return self.redeem_ix_templates[token_type].build()
 
     def get_accounts_for_vault_ix(self, token_type: TokenType) -> dict:
-        if token_type == TokenType.BASE:
-            vault = self.base_vault
-            pass_token_mint = self.base_pass_token_mint
-            fail_token_mint = self.base_fail_token_mint
-            vault_underlying_account = get_associated_token_address(vault, self.base_underlying_token_mint)
-            user_pass_account = get_associated_token_address(self.authority, pass_token_mint)
-            user_fail_account = get_associated_token_address(self.authority, fail_token_mint)
-            user_underlying_account = get_associated_token_address(self.authority, self.base_underlying_token_mint)
-        else:
-            vault = self.quote_vault
-            pass_token_mint = self.quote_pass_token_mint
-            fail_token_mint = self.quote_fail_token_mint
-            vault_underlying_account = get_associated_token_address(vault, self.quote_underlying_token_mint)
-            user_pass_account = get_associated_token_address(self.authority, pass_token_mint)
-            user_fail_account = get_associated_token_address(self.authority, fail_token_mint)
-            user_underlying_account = get_associated_token_address(self.authority, self.quote_underlying_token_mint)
-        accounts={
-            "vault": vault,
-            "conditional_on_finalize_token_mint": pass_token_mint,
-            "conditional_on_revert_token_mint": fail_token_mint,
-            "vault_underlying_token_account": vault_underlying_account,
-            "authority": self.authority,
-            "user_conditional_on_finalize_token_account": user_pass_account,
-            "user_conditional_on_revert_token_account": user_fail_account,
-            "user_underlying_token_account": user_underlying_account,
-            "token_program": TOKEN_PROGRAM_ID,
-        }
-        return accounts
+        return self.vault_accounts[token_type].as_dict()
     
     def get_mint_base_conditional_tokens_ix(self, amount: int) -> Instruction:
         return self.get_mint_conditional_tokens_ix(amount, TokenType.BASE)
@@ -212,13 +383,10 @@ class ProposalClient:
         slippage_bps: int = 10,
         return_min_out: bool = False
     ) -> Union[Instruction, Tuple[Instruction, int]]:
-        accounts = self.get_accounts_for_swap_ix(outcome_type, amm)
-        min_output = get_output_tokens_buy(amount, amm, slippage_bps)
-        swap_args = SwapArgs(SwapType.Buy(), amount, min_output)
-        ix = self.amm_program.instruction["swap"](
-            swap_args,
-            ctx=Context(accounts=accounts)
-        )
+        with span(self.instrumentation, "build_ix"):
+            self._check_swap_amm(outcome_type, amm)
+            min_output = get_output_tokens_buy(amount, amm, slippage_bps)
+            ix = self.swap_ix_templates[outcome_type].build(SWAP_ARGS.pack(SWAP_TYPE_BUY, amount, min_output))
         if return_min_out:
             return ix, min_output
         return ix
@@ -231,44 +399,25 @@ class ProposalClient:
         slippage_bps: int = 10,
         return_min_out: bool = False
     ) -> Union[Instruction, Tuple[Instruction, int]]:
-        accounts = self.get_accounts_for_swap_ix(outcome_type, amm)
-        min_output = get_output_tokens_sell(amount, amm, slippage_bps)
-        swap_args = SwapArgs(SwapType.Sell(), amount, min_output)
-        ix = self.amm_program.instruction["swap"](
-            swap_args,
-            ctx=Context(accounts=accounts)
-        )
+        with span(self.instrumentation, "build_ix"):
+            self._check_swap_amm(outcome_type, amm)
+            min_output = get_output_tokens_sell(amount, amm, slippage_bps)
+            ix = self.swap_ix_templates[outcome_type].build(SWAP_ARGS.pack(SWAP_TYPE_SELL, amount, min_output))
         if return_min_out:
             return ix, min_output
         return ix
 
-    def get_accounts_for_swap_ix(self, outcome_type: OutcomeType, amm: Amm) -> dict:
+    def _check_swap_amm(self, outcome_type: OutcomeType, amm: Amm):
         if outcome_type == OutcomeType.PASS:
-            amm_pubkey = self.pass_amm
             assert(amm.base_mint == self.base_pass_token_mint)
             assert(amm.quote_mint == self.quote_pass_token_mint)
-            user_base_account = get_associated_token_address(self.authority, amm.base_mint)
-            user_quote_account = get_associated_token_address(self.authority, amm.quote_mint)
-            vault_ata_base = get_associated_token_address(amm_pubkey, amm.base_mint)
-            vault_ata_quote = get_associated_token_address(amm_pubkey, amm.quote_mint)
         else:
-            amm_pubkey = self.fail_amm
             assert(amm.base_mint == self.base_fail_token_mint)
             assert(amm.quote_mint == self.quote_fail_token_mint)
-            user_base_account = get_associated_token_address(self.authority, amm.base_mint)
-            user_quote_account = get_associated_token_address(self.authority, amm.quote_mint)
-            vault_ata_base = get_associated_token_address(amm_pubkey, amm.base_mint)
-            vault_ata_quote = get_associated_token_address(amm_pubkey, amm.quote_mint)
-        accounts={
-            "user": self.authority,
-            "amm": amm_pubkey,
-            "user_base_account": user_base_account,
-            "user_quote_account": user_quote_account,
-            "vault_ata_base": vault_ata_base,
-            "vault_ata_quote": vault_ata_quote,
-            "token_program": TOKEN_PROGRAM_ID,
-        }
-        return accounts
+
+    def get_accounts_for_swap_ix(self, outcome_type: OutcomeType, amm: Amm) -> dict:
+        self._check_swap_amm(outcome_type, amm)
+        return self.swap_accounts[outcome_type].as_dict()
 
     async def get_buy_pass_ix(
         self, amount: int, 
@@ -277,7 +426,7 @@ class ProposalClient:
         return_min_out: bool = False
     ) -> Union[Instruction, Tuple[Instruction, int]]:
         if amm is None:
-            amm = await get_amm_account(self.amm_program, self.pass_amm)
+            amm = await self.get_amm(self.pass_amm)
         return self.get_buy_ix(amount, OutcomeType.PASS, amm, slippage_bps, return_min_out)
 
     async def get_sell_pass_ix(
@@ -287,7 +436,7 @@ class ProposalClient:
         return_min_out: bool = False
     ) -> Union[Instruction, Tuple[Instruction, int]]:
         if amm is None:
-            amm = await get_amm_account(self.amm_program, self.pass_amm)
+            amm = await self.get_amm(self.pass_amm)
         return self.get_sell_ix(amount, OutcomeType.PASS, amm, slippage_bps, return_min_out)
 
     async def get_buy_fail_ix(
@@ -297,7 +446,7 @@ class ProposalClient:
         return_min_out: bool = False
     ) -> Union[Instruction, Tuple[Instruction, int]]:
         if amm is None:
-            amm = await get_amm_account(self.amm_program, self.fail_amm)
+            amm = await self.get_amm(self.fail_amm)
         return self.get_buy_ix(amount, OutcomeType.FAIL, amm, slippage_bps, return_min_out)
 
     async def get_sell_fail_ix(
@@ -307,20 +456,138 @@ class ProposalClient:
         return_min_out: bool = False
     ) -> Union[Instruction, Tuple[Instruction, int]]:
         if amm is None:
-            amm = await get_amm_account(self.amm_program, self.fail_amm)
+            amm = await self.get_amm(self.fail_amm)
         return self.get_sell_ix(amount, OutcomeType.FAIL, amm, slippage_bps, return_min_out)
     
+    def start_blockhash_manager(self, refresh_interval: float = 2.0) -> BlockhashManager:
+        self.blockhash_manager = BlockhashManager(self.connection, refresh_interval)
+        self.blockhash_manager.start()
+        return self.blockhash_manager
+
+    def start_confirmation_tracker(
+        self, 
+        poll_interval: float = 0.5, 
+        resend_interval: float = 2.0
+    ) -> ConfirmationTracker:
+        self.confirmation_tracker = ConfirmationTracker(
+            self.connection, 
+            Confirmed, 
+            poll_interval, 
+            resend_interval, 
+            self.blockhash_manager
+        )
+        self.confirmation_tracker.start()
+        return self.confirmation_tracker
+
+    def get_lookup_table_addresses(self) -> List[Pubkey]:
+        # every non-signer account of the precomputed instructions, invoked
+        # programs have to stay in the static keys so they're left out
+        templates = (
+            list(self.mint_ix_templates.values())
+            + list(self.merge_ix_templates.values())
+            + list(self.redeem_ix_templates.values())
+            + list(self.swap_ix_templates.values())
+        )
+        invoked = {template.program_id for template in templates}
+        addresses = {}
+        for template in templates:
+            for meta in template.accounts:
+                if meta.pubkey != self.authority and meta.pubkey not in invoked:
+                    addresses[meta.pubkey] = None
+        return list(addresses)
+
+    async def setup_lookup_table(self, address: Optional[Pubkey] = None) -> LookupTableManager:
+        # creates the table when no address is given and extends it with
+        # whatever proposal accounts it doesn't hold yet
+        manager = LookupTableManager(self.connection, address)
+        ixs = []
+        if address is None:
+            ixs.append(await manager.get_create_ix(self.authority, self.authority))
+        elif await manager.load() is None:
+            raise ValueError(f"lookup table {address} not found")
+        ixs.extend(manager.get_extend_ixs(self.authority, self.authority, self.get_lookup_table_addresses()))
+        for ix in ixs:
+            await (await self.send_ix_tracked(ix))
+        if ixs:
+            await manager.load()
+            await manager.wait_until_active()
+        self.lookup_table_manager = manager
+        self.address_lookup_tables = [manager.get_account()]
+        return manager
+
+    def get_writable_accounts(self) -> List[Pubkey]:
+        return [self.pass_amm, self.fail_amm, self.base_vault, self.quote_vault]
+
+    async def start_priority_fee_oracle(
+        self,
+        percentile: float = 75,
+        max_price: int = 1_000_000,
+        refresh_interval: float = 2.0,
+    ) -> PriorityFeeOracle:
+        self.priority_fee_oracle = PriorityFeeOracle(
+            self.connection,
+            self.get_writable_accounts(),
+            percentile,
+            max_price,
+            refresh_interval=refresh_interval,
+        )
+        await self.priority_fee_oracle.refresh()
+        self.priority_fee_oracle.start()
+        return self.priority_fee_oracle
+
+    async def get_compute_unit_price(self) -> int:
+        with span(self.instrumentation, "priority_fee"):
+            if self.priority_fee_oracle is None:
+                await self.start_priority_fee_oracle()
+            return self.priority_fee_oracle.get_price()
+
+    async def fetch_recent_blockhash(self) -> RecentBlockhash:
+        with span(self.instrumentation, "blockhash"):
+            if self.blockhash_manager is not None:
+                return await self.blockhash_manager.get_blockhash()
+            return await fetch_recent_blockhash(self.connection, Confirmed)
+
     async def fetch_latest_blockhash(self) -> Hash:
-        return (
-            await self.connection.get_latest_blockhash(Confirmed)
-        ).value.blockhash
+        return (await self.fetch_recent_blockhash()).blockhash
 
-    async def send_ix(
+    async def simulate_compute_units(
         self,
         ix : Union[Instruction, Iterable[Instruction]],
+        blockhash: Hash,
+    ) -> Optional[int]:
+        tx = self.build_tx(ix, blockhash, 0, MAX_COMPUTE_UNIT_LIMIT)
+        resp = await self.connection.simulate_transaction(tx, sig_verify=False)
+        if resp.value.err is not None or resp.value.units_consumed is None:
+            return None
+        return resp.value.units_consumed
+
+    async def get_compute_unit_limit(
+        self,
+        ix : Union[Instruction, Iterable[Instruction]],
+        blockhash: Hash,
+    ) -> int:
+        ixs = [ix] if isinstance(ix, Instruction) else list(ix)
+        estimator = self.compute_unit_estimator
+        limit = estimator.get_limit(ixs)
+        if limit is None:
+            with span(self.instrumentation, "simulate"):
+                units = await self.simulate_compute_units(ixs, blockhash)
+            if units is None:
+                return estimator.fallback_limit(ixs)
+            estimator.record(ixs, units)
+            limit = estimator.get_limit(ixs)
+        return limit
+
+    def build_tx(
+        self,
+        ix : Union[Instruction, Iterable[Instruction]],
+        blockhash: Hash,
         compute_unit_price: int = 100_000,
         compute_unit_limit: int = 50_000,
-    ) -> Signature:
+        address_lookup_tables: Optional[Sequence[AddressLookupTableAccount]] = None,
+    ) -> VersionedTransaction:
+        if address_lookup_tables is None:
+            address_lookup_tables = self.address_lookup_tables
         compute_price_ix = set_compute_unit_price(compute_unit_price)
         compute_limit_ix = set_compute_unit_limit(compute_unit_limit)
         if isinstance(ix, Instruction):
@@ -328,12 +595,92 @@ class ProposalClient:
         else:
             ixs = [compute_limit_ix, compute_price_ix] + list(ix)
 
-        latest_blockhash = await self.fetch_latest_blockhash()
-        msg = MessageV0.try_compile(
-            self.authority, ixs, [], latest_blockhash
-        )
-        tx = VersionedTransaction(msg, [self.wallet.payer])
+        with span(self.instrumentation, "compile"):
+            msg = MessageV0.try_compile(
+                self.authority, ixs, list(address_lookup_tables), blockhash
+            )
+        with span(self.instrumentation, "sign"):
+            return VersionedTransaction(msg, [self.wallet.payer])
+
+    async def send_tx(self, tx: VersionedTransaction) -> Signature:
         body = self.connection._send_raw_transaction_body(bytes(tx), self.opts)
-        resp = await self.connection._provider.make_request(body, SendTransactionResp)
+        with span(self.instrumentation, "send"):
+            resp = await self.connection._provider.make_request(body, SendTransactionResp)
         return resp.value
-    
+
+    async def send_ix(
+        self,
+        ix : Union[Instruction, Iterable[Instruction]],
+        compute_unit_price: Optional[int] = 100_000,
+        compute_unit_limit: Optional[int] = 50_000,
+    ) -> Signature:
+        # compute_unit_limit=None sizes the limit by simulation and
+        # compute_unit_price=None takes the price from the priority fee oracle
+        if not isinstance(ix, Instruction):
+            ix = list(ix)
+        if compute_unit_price is None:
+            compute_unit_price = await self.get_compute_unit_price()
+        latest_blockhash = await self.fetch_latest_blockhash()
+        estimated = compute_unit_limit is None
+        if estimated:
+            compute_unit_limit = await self.get_compute_unit_limit(ix, latest_blockhash)
+        tx = self.build_tx(ix, latest_blockhash, compute_unit_price, compute_unit_limit)
+        try:
+            return await self.send_tx(tx)
+        except RPCException as e:
+            if estimated:
+                self.evict_if_budget_exceeded(ix, e)
+            raise
+
+    async def send_ix_tracked(
+        self,
+        ix : Union[Instruction, Iterable[Instruction]],
+        compute_unit_price: Optional[int] = 100_000,
+        compute_unit_limit: Optional[int] = 50_000,
+    ) -> "asyncio.Future[TransactionStatus]":
+        if self.confirmation_tracker is None:
+            self.start_confirmation_tracker()
+        if not isinstance(ix, Instruction):
+            ix = list(ix)
+        if compute_unit_price is None:
+            compute_unit_price = await self.get_compute_unit_price()
+        recent_blockhash = await self.fetch_recent_blockhash()
+        estimated = compute_unit_limit is None
+        if estimated:
+            compute_unit_limit = await self.get_compute_unit_limit(ix, recent_blockhash.blockhash)
+        tx = self.build_tx(ix, recent_blockhash.blockhash, compute_unit_price, compute_unit_limit)
+        try:
+            await self.send_tx(tx)
+        except RPCException as e:
+            if estimated:
+                self.evict_if_budget_exceeded(ix, e)
+            raise
+        future = self.confirmation_tracker.track(tx, recent_blockhash.last_valid_block_height)
+        if estimated:
+            self._evict_on_budget_exceeded(future, ix)
+        if self.instrumentation is not None:
+            self._record_confirmation(future, time.perf_counter())
+        return future
+
+    def evict_if_budget_exceeded(self, ix: Union[Instruction, Iterable[Instruction]], error: BaseException):
+        # a limit from the estimator that was too low means its estimate is
+        # wrong, the next send simulates again
+        err = None
+        if isinstance(error, TransactionFailedError):
+            err = error.err
+        elif isinstance(error, RPCException) and isinstance(error.args[0], SendTransactionPreflightFailureMessage):
+            err = error.args[0].data.err
+        if is_compute_budget_exceeded(err):
+            self.compute_unit_estimator.evict([ix] if isinstance(ix, Instruction) else ix)
+
+    def _evict_on_budget_exceeded(self, future: asyncio.Future, ix: Union[Instruction, Iterable[Instruction]]):
+        def on_done(future: asyncio.Future):
+            if not future.cancelled() and future.exception() is not None:
+                self.evict_if_budget_exceeded(ix, future.exception())
+        future.add_done_callback(on_done)
+
+    def _record_confirmation(self, future: asyncio.Future, start: float):
+        # from send to the tracker resolving it, failed transactions included
+        def on_done(future: asyncio.Future):
+            self.instrumentation.record("confirm", start, time.perf_counter() - start)
+        future.add_done_callback(on_done)
@@ -0,0 +1,139 @@
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Sequence
+from solders.address_lookup_table_account import AddressLookupTableAccount
+from solders.hash import Hash
+from solders.instruction import Instruction
+from solders.message import MessageV0, to_bytes_versioned
+from solders.signature import Signature
+from solders.compute_budget import set_compute_unit_limit, set_compute_unit_price
+from solana.rpc.core import RPCException
+
+from futarchy.client import ProposalClient
+from futarchy.compute_units import MAX_COMPUTE_UNIT_LIMIT
+from futarchy.confirmation import TransactionFailedError
+
+# max serialized transaction size
+PACKET_DATA_SIZE = 1232
+# max accounts a transaction can lock, program ids included
+MAX_TX_ACCOUNT_LOCKS = 64
+SIGNATURE_SIZE = 64
+
+
+@dataclass
+class Leg:
+    ixs: List[Instruction]
+    # a leg marked atomic_with_next always lands in the same transaction as
+    # the leg after it
+    atomic_with_next: bool = False
+
+    def __post_init__(self):
+        if isinstance(self.ixs, Instruction):
+            self.ixs = [self.ixs]
+        else:
+            self.ixs = list(self.ixs)
+
+
+def group_legs(legs: Iterable[Leg]) -> List[List[Instruction]]:
+    groups = []
+    current: List[Instruction] = []
+    for leg in legs:
+        current.extend(leg.ixs)
+        if not leg.atomic_with_next:
+            groups.append(current)
+            current = []
+    if current:
+        groups.append(current)
+    return groups
+
+
+class TransactionComposer:
+    def __init__(
+        self,
+        client: ProposalClient,
+        address_lookup_tables: Optional[Sequence[AddressLookupTableAccount]] = None,
+        max_compute_units: int = MAX_COMPUTE_UNIT_LIMIT,
+        max_size: int = PACKET_DATA_SIZE,
+    ):
+        self.client = client
+        # None follows the client's tables
+        self._address_lookup_tables = address_lookup_tables
+        self.max_compute_units = max_compute_units
+        self.max_size = max_size
+
+    @property
+    def address_lookup_tables(self) -> List[AddressLookupTableAccount]:
+        if self._address_lookup_tables is None:
+            return self.client.address_lookup_tables
+        return list(self._address_lookup_tables)
+
+    def tx_size(self, ixs: List[Instruction]) -> int:
+        # the compute budget instructions have fixed size data, so placeholder
+        # values give the exact size
+        msg = MessageV0.try_compile(
+            self.client.authority,
+            [set_compute_unit_limit(0), set_compute_unit_price(0)] + ixs,
+            self.address_lookup_tables,
+            Hash.default(),
+        )
+        num_signers = msg.header.num_required_signatures
+        return 1 + SIGNATURE_SIZE * num_signers + len(to_bytes_versioned(msg))
+
+    def fits(self, ixs: List[Instruction]) -> bool:
+        accounts = {self.client.authority}
+        for ix in ixs:
+            accounts.add(ix.program_id)
+            accounts.update(meta.pubkey for meta in ix.accounts)
+        if len(accounts) + 1 > MAX_TX_ACCOUNT_LOCKS:
+            return False
+        if self.client.compute_unit_estimator.estimate_limit(ixs) > self.max_compute_units:
+            return False
+        return self.tx_size(ixs) <= self.max_size
+
+    def pack(self, legs: Iterable[Leg]) -> List[List[Instruction]]:
+        # legs keep their order, so filling each transaction before starting the
+        # next gives the fewest transactions
+        batches = []
+        current: List[Instruction] = []
+        for group in group_legs(legs):
+            if current and self.fits(current + group):
+                current = current + group
+                continue
+            if not self.fits(group):
+                raise ValueError(f"atomic group of {len(group)} instructions doesn't fit in one transaction")
+            if current:
+                batches.append(current)
+            current = group
+        if current:
+            batches.append(current)
+        return batches
+
+    async def send(
+        self,
+        legs: Iterable[Leg],
+        compute_unit_price: Optional[int] = 100_000,
+        compute_unit_limit: Optional[int] = None,
+    ) -> List[Signature]:
+        # later transactions usually spend tokens from earlier ones, so each one
+        # is sent after the previous one confirms
+        client = self.client
+        if client.confirmation_tracker is None:
+            client.start_confirmation_tracker()
+        if compute_unit_price is None:
+            compute_unit_price = await client.get_compute_unit_price()
+        signatures = []
+        for ixs in self.pack(legs):
+            recent_blockhash = await client.fetch_recent_blockhash()
+            limit = compute_unit_limit
+            if limit is None:
+                limit = await client.get_compute_unit_limit(ixs, recent_blockhash.blockhash)
+            tx = client.build_tx(
+                ixs, recent_blockhash.blockhash, compute_unit_price, limit, self.address_lookup_tables
+            )
+            try:
+                signatures.append(await client.send_tx(tx))
+                await client.confirmation_tracker.track(tx, recent_blockhash.last_valid_block_height)
+            except (RPCException, TransactionFailedError) as e:
+                if compute_unit_limit is None:
+                    client.evict_if_budget_exceeded(ixs, e)
+                raise
+        return signatures
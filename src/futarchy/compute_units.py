@@ -0,0 +1,139 @@
+import hashlib
+import math
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Hashable, Iterable, List, Optional, Tuple
+from solders.compute_budget import ID as COMPUTE_BUDGET_PROGRAM_ID
+from solders.instruction import Instruction
+from solders.transaction_status import InstructionErrorFieldless, TransactionErrorInstructionError
+from spl.token.constants import TOKEN_PROGRAM_ID, ASSOCIATED_TOKEN_PROGRAM_ID
+
+from futarchy.constants import AMM_PROGRAM_ID
+
+MAX_COMPUTE_UNIT_LIMIT = 1_400_000
+# used when a transaction can't be simulated, in line with the old fixed limits
+FALLBACK_COMPUTE_UNITS_PER_IX = 50_000
+
+SWAP_DISCRIMINATOR = hashlib.sha256(b"global:swap").digest()[:8]
+
+
+def get_instruction_type(ix: Instruction) -> Hashable:
+    data = bytes(ix.data)
+    if ix.program_id == AMM_PROGRAM_ID and data[:8] == SWAP_DISCRIMINATOR:
+        # buy and sell walk different token paths, so the swap type is part of the key
+        return ix.program_id, data[:9]
+    if ix.program_id in (TOKEN_PROGRAM_ID, ASSOCIATED_TOKEN_PROGRAM_ID):
+        return ix.program_id, data[:1]
+    return ix.program_id, data[:8]
+
+
+def is_compute_budget_exceeded(err) -> bool:
+    # err is the TransactionError of a status or a simulation
+    return (
+        isinstance(err, TransactionErrorInstructionError)
+        and err.err == InstructionErrorFieldless.ComputationalBudgetExceeded
+    )
+
+
+@dataclass
+class ComputeUnitEntry:
+    units: float
+    uses: int = 0
+
+
+class ComputeUnitEstimator:
+    def __init__(
+        self,
+        margin: float = 0.1,
+        refresh_every: int = 100,
+        tolerance: float = 0.25,
+        max_limit: int = MAX_COMPUTE_UNIT_LIMIT,
+    ):
+        self.margin = margin
+        # a cached type is re-simulated after this many uses
+        self.refresh_every = refresh_every
+        # relative difference at which a new simulation replaces the entry
+        # instead of being averaged into it
+        self.tolerance = tolerance
+        self.max_limit = max_limit
+        self.entries: Dict[Hashable, ComputeUnitEntry] = {}
+        # whole transactions whose units couldn't be split by type, keyed by
+        # their type counts
+        self.transactions: Dict[FrozenSet[Tuple[Hashable, int]], ComputeUnitEntry] = {}
+
+    def _count_types(self, ixs: Iterable[Instruction]) -> Counter:
+        return Counter(
+            get_instruction_type(ix) for ix in ixs 
+            if ix.program_id != COMPUTE_BUDGET_PROGRAM_ID
+        )
+
+    def get_limit(self, ixs: List[Instruction]) -> Optional[int]:
+        # None means the transaction needs to be simulated first
+        counts = self._count_types(ixs)
+        entries = [self.entries.get(ix_type) for ix_type in counts]
+        if all(entry is not None and entry.uses < self.refresh_every for entry in entries):
+            for entry in entries:
+                entry.uses += 1
+            return self.to_limit(sum(entry.units * count for entry, count in zip(entries, counts.values())))
+        entry = self.transactions.get(frozenset(counts.items()))
+        if entry is not None and entry.uses < self.refresh_every:
+            entry.uses += 1
+            return self.to_limit(entry.units)
+        return None
+
+    def to_limit(self, units: float) -> int:
+        return min(self.max_limit, math.ceil(units * (1 + self.margin)))
+
+    def estimate_limit(self, ixs: List[Instruction]) -> int:
+        # cached units where known and the fallback otherwise, without counting a use
+        counts = self._count_types(ixs)
+        units = 0.0
+        unknown = 0
+        for ix_type, count in counts.items():
+            entry = self.entries.get(ix_type)
+            if entry is None:
+                unknown += count
+            else:
+                units += entry.units * count
+        return min(self.max_limit, self.to_limit(units) + FALLBACK_COMPUTE_UNITS_PER_IX * unknown)
+
+    def fallback_limit(self, ixs: List[Instruction]) -> int:
+        count = sum(self._count_types(ixs).values())
+        return min(self.max_limit, FALLBACK_COMPUTE_UNITS_PER_IX * max(count, 1))
+
+    def record(self, ixs: List[Instruction], units_consumed: int):
+        # units are only put on a type when it's the one type the simulation
+        # leaves unexplained, splitting them across several types would give the
+        # cheaper ones' cost to the expensive ones
+        counts = self._count_types(ixs)
+        if not counts:
+            return
+        unknown = [
+            ix_type for ix_type in counts
+            if ix_type not in self.entries or self.entries[ix_type].uses >= self.refresh_every
+        ]
+        if len(counts) == 1 or len(unknown) == 1:
+            ix_type = unknown[0] if unknown else next(iter(counts))
+            known_units = sum(
+                self.entries[other].units * count for other, count in counts.items() if other != ix_type
+            )
+            self._update(self.entries, ix_type, max(0.0, units_consumed - known_units) / counts[ix_type])
+        else:
+            self._update(self.transactions, frozenset(counts.items()), units_consumed)
+
+    def _update(self, entries: dict, key: Hashable, units: float):
+        entry = entries.get(key)
+        if entry is None or abs(units - entry.units) > self.tolerance * entry.units:
+            entries[key] = ComputeUnitEntry(units)
+        else:
+            entries[key] = ComputeUnitEntry((entry.units + units) / 2)
+
+    def evict(self, ixs: Iterable[Instruction]):
+        # drops every estimate the transaction's limit could have come from
+        counts = self._count_types(ixs)
+        for ix_type in counts:
+            self.entries.pop(ix_type, None)
+        self.transactions = {
+            key: entry for key, entry in self.transactions.items()
+            if not any(ix_type in counts for ix_type, _ in key)
+        }
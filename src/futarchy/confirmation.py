@@ -0,0 +1,187 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+from solders.signature import Signature
+from solders.transaction import VersionedTransaction
+from solders.transaction_status import TransactionConfirmationStatus, TransactionStatus
+from solana.rpc.async_api import AsyncClient
+from solana.rpc.commitment import Commitment, Processed, Confirmed, Finalized
+from solana.rpc.types import TxOpts
+
+from futarchy.blockhash import BlockhashManager
+
+logger = logging.getLogger(__name__)
+
+# getSignatureStatuses accepts at most this many signatures per request
+MAX_SIGNATURE_STATUSES = 256
+
+# ordered like the int values of TransactionConfirmationStatus
+COMMITMENT_RANK = {
+    Processed: int(TransactionConfirmationStatus.Processed),
+    Confirmed: int(TransactionConfirmationStatus.Confirmed),
+    Finalized: int(TransactionConfirmationStatus.Finalized),
+}
+
+RESEND_OPTIONS = TxOpts(skip_confirmation=True, skip_preflight=True, max_retries=0)
+
+
+class TransactionFailedError(Exception):
+    def __init__(self, signature: Signature, err):
+        super().__init__(f"transaction {signature} failed: {err}")
+        self.signature = signature
+        self.err = err
+
+
+class TransactionExpiredError(Exception):
+    def __init__(self, signature: Signature):
+        super().__init__(f"transaction {signature} expired before confirmation")
+        self.signature = signature
+
+
+@dataclass
+class PendingTransaction:
+    signature: Signature
+    tx_bytes: bytes
+    last_valid_block_height: int
+    future: asyncio.Future
+    last_sent: float
+
+
+class ConfirmationTracker:
+    def __init__(
+        self,
+        connection: AsyncClient,
+        commitment: Commitment = Confirmed,
+        poll_interval: float = 0.5,
+        resend_interval: float = 2.0,
+        blockhash_manager: Optional[BlockhashManager] = None,
+    ):
+        self.connection = connection
+        self.commitment = commitment
+        self.poll_interval = poll_interval
+        self.resend_interval = resend_interval
+        # when given, getBlockHeight is only requested once its estimated block
+        # height says a pending transaction may have expired
+        self.blockhash_manager = blockhash_manager
+        self.pending: Dict[Signature, PendingTransaction] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def track(self, tx: VersionedTransaction, last_valid_block_height: int) -> "asyncio.Future[TransactionStatus]":
+        signature = tx.signatures[0]
+        if signature in self.pending:
+            return self.pending[signature].future
+        future = asyncio.get_running_loop().create_future()
+        self.pending[signature] = PendingTransaction(
+            signature, 
+            bytes(tx), 
+            last_valid_block_height, 
+            future, 
+            time.monotonic()
+        )
+        self.start()
+        return future
+
+    async def _run(self):
+        while True:
+            if self.pending:
+                try:
+                    await self.poll()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.warning("signature status poll failed: %r", e)
+            await asyncio.sleep(self.poll_interval)
+
+    async def poll(self):
+        signatures = list(self.pending)
+        responses = await asyncio.gather(*[
+            self.connection.get_signature_statuses(signatures[i:i + MAX_SIGNATURE_STATUSES])
+            for i in range(0, len(signatures), MAX_SIGNATURE_STATUSES)
+        ])
+        statuses = [status for resp in responses for status in resp.value]
+        for signature, status in zip(signatures, statuses):
+            self._on_status(signature, status)
+
+        if not self.pending:
+            return
+        await self._expire()
+        now = time.monotonic()
+        resends = []
+        for pending in list(self.pending.values()):
+            if now - pending.last_sent >= self.resend_interval:
+                pending.last_sent = now
+                resends.append(self._resend(pending))
+        await asyncio.gather(*resends)
+
+    def _on_status(self, signature: Signature, status: Optional[TransactionStatus]) -> bool:
+        # returns whether the transaction is known to have landed
+        if status is None:
+            return False
+        if status.err is not None:
+            self._resolve(signature, exception=TransactionFailedError(signature, status.err))
+        elif (
+            status.confirmation_status is not None
+            and int(status.confirmation_status) >= COMMITMENT_RANK[self.commitment]
+        ):
+            self._resolve(signature, result=status)
+        return True
+
+    async def _expire(self):
+        if not self.pending:
+            return
+        # the estimate runs ahead of the real block height when slots are
+        # skipped, so it only decides whether getBlockHeight is worth asking
+        if self.blockhash_manager is not None and self.blockhash_manager.block_height_time:
+            estimate = self.blockhash_manager.estimated_block_height()
+            if all(estimate <= pending.last_valid_block_height for pending in self.pending.values()):
+                return
+        block_height = (await self.connection.get_block_height(self.commitment)).value
+        expired = [
+            pending.signature for pending in self.pending.values()
+            if block_height > pending.last_valid_block_height
+        ]
+        if not expired:
+            return
+        # one last look, with history, for transactions that landed since the poll
+        responses = await asyncio.gather(*[
+            self.connection.get_signature_statuses(
+                expired[i:i + MAX_SIGNATURE_STATUSES],
+                search_transaction_history=True,
+            )
+            for i in range(0, len(expired), MAX_SIGNATURE_STATUSES)
+        ])
+        statuses = [status for resp in responses for status in resp.value]
+        for signature, status in zip(expired, statuses):
+            if not self._on_status(signature, status):
+                self._resolve(signature, exception=TransactionExpiredError(signature))
+
+    async def _resend(self, pending: PendingTransaction):
+        # the same signed bytes, so a landed transaction can't execute twice
+        try:
+            await self.connection.send_raw_transaction(pending.tx_bytes, RESEND_OPTIONS)
+        except Exception as e:
+            logger.debug("resend of %s failed: %r", pending.signature, e)
+
+    def _resolve(self, signature: Signature, result=None, exception: Optional[Exception] = None):
+        pending = self.pending.pop(signature, None)
+        if pending is None or pending.future.done():
+            return
+        if exception is not None:
+            pending.future.set_exception(exception)
+        else:
+            pending.future.set_result(result)
@@ -3,4 +3,7 @@ from solders.pubkey import Pubkey
 # v0.3 programs
 AMM_PROGRAM_ID = Pubkey.from_string("AMM5G2nxuKUwCLRYTW7qqEwuoqCtNSjtbipwEmm2g8bH")
 CONDITIONAL_VAULT_PROGRAM_ID = Pubkey.from_string("VAU1T7S5UuEHmMvXtXMVmpEoQtZ2ya7eRb7gcN47wDp")
-AUTOCRAT_PROGRAM_ID = Pubkey.from_string("autoQP9RmUNkzzKRXsMkWicDVZ3h29vvyMDcAYjCxxg")
\ No newline at end of file
+AUTOCRAT_PROGRAM_ID = Pubkey.from_string("autoQP9RmUNkzzKRXsMkWicDVZ3h29vvyMDcAYjCxxg")
+
+# getMultipleAccounts accepts at most this many keys per request
+MAX_MULTIPLE_ACCOUNTS = 100
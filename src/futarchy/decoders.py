@@ -0,0 +1,274 @@
+import hashlib
+import struct
+from typing import Union
+from solders.pubkey import Pubkey
+
+from futarchy.types import (
+    Amm,
+    ConditionalVault,
+    Dao,
+    Proposal,
+    ProposalAccount,
+    ProposalInstruction,
+    ProposalState,
+    TwapOracle,
+    VaultStatus,
+)
+
+# hand-written borsh layouts for the v0.3 accounts. The anchorpy coders stay
+# the reference implementation, these have to decode to the same values
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+def account_discriminator(name: str) -> bytes:
+    return hashlib.sha256(f"account:{name}".encode()).digest()[:8]
+
+AMM_DISCRIMINATOR = account_discriminator("Amm")
+CONDITIONAL_VAULT_DISCRIMINATOR = account_discriminator("ConditionalVault")
+PROPOSAL_DISCRIMINATOR = account_discriminator("Proposal")
+DAO_DISCRIMINATOR = account_discriminator("Dao")
+
+# u128 fields are read as two u64 halves
+TWAP_ORACLE_LAYOUT = struct.Struct("<Q" + "QQ" * 5)
+AMM_LAYOUT = struct.Struct("<8sBQ32s32s32sBBQQ")
+AMM_SIZE = AMM_LAYOUT.size + TWAP_ORACLE_LAYOUT.size
+CONDITIONAL_VAULT_LAYOUT = struct.Struct("<8sB32s32s32s32s32sBB")
+DAO_LAYOUT = struct.Struct("<8sB32s32s32sIHQQQQQQQ")
+
+VAULT_STATUSES = (VaultStatus.Active, VaultStatus.Finalized, VaultStatus.Reverted)
+PROPOSAL_STATES = (ProposalState.Pending, ProposalState.Passed, ProposalState.Failed, ProposalState.Executed)
+
+U8 = struct.Struct("<B")
+U32 = struct.Struct("<I")
+U64 = struct.Struct("<Q")
+U128 = struct.Struct("<QQ")
+
+
+def _check(data: Buffer, discriminator: bytes, size: int, name: str):
+    if len(data) < size:
+        raise ValueError(f"{name} account data is too short: {len(data)} < {size}")
+    if bytes(data[:8]) != discriminator:
+        raise ValueError(f"invalid {name} account discriminator")
+
+def _decode_twap_oracle(data: Buffer, offset: int) -> TwapOracle:
+    (
+        last_updated_slot,
+        last_price_lo, last_price_hi,
+        last_observation_lo, last_observation_hi,
+        aggregator_lo, aggregator_hi,
+        max_change_lo, max_change_hi,
+        initial_observation_lo, initial_observation_hi,
+    ) = TWAP_ORACLE_LAYOUT.unpack_from(data, offset)
+    return TwapOracle(
+        last_updated_slot=last_updated_slot,
+        last_price=last_price_lo | last_price_hi << 64,
+        last_observation=last_observation_lo | last_observation_hi << 64,
+        aggregator=aggregator_lo | aggregator_hi << 64,
+        max_observation_change_per_update=max_change_lo | max_change_hi << 64,
+        initial_observation=initial_observation_lo | initial_observation_hi << 64,
+    )
+
+def decode_amm(data: Buffer) -> Amm:
+    _check(data, AMM_DISCRIMINATOR, AMM_SIZE, "Amm")
+    (
+        _, bump, created_at_slot, lp_mint, base_mint, quote_mint,
+        base_mint_decimals, quote_mint_decimals, base_amount, quote_amount,
+    ) = AMM_LAYOUT.unpack_from(data)
+    return Amm(
+        bump=bump,
+        created_at_slot=created_at_slot,
+        lp_mint=Pubkey.from_bytes(lp_mint),
+        base_mint=Pubkey.from_bytes(base_mint),
+        quote_mint=Pubkey.from_bytes(quote_mint),
+        base_mint_decimals=base_mint_decimals,
+        quote_mint_decimals=quote_mint_decimals,
+        base_amount=base_amount,
+        quote_amount=quote_amount,
+        oracle=_decode_twap_oracle(data, AMM_LAYOUT.size),
+    )
+
+def decode_conditional_vault(data: Buffer) -> ConditionalVault:
+    _check(data, CONDITIONAL_VAULT_DISCRIMINATOR, CONDITIONAL_VAULT_LAYOUT.size, "ConditionalVault")
+    (
+        _, status, settlement_authority, underlying_token_mint, underlying_token_account,
+        conditional_on_finalize_token_mint, conditional_on_revert_token_mint, pda_bump, decimals,
+    ) = CONDITIONAL_VAULT_LAYOUT.unpack_from(data)
+    return ConditionalVault(
+        status=VAULT_STATUSES[status](),
+        settlement_authority=Pubkey.from_bytes(settlement_authority),
+        underlying_token_mint=Pubkey.from_bytes(underlying_token_mint),
+        underlying_token_account=Pubkey.from_bytes(underlying_token_account),
+        conditional_on_finalize_token_mint=Pubkey.from_bytes(conditional_on_finalize_token_mint),
+        conditional_on_revert_token_mint=Pubkey.from_bytes(conditional_on_revert_token_mint),
+        pda_bump=pda_bump,
+        decimals=decimals,
+    )
+
+def decode_dao(data: Buffer) -> Dao:
+    _check(data, DAO_DISCRIMINATOR, DAO_LAYOUT.size, "Dao")
+    (
+        _, treasury_pda_bump, treasury, token_mint, usdc_mint, proposal_count, pass_threshold_bps,
+        slots_per_proposal, initial_lo, initial_hi, max_change_lo, max_change_hi,
+        min_quote_futarchic_liquidity, min_base_futarchic_liquidity,
+    ) = DAO_LAYOUT.unpack_from(data)
+    return Dao(
+        treasury_pda_bump=treasury_pda_bump,
+        treasury=Pubkey.from_bytes(treasury),
+        token_mint=Pubkey.from_bytes(token_mint),
+        usdc_mint=Pubkey.from_bytes(usdc_mint),
+        proposal_count=proposal_count,
+        pass_threshold_bps=pass_threshold_bps,
+        slots_per_proposal=slots_per_proposal,
+        twap_initial_observation=initial_lo | initial_hi << 64,
+        twap_max_observation_change_per_update=max_change_lo | max_change_hi << 64,
+        min_quote_futarchic_liquidity=min_quote_futarchic_liquidity,
+        min_base_futarchic_liquidity=min_base_futarchic_liquidity,
+    )
+
+def decode_proposal(data: Buffer) -> Proposal:
+    # the url and instruction are variable length, so this walks an offset
+    _check(data, PROPOSAL_DISCRIMINATOR, 8, "Proposal")
+    data = memoryview(data)
+    offset = 8
+    number, = U32.unpack_from(data, offset)
+    proposer = Pubkey.from_bytes(bytes(data[offset + 4:offset + 36]))
+    offset += 36
+    url_len, = U32.unpack_from(data, offset)
+    description_url = bytes(data[offset + 4:offset + 4 + url_len]).decode()
+    offset += 4 + url_len
+    slot_enqueued, state = struct.unpack_from("<QB", data, offset)
+    offset += 9
+    program_id = Pubkey.from_bytes(bytes(data[offset:offset + 32]))
+    num_accounts, = U32.unpack_from(data, offset + 32)
+    offset += 36
+    accounts = []
+    for _ in range(num_accounts):
+        accounts.append(ProposalAccount(
+            pubkey=Pubkey.from_bytes(bytes(data[offset:offset + 32])),
+            is_signer=data[offset + 32] != 0,
+            is_writable=data[offset + 33] != 0,
+        ))
+        offset += 34
+    data_len, = U32.unpack_from(data, offset)
+    ix_data = bytes(data[offset + 4:offset + 4 + data_len])
+    offset += 4 + data_len
+    keys = [Pubkey.from_bytes(bytes(data[offset + 32 * i:offset + 32 * (i + 1)])) for i in range(5)]
+    offset += 160
+    pass_lp_tokens_locked, fail_lp_tokens_locked, nonce, pda_bump = struct.unpack_from("<QQQB", data, offset)
+    return Proposal(
+        number=number,
+        proposer=proposer,
+        description_url=description_url,
+        slot_enqueued=slot_enqueued,
+        state=PROPOSAL_STATES[state](),
+        instruction=ProposalInstruction(program_id=program_id, accounts=accounts, data=ix_data),
+        pass_amm=keys[0],
+        fail_amm=keys[1],
+        base_vault=keys[2],
+        quote_vault=keys[3],
+        dao=keys[4],
+        pass_lp_tokens_locked=pass_lp_tokens_locked,
+        fail_lp_tokens_locked=fail_lp_tokens_locked,
+        nonce=nonce,
+        pda_bump=pda_bump,
+    )
+
+
+class _U8:
+    def __init__(self, offset: int):
+        self.offset = offset
+
+    def __get__(self, view, owner):
+        return view._data[view._offset + self.offset]
+
+class _U64:
+    def __init__(self, offset: int):
+        self.offset = offset
+
+    def __get__(self, view, owner):
+        return U64.unpack_from(view._data, view._offset + self.offset)[0]
+
+class _U128:
+    def __init__(self, offset: int):
+        self.offset = offset
+
+    def __get__(self, view, owner):
+        lo, hi = U128.unpack_from(view._data, view._offset + self.offset)
+        return lo | hi << 64
+
+class _Pubkey:
+    def __init__(self, offset: int):
+        self.offset = offset
+
+    def __get__(self, view, owner):
+        start = view._offset + self.offset
+        return Pubkey.from_bytes(bytes(view._data[start:start + 32]))
+
+
+class TwapOracleView:
+    # decodes each field from the underlying buffer when it's read
+    __slots__ = ("_data", "_offset")
+
+    last_updated_slot = _U64(0)
+    last_price = _U128(8)
+    last_observation = _U128(24)
+    aggregator = _U128(40)
+    max_observation_change_per_update = _U128(56)
+    initial_observation = _U128(72)
+
+    def __init__(self, data: Buffer, offset: int = 0):
+        self._data = memoryview(data)
+        self._offset = offset
+
+    def to_twap_oracle(self) -> TwapOracle:
+        return _decode_twap_oracle(self._data, self._offset)
+
+
+class AmmView:
+    __slots__ = ("_data", "_offset")
+
+    bump = _U8(8)
+    created_at_slot = _U64(9)
+    lp_mint = _Pubkey(17)
+    base_mint = _Pubkey(49)
+    quote_mint = _Pubkey(81)
+    base_mint_decimals = _U8(113)
+    quote_mint_decimals = _U8(114)
+    base_amount = _U64(115)
+    quote_amount = _U64(123)
+
+    def __init__(self, data: Buffer):
+        _check(data, AMM_DISCRIMINATOR, AMM_SIZE, "Amm")
+        self._data = memoryview(data)
+        self._offset = 0
+
+    @property
+    def oracle(self) -> TwapOracleView:
+        return TwapOracleView(self._data, AMM_LAYOUT.size)
+
+    def to_amm(self) -> Amm:
+        return decode_amm(self._data)
+
+
+class ConditionalVaultView:
+    __slots__ = ("_data", "_offset")
+
+    settlement_authority = _Pubkey(9)
+    underlying_token_mint = _Pubkey(41)
+    underlying_token_account = _Pubkey(73)
+    conditional_on_finalize_token_mint = _Pubkey(105)
+    conditional_on_revert_token_mint = _Pubkey(137)
+    pda_bump = _U8(169)
+    decimals = _U8(170)
+
+    def __init__(self, data: Buffer):
+        _check(data, CONDITIONAL_VAULT_DISCRIMINATOR, CONDITIONAL_VAULT_LAYOUT.size, "ConditionalVault")
+        self._data = memoryview(data)
+        self._offset = 0
+
+    @property
+    def status(self) -> VaultStatus:
+        return VAULT_STATUSES[self._data[8]]()
+
+    def to_conditional_vault(self) -> ConditionalVault:
+        return decode_conditional_vault(self._data)
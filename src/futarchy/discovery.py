@@ -0,0 +1,194 @@
+import asyncio
+import bisect
+import logging
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Set, Tuple
+import based58
+from solders.pubkey import Pubkey
+from solana.rpc.async_api import AsyncClient
+from solana.rpc.commitment import Commitment, Confirmed
+from solana.rpc.types import MemcmpOpts
+
+from futarchy.constants import AUTOCRAT_PROGRAM_ID
+from futarchy.decoders import PROPOSAL_DISCRIMINATOR, decode_proposal
+from futarchy.subscriptions import subscribe_program
+from futarchy.types import DataAndSlot, Proposal
+
+logger = logging.getLogger(__name__)
+
+# the dao comes after the url and the instruction, which are both variable
+# length, so it can't be a memcmp filter and is matched after decoding
+PROPOSAL_FILTERS = [MemcmpOpts(offset=0, bytes=based58.b58encode(PROPOSAL_DISCRIMINATOR).decode())]
+
+
+class ProposalIndex:
+    def __init__(self):
+        self.proposals: Dict[Pubkey, DataAndSlot[Proposal]] = {}
+        self.by_dao: Dict[Pubkey, Set[Pubkey]] = defaultdict(set)
+        # by ProposalState index
+        self.by_state: Dict[int, Set[Pubkey]] = defaultdict(set)
+        # (slot_enqueued, pubkey bytes), kept sorted for range queries
+        self.by_slot_enqueued: List[Tuple[int, bytes]] = []
+
+    def __len__(self) -> int:
+        return len(self.proposals)
+
+    def __contains__(self, pubkey: Pubkey) -> bool:
+        return pubkey in self.proposals
+
+    def get(self, pubkey: Pubkey) -> Optional[Proposal]:
+        data_and_slot = self.proposals.get(pubkey)
+        return None if data_and_slot is None else data_and_slot.data
+
+    def update(self, pubkey: Pubkey, data_and_slot: DataAndSlot[Proposal]) -> bool:
+        current = self.proposals.get(pubkey)
+        if current is not None:
+            if data_and_slot.slot < current.slot:
+                return False
+            self._unindex(pubkey, current.data)
+        self.proposals[pubkey] = data_and_slot
+        proposal = data_and_slot.data
+        self.by_dao[proposal.dao].add(pubkey)
+        self.by_state[proposal.state.index].add(pubkey)
+        bisect.insort(self.by_slot_enqueued, (proposal.slot_enqueued, bytes(pubkey)))
+        return True
+
+    def remove(self, pubkey: Pubkey):
+        current = self.proposals.pop(pubkey, None)
+        if current is not None:
+            self._unindex(pubkey, current.data)
+
+    def _unindex(self, pubkey: Pubkey, proposal: Proposal):
+        self.by_dao[proposal.dao].discard(pubkey)
+        if not self.by_dao[proposal.dao]:
+            del self.by_dao[proposal.dao]
+        self.by_state[proposal.state.index].discard(pubkey)
+        key = (proposal.slot_enqueued, bytes(pubkey))
+        i = bisect.bisect_left(self.by_slot_enqueued, key)
+        if i < len(self.by_slot_enqueued) and self.by_slot_enqueued[i] == key:
+            del self.by_slot_enqueued[i]
+
+    def find(
+        self,
+        dao: Optional[Pubkey] = None,
+        state=None,
+        min_slot_enqueued: Optional[int] = None,
+        max_slot_enqueued: Optional[int] = None,
+    ) -> List[Pubkey]:
+        # ordered by slot_enqueued, state is a ProposalState variant
+        candidates: Optional[Set[Pubkey]] = None
+        if dao is not None:
+            candidates = self.by_dao.get(dao, set())
+        if state is not None:
+            with_state = self.by_state.get(state.index, set())
+            candidates = with_state if candidates is None else candidates & with_state
+        lo = 0
+        if min_slot_enqueued is not None:
+            lo = bisect.bisect_left(self.by_slot_enqueued, (min_slot_enqueued, b""))
+        hi = len(self.by_slot_enqueued)
+        if max_slot_enqueued is not None:
+            hi = bisect.bisect_left(self.by_slot_enqueued, (max_slot_enqueued + 1, b""))
+        results = []
+        for _, key in self.by_slot_enqueued[lo:hi]:
+            pubkey = Pubkey.from_bytes(key)
+            if candidates is None or pubkey in candidates:
+                results.append(pubkey)
+        return results
+
+
+class ProposalDiscovery:
+    def __init__(
+        self,
+        connection: AsyncClient,
+        ws_url: Optional[str] = None,
+        dao: Optional[Pubkey] = None,
+        commitment: Commitment = Confirmed,
+    ):
+        self.connection = connection
+        self.ws_url = ws_url
+        # only proposals of this dao are indexed when given
+        self.dao = dao
+        self.commitment = commitment
+        self.index = ProposalIndex()
+        # called with (pubkey, slot, proposal) for every accepted update
+        self.listeners: List[Callable[[Pubkey, int, Proposal], None]] = []
+        self._task: Optional[asyncio.Task] = None
+        self._scan_task: Optional[asyncio.Task] = None
+
+    def start(self):
+        # the subscription rescans on every connect, which also makes the
+        # initial scan, without a ws_url there is only the initial scan
+        if self.ws_url is None:
+            self._on_connect()
+        elif self._task is None:
+            self._task = asyncio.create_task(subscribe_program(
+                self.ws_url,
+                AUTOCRAT_PROGRAM_ID,
+                self._on_account,
+                PROPOSAL_FILTERS,
+                self._on_connect,
+                self.commitment,
+            ))
+
+    async def stop(self):
+        for task in (self._task, self._scan_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = None
+        self._scan_task = None
+
+    def _on_connect(self):
+        if self._scan_task is None or self._scan_task.done():
+            self._scan_task = asyncio.create_task(self._rescan())
+
+    async def _rescan(self):
+        try:
+            await self.scan()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("proposal scan failed: %r", e)
+
+    async def scan(self):
+        # getProgramAccounts has no context, so the scan is stamped with the
+        # slot before it and anything newer from the subscription wins
+        slot = (await self.connection.get_slot(self.commitment)).value
+        resp = await self.connection.get_program_accounts(
+            AUTOCRAT_PROGRAM_ID,
+            self.commitment,
+            encoding="base64",
+            filters=PROPOSAL_FILTERS,
+        )
+        seen = set()
+        for keyed_account in resp.value:
+            seen.add(keyed_account.pubkey)
+            self._on_account(keyed_account.pubkey, slot, keyed_account.account.data)
+        for pubkey in list(self.index.proposals):
+            if pubkey not in seen and self.index.proposals[pubkey].slot <= slot:
+                self.index.remove(pubkey)
+
+    def _on_account(self, pubkey: Pubkey, slot: int, data: bytes):
+        try:
+            proposal = decode_proposal(data)
+        except Exception:
+            # closed or not a proposal anymore
+            self.index.remove(pubkey)
+            return
+        if self.dao is not None and proposal.dao != self.dao:
+            return
+        if self.index.update(pubkey, DataAndSlot(slot, proposal)):
+            for listener in self.listeners:
+                listener(pubkey, slot, proposal)
+
+    def find(
+        self,
+        dao: Optional[Pubkey] = None,
+        state=None,
+        min_slot_enqueued: Optional[int] = None,
+        max_slot_enqueued: Optional[int] = None,
+    ) -> List[Pubkey]:
+        return self.index.find(dao, state, min_slot_enqueued, max_slot_enqueued)
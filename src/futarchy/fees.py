@@ -0,0 +1,93 @@
+import asyncio
+import json
+import logging
+import math
+from typing import Dict, Iterable, Optional
+from solders.pubkey import Pubkey
+from solana.rpc.async_api import AsyncClient
+
+logger = logging.getLogger(__name__)
+
+
+class GetRecentPrioritizationFees:
+    # request body for the provider, solders has no type for this method
+    def __init__(self, addresses: Iterable[Pubkey], id: int = 0):
+        self.addresses = list(addresses)
+        self.id = id
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "jsonrpc": "2.0",
+            "id": self.id,
+            "method": "getRecentPrioritizationFees",
+            "params": [[str(address) for address in self.addresses]],
+        })
+
+
+async def get_recent_prioritization_fees(connection: AsyncClient, addresses: Iterable[Pubkey]) -> Dict[int, int]:
+    raw = await connection._provider.make_request_unparsed(GetRecentPrioritizationFees(addresses))
+    resp = json.loads(raw)
+    if "error" in resp:
+        raise RuntimeError(f"getRecentPrioritizationFees failed: {resp['error']}")
+    return {fee["slot"]: fee["prioritizationFee"] for fee in resp["result"]}
+
+
+class PriorityFeeOracle:
+    def __init__(
+        self,
+        connection: AsyncClient,
+        accounts: Iterable[Pubkey],
+        percentile: float = 75,
+        max_price: int = 1_000_000,
+        min_price: int = 0,
+        window_slots: int = 150,
+        refresh_interval: float = 2.0,
+    ):
+        self.connection = connection
+        self.accounts = list(accounts)
+        self.percentile = percentile
+        # micro-lamports per compute unit
+        self.max_price = max_price
+        self.min_price = min_price
+        self.window_slots = window_slots
+        self.refresh_interval = refresh_interval
+        self.fees: Dict[int, int] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("prioritization fee refresh failed: %r", e)
+            await asyncio.sleep(self.refresh_interval)
+
+    async def refresh(self):
+        self.fees.update(await get_recent_prioritization_fees(self.connection, self.accounts))
+        if self.fees:
+            oldest = max(self.fees) - self.window_slots
+            self.fees = {slot: fee for slot, fee in self.fees.items() if slot > oldest}
+
+    def get_price(self, percentile: Optional[float] = None, max_price: Optional[int] = None) -> int:
+        percentile = self.percentile if percentile is None else percentile
+        max_price = self.max_price if max_price is None else max_price
+        if not self.fees:
+            return min(max(self.min_price, 0), max_price)
+        fees = sorted(self.fees.values())
+        index = min(len(fees) - 1, max(0, math.ceil(percentile / 100 * len(fees)) - 1))
+        return min(max(fees[index], self.min_price), max_price)
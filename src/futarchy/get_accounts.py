@@ -1,13 +1,19 @@
-from typing import cast, Optional, Callable
+import asyncio
+from typing import TYPE_CHECKING, cast, Optional, Callable, Any, List, Sequence
 from solders.pubkey import Pubkey
-from anchorpy import Program, ProgramAccount
+from solana.rpc.async_api import AsyncClient
 from solana.rpc.commitment import Commitment, Processed
 
+from futarchy.constants import MAX_MULTIPLE_ACCOUNTS
+from futarchy.decoders import decode_amm, decode_conditional_vault, decode_dao, decode_proposal
 from futarchy.types import *
 
+if TYPE_CHECKING:
+    from anchorpy import Program
+
 async def get_account_data_and_slot(
     address: Pubkey,
-    program: Program,
+    program: "Program",
     commitment: Commitment = Processed,
     decode: Optional[Callable[[bytes], T]] = None,
 ) -> Optional[DataAndSlot[T]]:
@@ -30,33 +36,122 @@ async def get_account_data_and_slot(
     return DataAndSlot(slot, decoded_data)
 
 
+async def get_multiple_accounts_data_and_slot(
+    connection: AsyncClient,
+    addresses: Sequence[Pubkey],
+    decoders: Sequence[Callable[[bytes], Any]],
+    commitment: Commitment = Processed,
+) -> List[Optional[DataAndSlot[Any]]]:
+    # each result carries the slot of the chunk it was read in
+    chunks = [
+        list(addresses[i:i + MAX_MULTIPLE_ACCOUNTS])
+        for i in range(0, len(addresses), MAX_MULTIPLE_ACCOUNTS)
+    ]
+    responses = await asyncio.gather(*[
+        connection.get_multiple_accounts(chunk, commitment=commitment, encoding="base64")
+        for chunk in chunks
+    ])
+
+    results = []
+    for resp in responses:
+        slot = resp.context.slot
+        for account in resp.value:
+            decode = decoders[len(results)]
+            if account is None:
+                results.append(None)
+            else:
+                results.append(DataAndSlot(slot, decode(account.data)))
+    return results
+
+
 async def get_amm_account(
-    program: Program,
+    program: "Program",
     amm_account_pubkey: Pubkey,
 ) -> Amm:
-    data_and_slot = await get_account_data_and_slot(amm_account_pubkey, program)
+    data_and_slot = await get_account_data_and_slot(amm_account_pubkey, program, decode=decode_amm)
     return cast(Amm, data_and_slot.data)
 
 
 async def get_conditional_vault_account(
-    program: Program,
+    program: "Program",
     conditional_vault_pubkey: Pubkey,
 ) -> ConditionalVault:
-    data_and_slot = await get_account_data_and_slot(conditional_vault_pubkey, program)
+    data_and_slot = await get_account_data_and_slot(conditional_vault_pubkey, program, decode=decode_conditional_vault)
     return cast(ConditionalVault, data_and_slot.data)
 
 
 async def get_proposal_account(
-    program: Program,
+    program: "Program",
     proposal_pubkey: Pubkey,
 ) -> Proposal:
-    data_and_slot = await get_account_data_and_slot(proposal_pubkey, program)
+    data_and_slot = await get_account_data_and_slot(proposal_pubkey, program, decode=decode_proposal)
     return cast(Proposal, data_and_slot.data)
 
 
 async def get_dao_account(
-    program: Program,
+    program: "Program",
     dao_pubkey: Pubkey,
 ) -> Dao:
-    data_and_slot = await get_account_data_and_slot(dao_pubkey, program)
+    data_and_slot = await get_account_data_and_slot(dao_pubkey, program, decode=decode_dao)
     return cast(Dao, data_and_slot.data)
+
+
+async def get_proposal_accounts(
+    autocrat_program: "Program",
+    proposal_pubkey: Pubkey,
+    commitment: Commitment = Processed,
+) -> ProposalAccounts:
+    accounts = await get_proposals_accounts(autocrat_program, [proposal_pubkey], commitment)
+    return accounts[0]
+
+
+async def get_proposals_accounts(
+    autocrat_program: "Program",
+    proposal_pubkeys: Sequence[Pubkey],
+    commitment: Commitment = Processed,
+) -> List[ProposalAccounts]:
+    return await fetch_proposals_accounts(autocrat_program.provider.connection, proposal_pubkeys, commitment)
+
+
+async def fetch_proposals_accounts(
+    connection: AsyncClient,
+    proposal_pubkeys: Sequence[Pubkey],
+    commitment: Commitment = Processed,
+) -> List[ProposalAccounts]:
+    # decoded without the anchorpy coders, so no Program is needed
+    proposals = await get_multiple_accounts_data_and_slot(
+        connection,
+        proposal_pubkeys,
+        [decode_proposal] * len(proposal_pubkeys),
+        commitment,
+    )
+    for proposal_pubkey, proposal in zip(proposal_pubkeys, proposals):
+        if proposal is None:
+            raise ValueError(f"proposal account {proposal_pubkey} not found")
+
+    addresses = []
+    for proposal in proposals:
+        proposal = cast(Proposal, proposal.data)
+        addresses += [proposal.base_vault, proposal.quote_vault, proposal.pass_amm, proposal.fail_amm]
+    accounts = await get_multiple_accounts_data_and_slot(
+        connection,
+        addresses,
+        [decode_conditional_vault, decode_conditional_vault, decode_amm, decode_amm] * len(proposals),
+        commitment,
+    )
+    for address, account in zip(addresses, accounts):
+        if account is None:
+            raise ValueError(f"account {address} not found")
+
+    results = []
+    for i, proposal in enumerate(proposals):
+        base_vault, quote_vault, pass_amm, fail_amm = accounts[4 * i:4 * i + 4]
+        results.append(ProposalAccounts(
+            slot=pass_amm.slot,
+            proposal=cast(Proposal, proposal.data),
+            base_vault=cast(ConditionalVault, base_vault.data),
+            quote_vault=cast(ConditionalVault, quote_vault.data),
+            pass_amm=cast(Amm, pass_amm.data),
+            fail_amm=cast(Amm, fail_amm.data),
+        ))
+    return results
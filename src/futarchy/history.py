@@ -0,0 +1,306 @@
+import asyncio
+import json
+import logging
+import os
+from dataclasses import dataclass, fields
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, TypeVar, Union
+import based58
+from anchorpy import Program
+from solders.pubkey import Pubkey
+from solders.signature import Signature
+from solders.rpc.responses import GetSignaturesForAddressResp, GetTransactionResp
+from solders.transaction_status import EncodedConfirmedTransactionWithStatusMeta
+from solana.rpc.async_api import AsyncClient
+from solana.rpc.commitment import Commitment, Confirmed
+
+from futarchy.client import ProposalClient
+from futarchy.constants import AMM_PROGRAM_ID
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# getSignaturesForAddress returns at most this many per page
+MAX_SIGNATURES_PER_PAGE = 1000
+# swap accounts: user, amm, user_base_account, user_quote_account, vault_ata_base, vault_ata_quote
+SWAP_AMM_INDEX = 1
+SWAP_USER_INDEX = 0
+SWAP_VAULT_ATA_BASE_INDEX = 4
+SWAP_VAULT_ATA_QUOTE_INDEX = 5
+# segment schema metadata key holding the cursors written with it
+CURSORS_METADATA_KEY = b"cursors"
+
+
+@dataclass
+class SwapRecord:
+    slot: int
+    block_time: Optional[int]
+    signature: str
+    # index of the top level instruction, and of the inner instruction under
+    # it when the swap was a cpi
+    instruction_index: int
+    inner_instruction_index: Optional[int]
+    amm: str
+    user: str
+    # 0 buy, 1 sell
+    swap_type: int
+    input_amount: int
+    output_amount_min: int
+    # change of the amm's reserve accounts over the whole transaction
+    base_delta: int
+    quote_delta: int
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("swap history storage requires pyarrow, install futarchy[arrow]")
+
+def get_swap_schema():
+    _require_pyarrow()
+    return pa.schema([
+        ("slot", pa.uint64()),
+        ("block_time", pa.int64()),
+        ("signature", pa.string()),
+        ("instruction_index", pa.uint16()),
+        ("inner_instruction_index", pa.uint16()),
+        ("amm", pa.string()),
+        ("user", pa.string()),
+        ("swap_type", pa.uint8()),
+        ("input_amount", pa.uint64()),
+        ("output_amount_min", pa.uint64()),
+        ("base_delta", pa.int64()),
+        ("quote_delta", pa.int64()),
+    ])
+
+
+def decode_swaps(
+    amm_program: Program,
+    tx: EncodedConfirmedTransactionWithStatusMeta,
+    amm: Optional[Pubkey] = None,
+) -> List[SwapRecord]:
+    # expects a base64 encoded transaction, failed transactions have no swaps
+    meta = tx.transaction.meta
+    if meta is None or meta.err is not None:
+        return []
+    message = tx.transaction.transaction.message
+    account_keys = list(message.account_keys)
+    if meta.loaded_addresses is not None:
+        account_keys += list(meta.loaded_addresses.writable) + list(meta.loaded_addresses.readonly)
+    signature = str(tx.transaction.transaction.signatures[0])
+
+    ixs = []
+    inner = {inner_ixs.index: inner_ixs.instructions for inner_ixs in (meta.inner_instructions or [])}
+    for i, ix in enumerate(message.instructions):
+        ixs.append((i, None, account_keys[ix.program_id_index], bytes(ix.data), list(ix.accounts)))
+        for j, inner_ix in enumerate(inner.get(i, [])):
+            ixs.append((i, j, account_keys[inner_ix.program_id_index], based58.b58decode(inner_ix.data.encode()), list(inner_ix.accounts)))
+
+    balance_deltas: Dict[int, int] = {}
+    for balance in meta.pre_token_balances or []:
+        balance_deltas[balance.account_index] = balance_deltas.get(balance.account_index, 0) - int(balance.ui_token_amount.amount)
+    for balance in meta.post_token_balances or []:
+        balance_deltas[balance.account_index] = balance_deltas.get(balance.account_index, 0) + int(balance.ui_token_amount.amount)
+
+    records = []
+    for index, inner_index, program_id, data, accounts in ixs:
+        if program_id != AMM_PROGRAM_ID:
+            continue
+        try:
+            named = amm_program.coder.instruction.parse(data)
+        except Exception:
+            continue
+        if named.name != "swap" or len(accounts) <= SWAP_VAULT_ATA_QUOTE_INDEX:
+            continue
+        swap_amm = account_keys[accounts[SWAP_AMM_INDEX]]
+        if amm is not None and swap_amm != amm:
+            continue
+        args = named.data.args
+        records.append(SwapRecord(
+            slot=tx.slot,
+            block_time=tx.block_time,
+            signature=signature,
+            instruction_index=index,
+            inner_instruction_index=inner_index,
+            amm=str(swap_amm),
+            user=str(account_keys[accounts[SWAP_USER_INDEX]]),
+            swap_type=args.swap_type.index,
+            input_amount=args.input_amount,
+            output_amount_min=args.output_amount_min,
+            base_delta=balance_deltas.get(accounts[SWAP_VAULT_ATA_BASE_INDEX], 0),
+            quote_delta=balance_deltas.get(accounts[SWAP_VAULT_ATA_QUOTE_INDEX], 0),
+        ))
+    return records
+
+
+async def with_retry(
+    fn: Callable[[], Awaitable[T]],
+    resp_type: type,
+    retries: int = 5,
+    backoff: float = 0.5,
+) -> T:
+    # rpc errors come back parsed in place of the response rather than raised
+    for attempt in range(retries + 1):
+        try:
+            resp = await fn()
+            if not isinstance(resp, resp_type):
+                raise RuntimeError(f"rpc error: {resp}")
+            return resp
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if attempt == retries:
+                raise
+            logger.warning("rpc request failed, retrying: %r", e)
+            await asyncio.sleep(backoff * 2 ** attempt)
+
+
+class SwapLog:
+    # a directory of immutable arrow ipc segments plus the backfill cursors,
+    # segments are only ever added so a reader can memory map them at any time.
+    # Each segment carries the cursors past its records in its metadata, so the
+    # records and the cursors land in the same rename and a resume can't
+    # ingest them twice. cursor.json holds cursors saved without records, the
+    # higher generation of the two wins
+    def __init__(self, directory: Union[str, Path]):
+        _require_pyarrow()
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.cursor_path = self.directory / "cursor.json"
+        self.schema = get_swap_schema()
+        self.generation, _ = self._load_state()
+
+    @property
+    def segments(self) -> List[Path]:
+        return sorted(self.directory.glob("swaps-*.arrow"))
+
+    def append(self, records: List[SwapRecord], cursors: Optional[Dict[str, dict]] = None):
+        if not records:
+            if cursors is not None:
+                self.save_cursors(cursors)
+            return
+        segments = self.segments
+        number = int(segments[-1].stem.split("-")[1]) + 1 if segments else 0
+        columns = {f.name: [getattr(record, f.name) for record in records] for f in fields(SwapRecord)}
+        schema = self.schema
+        if cursors is not None:
+            schema = schema.with_metadata({CURSORS_METADATA_KEY: self._dump_state(cursors)})
+        batch = pa.RecordBatch.from_pydict(columns, schema=schema)
+        path = self.directory / f"swaps-{number:08d}.arrow"
+        tmp_path = path.with_suffix(".tmp")
+        with pa.OSFile(str(tmp_path), "wb") as sink:
+            with pa.ipc.new_file(sink, schema) as writer:
+                writer.write_batch(batch)
+        os.replace(tmp_path, path)
+
+    def read(self) -> "pa.Table":
+        tables = [
+            pa.ipc.open_file(pa.memory_map(str(path))).read_all().replace_schema_metadata()
+            for path in self.segments
+        ]
+        if not tables:
+            return self.schema.empty_table()
+        return pa.concat_tables(tables)
+
+    def load_cursors(self) -> Dict[str, dict]:
+        _, cursors = self._load_state()
+        return cursors
+
+    def save_cursors(self, cursors: Dict[str, dict]):
+        tmp_path = self.cursor_path.with_suffix(".tmp")
+        tmp_path.write_bytes(self._dump_state(cursors))
+        os.replace(tmp_path, self.cursor_path)
+
+    def _dump_state(self, cursors: Dict[str, dict]) -> bytes:
+        self.generation += 1
+        return json.dumps({"generation": self.generation, "cursors": cursors}).encode()
+
+    def _load_state(self) -> Tuple[int, Dict[str, dict]]:
+        states = [{"generation": 0, "cursors": {}}]
+        if self.cursor_path.exists():
+            states.append(json.loads(self.cursor_path.read_bytes()))
+        segments = self.segments
+        if segments:
+            metadata = pa.ipc.open_file(pa.memory_map(str(segments[-1]))).schema.metadata or {}
+            if CURSORS_METADATA_KEY in metadata:
+                states.append(json.loads(metadata[CURSORS_METADATA_KEY]))
+        state = max(states, key=lambda state: state["generation"])
+        return state["generation"], state["cursors"]
+
+
+class SwapIngestor:
+    def __init__(
+        self,
+        connection: AsyncClient,
+        amm_program: Program,
+        log: SwapLog,
+        amms: Iterable[Pubkey],
+        concurrency: int = 8,
+        page_size: int = MAX_SIGNATURES_PER_PAGE,
+        retries: int = 5,
+        commitment: Commitment = Confirmed,
+    ):
+        self.connection = connection
+        self.amm_program = amm_program
+        self.log = log
+        self.amms = list(amms)
+        self.page_size = page_size
+        self.retries = retries
+        self.commitment = commitment
+        # shared by every amm so the rpc sees at most this many transaction requests
+        self.semaphore = asyncio.Semaphore(concurrency)
+        # per amm: newest is the newest ingested signature, head and before track
+        # a backfill in progress, so an interrupted run picks up where it stopped
+        self.cursors = log.load_cursors()
+
+    @classmethod
+    def from_client(cls, client: ProposalClient, directory: Union[str, Path], **kwargs) -> "SwapIngestor":
+        return cls(client.connection, client.amm_program, SwapLog(directory), [client.pass_amm, client.fail_amm], **kwargs)
+
+    async def run(self) -> int:
+        counts = await asyncio.gather(*(self.ingest(amm) for amm in self.amms))
+        return sum(counts)
+
+    async def ingest(self, amm: Pubkey) -> int:
+        cursor = self.cursors.setdefault(str(amm), {"newest": None, "head": None, "before": None})
+        newest = Signature.from_string(cursor["newest"]) if cursor["newest"] else None
+        count = 0
+        while True:
+            before = Signature.from_string(cursor["before"]) if cursor["before"] else None
+            resp = await with_retry(lambda: self.connection.get_signatures_for_address(
+                amm, before, newest, self.page_size, self.commitment
+            ), GetSignaturesForAddressResp, self.retries)
+            page = resp.value
+            if not page:
+                break
+            if cursor["head"] is None:
+                cursor["head"] = str(page[0].signature)
+            signatures = [info.signature for info in page if info.err is None]
+            txs = await asyncio.gather(*(self._get_transaction(signature) for signature in signatures))
+            records = [
+                record
+                for tx in txs if tx is not None
+                for record in decode_swaps(self.amm_program, tx, amm)
+            ]
+            cursor["before"] = str(page[-1].signature)
+            self.log.append(records, self.cursors)
+            count += len(records)
+        if cursor["head"] is not None:
+            cursor["newest"] = cursor["head"]
+        cursor["head"] = None
+        cursor["before"] = None
+        self.log.save_cursors(self.cursors)
+        return count
+
+    async def _get_transaction(self, signature: Signature) -> Optional[EncodedConfirmedTransactionWithStatusMeta]:
+        async with self.semaphore:
+            resp = await with_retry(lambda: self.connection.get_transaction(
+                signature, "base64", self.commitment, max_supported_transaction_version=0
+            ), GetTransactionResp, self.retries)
+        return resp.value
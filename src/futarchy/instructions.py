@@ -0,0 +1,109 @@
+import hashlib
+import struct
+from dataclasses import dataclass, fields
+from typing import Dict, List
+from solders.instruction import AccountMeta, Instruction
+from solders.pubkey import Pubkey
+
+from futarchy.constants import AMM_PROGRAM_ID, CONDITIONAL_VAULT_PROGRAM_ID
+
+# the encodings the client needs, so instructions can be built without
+# loading the IDLs into anchorpy Programs
+
+def instruction_discriminator(name: str) -> bytes:
+    return hashlib.sha256(f"global:{name}".encode()).digest()[:8]
+
+INSTRUCTION_DISCRIMINATORS: Dict[str, bytes] = {
+    name: instruction_discriminator(name) for name in (
+        "mint_conditional_tokens",
+        "merge_conditional_tokens_for_underlying_tokens",
+        "redeem_conditional_tokens_for_underlying_tokens",
+        "swap",
+        "crank_that_twap",
+        "finalize_proposal",
+    )
+}
+
+U64 = struct.Struct("<Q")
+SWAP_ARGS = struct.Struct("<BQQ")
+SWAP_TYPE_BUY = 0
+SWAP_TYPE_SELL = 1
+
+
+@dataclass(frozen=True, slots=True)
+class VaultAccounts:
+    vault: Pubkey
+    conditional_on_finalize_token_mint: Pubkey
+    conditional_on_revert_token_mint: Pubkey
+    vault_underlying_token_account: Pubkey
+    authority: Pubkey
+    user_conditional_on_finalize_token_account: Pubkey
+    user_conditional_on_revert_token_account: Pubkey
+    user_underlying_token_account: Pubkey
+    token_program: Pubkey
+
+    def as_dict(self) -> dict:
+        return {f.name: getattr(self, f.name) for f in fields(self)}
+
+    def to_account_metas(self) -> List[AccountMeta]:
+        # shared by mint, merge and redeem
+        return [
+            AccountMeta(self.vault, is_signer=False, is_writable=False),
+            AccountMeta(self.conditional_on_finalize_token_mint, is_signer=False, is_writable=True),
+            AccountMeta(self.conditional_on_revert_token_mint, is_signer=False, is_writable=True),
+            AccountMeta(self.vault_underlying_token_account, is_signer=False, is_writable=True),
+            AccountMeta(self.authority, is_signer=True, is_writable=False),
+            AccountMeta(self.user_conditional_on_finalize_token_account, is_signer=False, is_writable=True),
+            AccountMeta(self.user_conditional_on_revert_token_account, is_signer=False, is_writable=True),
+            AccountMeta(self.user_underlying_token_account, is_signer=False, is_writable=True),
+            AccountMeta(self.token_program, is_signer=False, is_writable=False),
+        ]
+
+@dataclass(frozen=True, slots=True)
+class SwapAccounts:
+    user: Pubkey
+    amm: Pubkey
+    user_base_account: Pubkey
+    user_quote_account: Pubkey
+    vault_ata_base: Pubkey
+    vault_ata_quote: Pubkey
+    token_program: Pubkey
+
+    def as_dict(self) -> dict:
+        return {f.name: getattr(self, f.name) for f in fields(self)}
+
+    def to_account_metas(self) -> List[AccountMeta]:
+        return [
+            AccountMeta(self.user, is_signer=True, is_writable=True),
+            AccountMeta(self.amm, is_signer=False, is_writable=True),
+            AccountMeta(self.user_base_account, is_signer=False, is_writable=True),
+            AccountMeta(self.user_quote_account, is_signer=False, is_writable=True),
+            AccountMeta(self.vault_ata_base, is_signer=False, is_writable=True),
+            AccountMeta(self.vault_ata_quote, is_signer=False, is_writable=True),
+            AccountMeta(self.token_program, is_signer=False, is_writable=False),
+        ]
+
+@dataclass(frozen=True, slots=True)
+class InstructionTemplate:
+    # an encoded instruction whose trailing argument bytes are filled in per call
+    program_id: Pubkey
+    discriminator: bytes
+    accounts: List[AccountMeta]
+
+    @classmethod
+    def from_instruction(cls, ix: Instruction) -> "InstructionTemplate":
+        return cls(ix.program_id, bytes(ix.data[:8]), list(ix.accounts))
+
+    def build(self, args: bytes = b"") -> Instruction:
+        return Instruction(self.program_id, self.discriminator + args, self.accounts)
+
+
+def get_vault_ix_template(name: str, accounts: VaultAccounts) -> InstructionTemplate:
+    return InstructionTemplate(
+        CONDITIONAL_VAULT_PROGRAM_ID,
+        INSTRUCTION_DISCRIMINATORS[name],
+        accounts.to_account_metas()
+    )
+
+def get_swap_ix_template(accounts: SwapAccounts) -> InstructionTemplate:
+    return InstructionTemplate(AMM_PROGRAM_ID, INSTRUCTION_DISCRIMINATORS["swap"], accounts.to_account_metas())
@@ -0,0 +1,147 @@
+import bisect
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    from opentelemetry import trace
+except ImportError:
+    trace = None
+
+# seconds, from 10us to 10s
+DEFAULT_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = list(buckets)
+        # the last count is the +Inf bucket
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        # linear within the bucket, like prometheus' histogram_quantile
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if seen + count >= rank and count > 0:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+
+class Hook:
+    # called with every finished span, start is a time.perf_counter() value
+    def on_span(self, name: str, start: float, duration: float, attributes: Optional[dict]):
+        pass
+
+
+class OpenTelemetryHook(Hook):
+    # spans are exported as already finished otel spans
+    def __init__(self, tracer=None):
+        if trace is None:
+            raise ImportError("the opentelemetry hook requires opentelemetry-api, install futarchy[otel]")
+        self.tracer = tracer if tracer is not None else trace.get_tracer(__name__)
+        # perf_counter and the wall clock differ by a constant
+        self.offset_ns = time.time_ns() - time.perf_counter_ns()
+
+    def on_span(self, name: str, start: float, duration: float, attributes: Optional[dict]):
+        start_ns = int(start * 1e9) + self.offset_ns
+        span = self.tracer.start_span(name, start_time=start_ns, attributes=attributes)
+        span.end(end_time=start_ns + int(duration * 1e9))
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    __slots__ = ("instrumentation", "name", "attributes", "start")
+
+    def __init__(self, instrumentation: "Instrumentation", name: str, attributes: Optional[dict]):
+        self.instrumentation = instrumentation
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.instrumentation.record(self.name, self.start, time.perf_counter() - self.start, self.attributes)
+        return False
+
+
+class Instrumentation:
+    def __init__(
+        self,
+        hooks: Sequence[Hook] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+        namespace: str = "futarchy",
+    ):
+        self.hooks: List[Hook] = list(hooks)
+        self.buckets = buckets
+        self.namespace = namespace
+        self.histograms: Dict[str, Histogram] = {}
+
+    def span(self, name: str, attributes: Optional[dict] = None) -> Span:
+        return Span(self, name, attributes)
+
+    def record(self, name: str, start: float, duration: float, attributes: Optional[dict] = None):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram(self.buckets)
+        histogram.observe(duration)
+        for hook in self.hooks:
+            hook.on_span(name, start, duration, attributes)
+
+    def summary(self) -> Dict[str, Tuple[int, float, float]]:
+        # (count, p50, p99) in seconds by span name
+        return {
+            name: (histogram.count, histogram.quantile(0.5), histogram.quantile(0.99))
+            for name, histogram in self.histograms.items()
+        }
+
+    def reset(self):
+        self.histograms.clear()
+
+    def to_prometheus(self) -> str:
+        metric = f"{self.namespace}_span_duration_seconds"
+        lines = [
+            f"# HELP {metric} Duration of instrumented trade lifecycle stages.",
+            f"# TYPE {metric} histogram",
+        ]
+        for name, histogram in sorted(self.histograms.items()):
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + ["+Inf"], histogram.counts):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{span="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_sum{{span="{name}"}} {histogram.sum}')
+            lines.append(f'{metric}_count{{span="{name}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+
+def span(instrumentation: Optional[Instrumentation], name: str, attributes: Optional[dict] = None):
+    # the shared no-op span when instrumentation is off
+    if instrumentation is None:
+        return NOOP_SPAN
+    return Span(instrumentation, name, attributes)
@@ -0,0 +1,125 @@
+import asyncio
+import struct
+from typing import Iterable, List, Optional, Sequence
+from solders.address_lookup_table_account import (
+    ID as ADDRESS_LOOKUP_TABLE_PROGRAM_ID,
+    LOOKUP_TABLE_MAX_ADDRESSES,
+    AddressLookupTable,
+    AddressLookupTableAccount,
+    derive_lookup_table_address,
+)
+from solders.instruction import AccountMeta, Instruction
+from solders.pubkey import Pubkey
+from solders.system_program import ID as SYSTEM_PROGRAM_ID
+from solana.rpc.async_api import AsyncClient
+from solana.rpc.commitment import Commitment, Confirmed, Finalized
+
+# bincode encoded ProgramInstruction variants
+CREATE_LOOKUP_TABLE = struct.Struct("<IQB")
+EXTEND_LOOKUP_TABLE = struct.Struct("<IQ")
+CREATE_LOOKUP_TABLE_TAG = 0
+EXTEND_LOOKUP_TABLE_TAG = 2
+# keeps an extend transaction under the packet size limit
+MAX_EXTEND_ADDRESSES = 20
+
+
+def create_lookup_table_ix(authority: Pubkey, payer: Pubkey, recent_slot: int) -> Instruction:
+    table, bump = derive_lookup_table_address(authority, recent_slot)
+    return Instruction(
+        ADDRESS_LOOKUP_TABLE_PROGRAM_ID,
+        CREATE_LOOKUP_TABLE.pack(CREATE_LOOKUP_TABLE_TAG, recent_slot, bump),
+        [
+            AccountMeta(table, is_signer=False, is_writable=True),
+            AccountMeta(authority, is_signer=True, is_writable=False),
+            AccountMeta(payer, is_signer=True, is_writable=True),
+            AccountMeta(SYSTEM_PROGRAM_ID, is_signer=False, is_writable=False),
+        ],
+    )
+
+def extend_lookup_table_ix(table: Pubkey, authority: Pubkey, payer: Pubkey, addresses: Sequence[Pubkey]) -> Instruction:
+    data = EXTEND_LOOKUP_TABLE.pack(EXTEND_LOOKUP_TABLE_TAG, len(addresses)) + b"".join(bytes(a) for a in addresses)
+    return Instruction(
+        ADDRESS_LOOKUP_TABLE_PROGRAM_ID,
+        data,
+        [
+            AccountMeta(table, is_signer=False, is_writable=True),
+            AccountMeta(authority, is_signer=True, is_writable=False),
+            AccountMeta(payer, is_signer=True, is_writable=True),
+            AccountMeta(SYSTEM_PROGRAM_ID, is_signer=False, is_writable=False),
+        ],
+    )
+
+async def fetch_lookup_table(
+    connection: AsyncClient,
+    address: Pubkey,
+    commitment: Commitment = Confirmed,
+) -> Optional[AddressLookupTable]:
+    resp = await connection.get_account_info(address, commitment)
+    if resp.value is None:
+        return None
+    return AddressLookupTable.deserialize(bytes(resp.value.data))
+
+
+class LookupTableManager:
+    def __init__(self, connection: AsyncClient, address: Optional[Pubkey] = None, commitment: Commitment = Confirmed):
+        self.connection = connection
+        self.address = address
+        self.commitment = commitment
+        self.table: Optional[AddressLookupTable] = None
+        self._account: Optional[AddressLookupTableAccount] = None
+
+    async def load(self) -> Optional[AddressLookupTable]:
+        if self.address is None:
+            raise ValueError("lookup table hasn't been created")
+        self.table = await fetch_lookup_table(self.connection, self.address, self.commitment)
+        self._account = None
+        return self.table
+
+    @property
+    def addresses(self) -> List[Pubkey]:
+        return [] if self.table is None else list(self.table.addresses)
+
+    def get_account(self) -> Optional[AddressLookupTableAccount]:
+        # cached until the next load, message compilation only needs the key list
+        if self.table is None:
+            return None
+        if self._account is None:
+            self._account = AddressLookupTableAccount(self.address, list(self.table.addresses))
+        return self._account
+
+    def get_missing(self, addresses: Iterable[Pubkey]) -> List[Pubkey]:
+        existing = set(self.addresses)
+        missing = []
+        for address in addresses:
+            if address not in existing:
+                existing.add(address)
+                missing.append(address)
+        if len(existing) > LOOKUP_TABLE_MAX_ADDRESSES:
+            raise ValueError(f"lookup table can't hold more than {LOOKUP_TABLE_MAX_ADDRESSES} addresses")
+        return missing
+
+    async def get_create_ix(self, authority: Pubkey, payer: Pubkey) -> Instruction:
+        # the slot has to be in the SlotHashes sysvar, a finalized slot always is
+        recent_slot = (await self.connection.get_slot(Finalized)).value
+        ix = create_lookup_table_ix(authority, payer, recent_slot)
+        self.address = ix.accounts[0].pubkey
+        self.table = None
+        self._account = None
+        return ix
+
+    def get_extend_ixs(self, authority: Pubkey, payer: Pubkey, addresses: Iterable[Pubkey]) -> List[Instruction]:
+        if self.address is None:
+            raise ValueError("lookup table hasn't been created")
+        missing = self.get_missing(addresses)
+        return [
+            extend_lookup_table_ix(self.address, authority, payer, missing[i:i + MAX_EXTEND_ADDRESSES])
+            for i in range(0, len(missing), MAX_EXTEND_ADDRESSES)
+        ]
+
+    async def wait_until_active(self, poll_interval: float = 0.4):
+        # addresses can only be looked up from the slot after they were added
+        if self.table is None:
+            return
+        last_extended_slot = self.table.meta.last_extended_slot
+        while (await self.connection.get_slot(self.commitment)).value <= last_extended_slot:
+            await asyncio.sleep(poll_interval)
@@ -1,21 +1,46 @@
+from dataclasses import dataclass
+from typing import Any, Sequence, Union
+
 from futarchy.types import Amm
 
+# imported by _require_numpy, only the quote grids use it
+np = None
+
 MAX_BPS = 100 * 100
 FEE_BPS = 100
+U64_MAX = 2 ** 64 - 1
+# relative error of the quote grid's float kernel, the conversions and the three
+# float operations round at most 5 times, and up to 3 ulps was measured over u64
+# reserves
+GRID_ERROR_ULPS = 8
+# the largest input whose fee can be taken without overflowing a u64
+MAX_SWAP_INPUT = U64_MAX // (MAX_BPS - FEE_BPS)
+
+def get_output_tokens_buy(in_quote_amount: int, amm: Amm, slippage_bps: int = 30, approximate: bool = False):
+    if approximate:
+        input_amount = in_quote_amount / 10 ** amm.quote_mint_decimals
+        input_reserves = amm.quote_amount / 10 ** amm.quote_mint_decimals
+        output_reserves = amm.base_amount / 10 ** amm.base_mint_decimals
+        min_output = calculate_amm_output(input_amount, slippage_bps, input_reserves, output_reserves)
+        return int(min_output * 10 ** amm.base_mint_decimals)
+    output = calculate_amm_output_exact(in_quote_amount, amm.quote_amount, amm.base_amount)
+    return apply_slippage(output, slippage_bps)
+
+def get_output_tokens_sell(in_base_amount: int, amm: Amm, slippage_bps: int = 30, approximate: bool = False):
+    if approximate:
+        input_amount = in_base_amount / 10 ** amm.base_mint_decimals
+        input_reserves = amm.base_amount / 10 ** amm.base_mint_decimals
+        output_reserves = amm.quote_amount / 10 ** amm.quote_mint_decimals
+        min_output = calculate_amm_output(input_amount, slippage_bps, input_reserves, output_reserves)
+        return int(min_output * 10 ** amm.quote_mint_decimals)
+    output = calculate_amm_output_exact(in_base_amount, amm.base_amount, amm.quote_amount)
+    return apply_slippage(output, slippage_bps)
 
-def get_output_tokens_buy(in_quote_amount: int, amm: Amm, slippage_bps: int = 30):
-    input_amount = in_quote_amount / 10 ** amm.quote_mint_decimals
-    input_reserves = amm.quote_amount / 10 ** amm.quote_mint_decimals
-    output_reserves = amm.base_amount / 10 ** amm.base_mint_decimals
-    min_output = calculate_amm_output(input_amount, slippage_bps, input_reserves, output_reserves)
-    return int(min_output * 10 ** amm.base_mint_decimals)
+def get_input_tokens_buy(out_base_amount: int, amm: Amm) -> int:
+    return calculate_amm_input_exact(out_base_amount, amm.quote_amount, amm.base_amount)
 
-def get_output_tokens_sell(in_base_amount: int, amm: Amm, slippage_bps: int = 30):
-    input_amount = in_base_amount / 10 ** amm.base_mint_decimals
-    input_reserves = amm.base_amount / 10 ** amm.base_mint_decimals
-    output_reserves = amm.quote_amount / 10 ** amm.quote_mint_decimals
-    min_output = calculate_amm_output(input_amount, slippage_bps, input_reserves, output_reserves)
-    return int(min_output * 10 ** amm.quote_mint_decimals)
+def get_input_tokens_sell(out_quote_amount: int, amm: Amm) -> int:
+    return calculate_amm_input_exact(out_quote_amount, amm.base_amount, amm.quote_amount)
 
 def calculate_amm_output(in_base_amount, slippage_bps, input_reserves, output_reserves):
     input_amount_with_fee = in_base_amount * (MAX_BPS - FEE_BPS) / MAX_BPS
@@ -23,4 +48,123 @@ def calculate_amm_output(in_base_amount, slippage_bps, input_reserves, output_re
     denominator = input_reserves + input_amount_with_fee
     expected_out = numerator / denominator
     min_expected_out = expected_out * (MAX_BPS - slippage_bps) / MAX_BPS
-    return min_expected_out
\ No newline at end of file
+    return min_expected_out
+
+def calculate_amm_output_exact(input_amount: int, input_reserves: int, output_reserves: int) -> int:
+    # mirrors the v0.3 program: the fee is floored off the input in u64, k / new
+    # reserves is rounded up, so the output is rounded down
+    if input_reserves == 0 or output_reserves == 0:
+        raise ValueError("can't swap through a pool without token reserves on either side")
+    if input_amount == 0:
+        raise ValueError("swap amount must be non-zero")
+    if input_amount * (MAX_BPS - FEE_BPS) > U64_MAX or input_reserves + input_amount > U64_MAX:
+        raise ValueError("input token amount is too large for a swap, causes overflow")
+    input_amount_minus_fee = input_amount * (MAX_BPS - FEE_BPS) // MAX_BPS
+    k = input_reserves * output_reserves
+    new_input_reserves = input_reserves + input_amount_minus_fee
+    return output_reserves - (k + new_input_reserves - 1) // new_input_reserves
+
+def calculate_amm_input_exact(output_amount: int, input_reserves: int, output_reserves: int) -> int:
+    # smallest input for which calculate_amm_output_exact returns at least output_amount
+    if input_reserves == 0 or output_reserves == 0:
+        raise ValueError("can't swap through a pool without token reserves on either side")
+    if output_amount >= output_reserves:
+        raise ValueError("output amount exceeds pool reserves")
+    if output_amount <= 0:
+        return 0
+    k = input_reserves * output_reserves
+    remaining_output_reserves = output_reserves - output_amount
+    min_input_minus_fee = max(0, -(-k // remaining_output_reserves) - input_reserves)
+    input_amount = max(1, -(-min_input_minus_fee * MAX_BPS // (MAX_BPS - FEE_BPS)))
+    if input_amount * (MAX_BPS - FEE_BPS) > U64_MAX or input_reserves + input_amount > U64_MAX:
+        raise ValueError("input token amount is too large for a swap, causes overflow")
+    return input_amount
+
+def apply_slippage(amount: int, slippage_bps: int) -> int:
+    return amount * (MAX_BPS - slippage_bps) // MAX_BPS
+
+
+@dataclass
+class QuoteGrid:
+    expected_output: Any
+    min_output: Any
+    # quote per base in UI units, fees included
+    effective_price: Any
+    price_impact: Any
+
+def _require_numpy():
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError("quote grids require numpy, install futarchy[numpy]")
+        np = numpy
+
+def calculate_amm_output_grid(input_amounts, input_reserves, output_reserves, slippage_bps: int = 30):
+    # float64 approximation of calculate_amm_output_exact, broadcast over the inputs.
+    # R_out - ceil(k / (R_in + f)) == floor(R_out * f / (R_in + f)), which keeps the
+    # intermediate values within float range. expected_output is within
+    # GRID_ERROR_ULPS ulps plus one atom of the exact output, min_output has that
+    # bound taken off so it's never above what the program pays
+    _require_numpy()
+    input_amounts = np.floor(np.asarray(input_amounts, dtype=np.float64))
+    input_reserves = np.asarray(input_reserves, dtype=np.float64)
+    output_reserves = np.asarray(output_reserves, dtype=np.float64)
+    # input * 9900 is past float precision for large inputs, and one atom off in
+    # the fee moves the output by the whole marginal price. Every input that can
+    # be swapped is below 2^53 and its product fits a u64, so the fee is exact
+    fits = input_amounts <= MAX_SWAP_INPUT
+    exact_inputs = np.where(fits, input_amounts, 0).astype(np.uint64)
+    input_amount_minus_fee = np.where(
+        fits,
+        (exact_inputs * np.uint64(MAX_BPS - FEE_BPS) // np.uint64(MAX_BPS)).astype(np.float64),
+        np.floor(input_amounts * (MAX_BPS - FEE_BPS) / MAX_BPS),
+    )
+    expected_output = np.floor(output_reserves * input_amount_minus_fee / (input_reserves + input_amount_minus_fee))
+    error_bound = np.floor(expected_output * GRID_ERROR_ULPS * 2.0 ** -53) + 1
+    min_output = np.maximum(np.floor(expected_output * (MAX_BPS - slippage_bps) / MAX_BPS) - error_bound, 0)
+    return expected_output, min_output
+
+def _amm_reserves(amms: Union[Amm, Sequence[Amm]]):
+    # a sequence of snapshots becomes a column so results are (snapshots, sizes)
+    if isinstance(amms, Sequence):
+        base = np.array([amm.base_amount for amm in amms], dtype=np.float64)[:, None]
+        quote = np.array([amm.quote_amount for amm in amms], dtype=np.float64)[:, None]
+        amm = amms[0]
+    else:
+        base = np.float64(amms.base_amount)
+        quote = np.float64(amms.quote_amount)
+        amm = amms
+    ui_scale = 10.0 ** (amm.base_mint_decimals - amm.quote_mint_decimals)
+    return base, quote, ui_scale
+
+def get_quote_grid_buy(in_quote_amounts, amms: Union[Amm, Sequence[Amm]], slippage_bps: int = 30) -> QuoteGrid:
+    _require_numpy()
+    base, quote, ui_scale = _amm_reserves(amms)
+    in_quote_amounts = np.asarray(in_quote_amounts, dtype=np.float64)
+    expected_output, min_output = calculate_amm_output_grid(in_quote_amounts, quote, base, slippage_bps)
+    spot_price = quote / base * ui_scale
+    with np.errstate(divide="ignore", invalid="ignore"):
+        effective_price = in_quote_amounts / expected_output * ui_scale
+    return QuoteGrid(
+        expected_output=expected_output,
+        min_output=min_output,
+        effective_price=effective_price,
+        price_impact=effective_price / spot_price - 1,
+    )
+
+def get_quote_grid_sell(in_base_amounts, amms: Union[Amm, Sequence[Amm]], slippage_bps: int = 30) -> QuoteGrid:
+    _require_numpy()
+    base, quote, ui_scale = _amm_reserves(amms)
+    in_base_amounts = np.asarray(in_base_amounts, dtype=np.float64)
+    expected_output, min_output = calculate_amm_output_grid(in_base_amounts, base, quote, slippage_bps)
+    spot_price = quote / base * ui_scale
+    with np.errstate(divide="ignore", invalid="ignore"):
+        effective_price = expected_output / in_base_amounts * ui_scale
+    return QuoteGrid(
+        expected_output=expected_output,
+        min_output=min_output,
+        effective_price=effective_price,
+        price_impact=1 - effective_price / spot_price,
+    )
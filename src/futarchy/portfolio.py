@@ -0,0 +1,86 @@
+from solders.pubkey import Pubkey
+from solana.rpc.async_api import AsyncClient
+from solana.rpc.types import TxOpts
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional
+
+from futarchy.client import ProposalClient, DEFAULT_TX_OPTIONS, Programs, get_programs
+from futarchy.decoders import decode_amm
+from futarchy.get_accounts import fetch_proposals_accounts, get_multiple_accounts_data_and_slot
+from futarchy.types import Amm, DataAndSlot
+
+if TYPE_CHECKING:
+    from anchorpy import Wallet
+
+
+class PortfolioClient:
+    def __init__(
+        self,
+        connection: AsyncClient,
+        wallet: "Wallet",
+        proposals: Iterable[Pubkey] = (),
+        opts: TxOpts = DEFAULT_TX_OPTIONS,
+    ):
+        self.connection = connection
+        self.wallet = wallet
+        self.opts = opts
+        # built on first use and shared by every client
+        self._programs: Optional[Programs] = None
+        self.clients: Dict[Pubkey, ProposalClient] = {}
+        for proposal in proposals:
+            self.add_proposal(proposal)
+
+    def add_proposal(self, proposal: Pubkey) -> ProposalClient:
+        if proposal not in self.clients:
+            self.clients[proposal] = ProposalClient(
+                self.connection,
+                self.wallet,
+                proposal,
+                self.opts,
+                programs=self._programs,
+            )
+        return self.clients[proposal]
+
+    @property
+    def programs(self) -> Programs:
+        if self._programs is None:
+            from anchorpy import Provider
+            self._programs = get_programs(Provider(self.connection, self.wallet, self.opts))
+            for client in self.clients.values():
+                if client._programs is None:
+                    client._programs = self._programs
+        return self._programs
+
+    def remove_proposal(self, proposal: Pubkey):
+        self.clients.pop(proposal, None)
+
+    def __getitem__(self, proposal: Pubkey) -> ProposalClient:
+        return self.clients[proposal]
+
+    def __iter__(self) -> Iterator[ProposalClient]:
+        return iter(self.clients.values())
+
+    def __len__(self) -> int:
+        return len(self.clients)
+
+    async def get_proposals_info(self):
+        proposals = list(self.clients)
+        if not proposals:
+            return
+        accounts = await fetch_proposals_accounts(self.connection, proposals)
+        for proposal, proposal_accounts in zip(proposals, accounts):
+            self.clients[proposal].set_proposal_info(proposal_accounts)
+
+    async def get_amm_accounts(self) -> Dict[Pubkey, DataAndSlot[Amm]]:
+        addresses: List[Pubkey] = []
+        for client in self.clients.values():
+            addresses += [client.pass_amm, client.fail_amm]
+        accounts = await get_multiple_accounts_data_and_slot(
+            self.connection,
+            addresses,
+            [decode_amm] * len(addresses),
+        )
+        return {
+            address: account 
+            for address, account in zip(addresses, accounts) 
+            if account is not None
+        }
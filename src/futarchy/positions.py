@@ -0,0 +1,224 @@
+import asyncio
+import itertools
+import struct
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+from solders.pubkey import Pubkey
+from solders.transaction_status import TransactionStatus
+from solana.rpc.commitment import Commitment, Processed
+
+from futarchy.get_accounts import get_multiple_accounts_data_and_slot
+from futarchy.subscriptions import subscribe_accounts
+from futarchy.types import Amm, DataAndSlot
+
+if TYPE_CHECKING:
+    from futarchy.client import OutcomeType, ProposalClient, TokenType
+
+# the amount of an spl token account, after the mint and owner
+TOKEN_ACCOUNT_AMOUNT = struct.Struct("<Q")
+TOKEN_ACCOUNT_AMOUNT_OFFSET = 64
+
+
+def decode_token_amount(data: bytes) -> int:
+    return TOKEN_ACCOUNT_AMOUNT.unpack_from(data, TOKEN_ACCOUNT_AMOUNT_OFFSET)[0]
+
+
+@dataclass
+class PendingDelta:
+    changes: Dict[Pubkey, int]
+    # the slot the transaction landed in, None until it's confirmed
+    slot: Optional[int] = None
+    # the update count at confirmation, a read from the landing slot only
+    # includes the transaction if it came in after that
+    confirmed_at: int = 0
+
+
+@dataclass
+class MarkToMarket:
+    # in quote atoms, conditional tokens only pay out in their own outcome
+    pass_value: float
+    fail_value: float
+    pass_price: float
+    fail_price: float
+    balances: Dict[Pubkey, int] = field(default_factory=dict)
+
+
+def get_spot_price(amm: Amm) -> float:
+    # quote atoms per base atom
+    if amm.base_amount == 0:
+        return 0.0
+    return amm.quote_amount / amm.base_amount
+
+
+class PositionLedger:
+    def __init__(
+        self,
+        client: "ProposalClient",
+        ws_url: Optional[str] = None,
+        commitment: Commitment = Processed,
+    ):
+        self.client = client
+        self.ws_url = ws_url
+        self.commitment = commitment
+        self.mints: Dict[Pubkey, Pubkey] = dict(client.get_token_account_mints())
+        # on-chain amounts by token account, a missing account holds nothing
+        self.confirmed: Dict[Pubkey, Optional[DataAndSlot[int]]] = {account: None for account in self.mints}
+        self.pending: Dict[int, PendingDelta] = {}
+        self.updates = 0
+        self.updated_at: Dict[Pubkey, int] = {}
+        self._ids = itertools.count()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None and self.ws_url is not None:
+            self._task = asyncio.create_task(subscribe_accounts(
+                self.ws_url,
+                list(self.mints),
+                self._on_account,
+                commitment=self.commitment,
+            ))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def load(self):
+        # all six token accounts in one getMultipleAccounts
+        accounts = list(self.mints)
+        results = await get_multiple_accounts_data_and_slot(
+            self.client.connection,
+            accounts,
+            [decode_token_amount] * len(accounts),
+            self.commitment,
+        )
+        slot = max((result.slot for result in results if result is not None), default=0)
+        for account, result in zip(accounts, results):
+            self.update(account, result if result is not None else DataAndSlot(slot, 0))
+
+    def _on_account(self, pubkey: Pubkey, slot: int, data: bytes):
+        self.update(pubkey, DataAndSlot(slot, decode_token_amount(data)))
+
+    def update(self, account: Pubkey, data_and_slot: DataAndSlot[int]):
+        current = self.confirmed.get(account)
+        if current is None or data_and_slot.slot >= current.slot:
+            self.confirmed[account] = data_and_slot
+            self.updates += 1
+            self.updated_at[account] = self.updates
+            self._prune()
+
+    def _includes(self, account: Pubkey, delta: PendingDelta) -> bool:
+        confirmed = self.confirmed[account]
+        if delta.slot is None or confirmed is None:
+            return False
+        if confirmed.slot == delta.slot:
+            return self.updated_at[account] > delta.confirmed_at
+        return confirmed.slot > delta.slot
+
+    def _prune(self):
+        # a landed delta is dropped once every account it touches was read
+        # with it included
+        for delta_id, delta in list(self.pending.items()):
+            if all(self._includes(account, delta) for account in delta.changes):
+                del self.pending[delta_id]
+
+    def get_balance(self, mint: Pubkey) -> int:
+        # the on-chain amount plus every delta it doesn't include yet
+        for account, account_mint in self.mints.items():
+            if account_mint == mint:
+                return self._get_account_balance(account)
+        raise KeyError(f"no token account for mint {mint}")
+
+    def _get_account_balance(self, account: Pubkey) -> int:
+        confirmed = self.confirmed[account]
+        amount = 0 if confirmed is None else confirmed.data
+        for delta in self.pending.values():
+            change = delta.changes.get(account)
+            if change is not None and not self._includes(account, delta):
+                amount += change
+        return amount
+
+    def get_balances(self) -> Dict[Pubkey, int]:
+        return {mint: self._get_account_balance(account) for account, mint in self.mints.items()}
+
+    def apply(self, changes: Dict[Pubkey, int]) -> int:
+        # changes are by mint, returns an id for track and discard
+        accounts = {mint: account for account, mint in self.mints.items()}
+        delta_id = next(self._ids)
+        self.pending[delta_id] = PendingDelta({accounts[mint]: change for mint, change in changes.items()})
+        return delta_id
+
+    def discard(self, delta_id: int):
+        self.pending.pop(delta_id, None)
+
+    def confirm(self, delta_id: int, slot: int):
+        delta = self.pending.get(delta_id)
+        if delta is not None:
+            delta.slot = slot
+            delta.confirmed_at = self.updates
+            self._prune()
+
+    def track(self, delta_id: int, future: "asyncio.Future[TransactionStatus]"):
+        # a failed transaction drops its delta, a landed one is kept until the
+        # account updates catch up with it
+        def on_done(future: asyncio.Future):
+            if future.cancelled() or future.exception() is not None:
+                self.discard(delta_id)
+            else:
+                self.confirm(delta_id, future.result().slot)
+        future.add_done_callback(on_done)
+
+    def _get_vault_mints(self, token_type: "TokenType") -> Tuple[Pubkey, Pubkey, Pubkey]:
+        vault_accounts = self.client.vault_accounts[token_type]
+        return (
+            self.mints[vault_accounts.user_underlying_token_account],
+            self.mints[vault_accounts.user_conditional_on_finalize_token_account],
+            self.mints[vault_accounts.user_conditional_on_revert_token_account],
+        )
+
+    def _get_swap_mints(self, outcome_type: "OutcomeType") -> Tuple[Pubkey, Pubkey]:
+        swap_accounts = self.client.swap_accounts[outcome_type]
+        return self.mints[swap_accounts.user_base_account], self.mints[swap_accounts.user_quote_account]
+
+    def apply_mint(self, amount: int, token_type: "TokenType") -> int:
+        underlying, pass_mint, fail_mint = self._get_vault_mints(token_type)
+        return self.apply({underlying: -amount, pass_mint: amount, fail_mint: amount})
+
+    def apply_merge(self, amount: int, token_type: "TokenType") -> int:
+        underlying, pass_mint, fail_mint = self._get_vault_mints(token_type)
+        return self.apply({underlying: amount, pass_mint: -amount, fail_mint: -amount})
+
+    def apply_buy(self, amount: int, min_output: int, outcome_type: "OutcomeType") -> int:
+        # min_output is the worst case, reconciliation brings in the real fill
+        base, quote = self._get_swap_mints(outcome_type)
+        return self.apply({quote: -amount, base: min_output})
+
+    def apply_sell(self, amount: int, min_output: int, outcome_type: "OutcomeType") -> int:
+        base, quote = self._get_swap_mints(outcome_type)
+        return self.apply({base: -amount, quote: min_output})
+
+    async def mark_to_market(self) -> MarkToMarket:
+        # values each outcome branch at the cached AMM price of that outcome
+        client = self.client
+        pass_amm, fail_amm = await asyncio.gather(
+            client.get_amm(client.pass_amm),
+            client.get_amm(client.fail_amm)
+        )
+        pass_price = get_spot_price(pass_amm)
+        fail_price = get_spot_price(fail_amm)
+        balances = self.get_balances()
+        base_underlying = balances[client.base_underlying_token_mint]
+        quote_underlying = balances[client.quote_underlying_token_mint]
+        pass_value = (
+            quote_underlying + balances[client.quote_pass_token_mint]
+            + (base_underlying + balances[client.base_pass_token_mint]) * pass_price
+        )
+        fail_value = (
+            quote_underlying + balances[client.quote_fail_token_mint]
+            + (base_underlying + balances[client.base_fail_token_mint]) * fail_price
+        )
+        return MarkToMarket(pass_value, fail_value, pass_price, fail_price, balances)
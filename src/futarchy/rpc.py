@@ -0,0 +1,294 @@
+import asyncio
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple, Type
+import httpx
+from solders.rpc.config import RpcAccountInfoConfig
+from solders.rpc.requests import Body, GetAccountInfo, GetHealth, GetMultipleAccounts
+from solana.exceptions import SolanaRpcException, handle_async_exceptions
+from solana.rpc.async_api import AsyncClient
+from solana.rpc.commitment import Commitment
+from solana.rpc.providers.async_http import AsyncHTTPProvider
+from solana.rpc.providers.core import T, _parse_raw, _parse_raw_batch
+
+from futarchy.constants import MAX_MULTIPLE_ACCOUNTS
+
+logger = logging.getLogger(__name__)
+
+# read-only methods, identical requests of these in flight share one response.
+# Anything else, sendTransaction and simulateTransaction included, always goes out
+COALESCED_METHODS = frozenset({
+    "getAccountInfo",
+    "getBalance",
+    "getBlockHeight",
+    "getEpochInfo",
+    "getLatestBlockhash",
+    "getMinimumBalanceForRentExemption",
+    "getMultipleAccounts",
+    "getProgramAccounts",
+    "getRecentPrioritizationFees",
+    "getSignatureStatuses",
+    "getSignaturesForAddress",
+    "getSlot",
+    "getTokenAccountBalance",
+    "getTokenAccountsByOwner",
+    "getTransaction",
+})
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    def try_acquire(self) -> bool:
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    async def acquire(self):
+        while not self.try_acquire():
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+@dataclass
+class Endpoint:
+    url: str
+    provider: AsyncHTTPProvider
+    bucket: TokenBucket
+    # exponentially weighted request latency in seconds
+    latency: float = 0.0
+    failures: int = 0
+    down_until: float = 0.0
+    requests: int = 0
+    errors: int = 0
+
+    @property
+    def is_up(self) -> bool:
+        return time.monotonic() >= self.down_until
+
+
+@dataclass
+class PendingBatch:
+    config: Optional[RpcAccountInfoConfig]
+    requests: List[Tuple[Body, asyncio.Future]] = field(default_factory=list)
+
+
+class RpcRouter:
+    # stands in for the AsyncHTTPProvider of an AsyncClient, see RoutedClient
+    def __init__(
+        self,
+        endpoints: Sequence[str],
+        rate: float = 50.0,
+        burst: Optional[float] = None,
+        batch_window: float = 0.002,
+        latency_alpha: float = 0.2,
+        failure_backoff: float = 1.0,
+        max_failure_backoff: float = 30.0,
+        timeout: float = 10.0,
+        extra_headers: Optional[Dict[str, str]] = None,
+    ):
+        if not endpoints:
+            raise ValueError("at least one endpoint is required")
+        self.endpoints = [
+            Endpoint(url, AsyncHTTPProvider(url, extra_headers, timeout), TokenBucket(rate, burst or rate))
+            for url in endpoints
+        ]
+        # getAccountInfo requests made within this window share one getMultipleAccounts
+        self.batch_window = batch_window
+        self.latency_alpha = latency_alpha
+        self.failure_backoff = failure_backoff
+        self.max_failure_backoff = max_failure_backoff
+        self.in_flight: Dict[str, asyncio.Task] = {}
+        self.batches: Dict[str, PendingBatch] = {}
+        self.coalesced = 0
+        self.batched = 0
+
+    @property
+    def endpoint_uri(self) -> str:
+        return self.endpoints[0].url
+
+    def __str__(self) -> str:
+        return f"Routed RPC connection over {', '.join(endpoint.url for endpoint in self.endpoints)}"
+
+    def get_ranked_endpoints(self) -> List[Endpoint]:
+        # healthy endpoints by latency, then the ones that are down by how soon
+        # they can be retried
+        up = sorted((e for e in self.endpoints if e.is_up), key=lambda e: e.latency)
+        down = sorted((e for e in self.endpoints if not e.is_up), key=lambda e: e.down_until)
+        return up + down
+
+    async def _acquire_endpoint(self, ranked: List[Endpoint]) -> Endpoint:
+        for endpoint in ranked:
+            if endpoint.is_up and endpoint.bucket.try_acquire():
+                return endpoint
+        await ranked[0].bucket.acquire()
+        return ranked[0]
+
+    def _record(self, endpoint: Endpoint, latency: Optional[float]):
+        endpoint.requests += 1
+        if latency is None:
+            endpoint.errors += 1
+            endpoint.failures += 1
+            backoff = min(self.max_failure_backoff, self.failure_backoff * 2 ** (endpoint.failures - 1))
+            endpoint.down_until = time.monotonic() + backoff
+            return
+        endpoint.failures = 0
+        endpoint.down_until = 0.0
+        if endpoint.latency == 0.0:
+            endpoint.latency = latency
+        else:
+            endpoint.latency += self.latency_alpha * (latency - endpoint.latency)
+
+    async def _send(self, request) -> str:
+        # request is called with a provider, every endpoint is tried once
+        ranked = self.get_ranked_endpoints()
+        error: Optional[Exception] = None
+        for _ in range(len(ranked)):
+            endpoint = await self._acquire_endpoint(ranked)
+            ranked.remove(endpoint)
+            start = time.monotonic()
+            try:
+                raw = await request(endpoint.provider)
+            except httpx.HTTPError as e:
+                logger.warning("rpc request to %s failed: %r", endpoint.url, e)
+                self._record(endpoint, None)
+                error = e
+                continue
+            self._record(endpoint, time.monotonic() - start)
+            return raw
+        raise error
+
+    async def make_request_unparsed(self, body: Body) -> str:
+        request = json.loads(body.to_json())
+        if request["method"] not in COALESCED_METHODS:
+            return await self._request(body)
+        # identical requests in flight at the same time share one response. The
+        # request runs as its own task, so a caller that is cancelled doesn't
+        # cancel it for the others
+        request.pop("id", None)
+        key = json.dumps(request, sort_keys=True)
+        task = self.in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = self.in_flight[key] = asyncio.ensure_future(self._request(body))
+            task.add_done_callback(lambda task: self._request_done(key, task))
+        return await asyncio.shield(task)
+
+    def _request_done(self, key: str, task: asyncio.Task):
+        if self.in_flight.get(key) is task:
+            del self.in_flight[key]
+        # retrieved here so a failure nobody waits on anymore isn't reported as unhandled
+        if not task.cancelled():
+            task.exception()
+
+    async def _request(self, body: Body) -> str:
+        if isinstance(body, GetAccountInfo):
+            return await self._enqueue_account_info(body)
+        return await self._send(lambda provider: provider.make_request_unparsed(body))
+
+    @handle_async_exceptions(SolanaRpcException, httpx.HTTPError)
+    async def make_request(self, body: Body, parser: Type[T]) -> T:
+        raw = await self.make_request_unparsed(body)
+        return _parse_raw(raw, parser=parser)
+
+    async def make_batch_request_unparsed(self, reqs: Tuple[Body, ...]) -> str:
+        return await self._send(lambda provider: provider.make_batch_request_unparsed(reqs))
+
+    async def make_batch_request(self, reqs: Tuple[Body, ...], parsers) -> tuple:
+        raw = await self.make_batch_request_unparsed(reqs)
+        return _parse_raw_batch(raw, parsers)
+
+    async def _enqueue_account_info(self, body: GetAccountInfo) -> str:
+        key = str(body.config)
+        batch = self.batches.get(key)
+        if batch is None:
+            batch = self.batches[key] = PendingBatch(body.config)
+            # the timer flushes this batch only, a full batch may have been
+            # flushed early and replaced by the time it fires
+            asyncio.get_running_loop().call_later(
+                self.batch_window,
+                lambda: asyncio.ensure_future(self._flush(key, batch))
+            )
+        future = asyncio.get_running_loop().create_future()
+        batch.requests.append((body, future))
+        if len(batch.requests) >= MAX_MULTIPLE_ACCOUNTS:
+            await self._flush(key, batch)
+        return await future
+
+    async def _flush(self, key: str, batch: PendingBatch):
+        if self.batches.get(key) is not batch:
+            return
+        del self.batches[key]
+        requests = batch.requests
+        if len(requests) == 1:
+            body, future = requests[0]
+            try:
+                future.set_result(await self._send(lambda provider: provider.make_request_unparsed(body)))
+            except Exception as e:
+                future.set_exception(e)
+            return
+        self.batched += len(requests)
+        pubkeys = [body.pubkey for body, _ in requests]
+        config = batch.config if batch.config is not None else RpcAccountInfoConfig()
+        multiple = GetMultipleAccounts(pubkeys, config)
+        try:
+            raw = await self._send(lambda provider: provider.make_request_unparsed(multiple))
+            resp = json.loads(raw)
+        except Exception as e:
+            for _, future in requests:
+                future.set_exception(e)
+            return
+        for i, (body, future) in enumerate(requests):
+            if "error" in resp:
+                single = {"jsonrpc": "2.0", "id": body.id, "error": resp["error"]}
+            else:
+                result = {"context": resp["result"]["context"], "value": resp["result"]["value"][i]}
+                single = {"jsonrpc": "2.0", "id": body.id, "result": result}
+            future.set_result(json.dumps(single))
+
+    async def check_health(self) -> Dict[str, bool]:
+        # probes every endpoint with getHealth, which also brings endpoints
+        # that recovered back before their backoff ends
+        async def check(endpoint: Endpoint) -> bool:
+            start = time.monotonic()
+            try:
+                raw = await endpoint.provider.make_request_unparsed(GetHealth())
+            except httpx.HTTPError:
+                self._record(endpoint, None)
+                return False
+            healthy = json.loads(raw).get("result") == "ok"
+            self._record(endpoint, time.monotonic() - start if healthy else None)
+            return healthy
+        results = await asyncio.gather(*[check(endpoint) for endpoint in self.endpoints])
+        return {endpoint.url: healthy for endpoint, healthy in zip(self.endpoints, results)}
+
+    async def is_connected(self) -> bool:
+        return any((await self.check_health()).values())
+
+    async def close(self):
+        await asyncio.gather(*[endpoint.provider.close() for endpoint in self.endpoints])
+
+
+class RoutedClient(AsyncClient):
+    # an AsyncClient whose requests all go through an RpcRouter, so it can be
+    # passed anywhere the sdk takes a connection
+    def __init__(self, endpoints: Sequence[str], commitment: Optional[Commitment] = None, **router_kwargs):
+        super().__init__(endpoints[0], commitment)
+        self._provider = RpcRouter(endpoints, **router_kwargs)
+
+    @property
+    def router(self) -> RpcRouter:
+        return self._provider
@@ -0,0 +1,277 @@
+import asyncio
+import itertools
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple, Union
+from solders.instruction import Instruction
+from solders.pubkey import Pubkey
+from solders.transaction_status import TransactionStatus
+
+from futarchy.amm_cache import AmmCache
+from futarchy.client import OutcomeType, ProposalClient
+from futarchy.types import Amm
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class AmmUpdate:
+    seq: int
+    slot: int
+    proposal: Pubkey
+    amm: Pubkey
+    outcome_type: OutcomeType
+    data: Amm
+
+
+@dataclass
+class SlotTick:
+    seq: int
+    slot: int
+    proposal: Pubkey
+
+
+@dataclass
+class Fill:
+    seq: int
+    # the landing slot, or the runtime's slot when the transaction failed
+    slot: int
+    proposal: Pubkey
+    status: Optional[TransactionStatus]
+    error: Optional[BaseException]
+    # whatever was passed to send, to match the fill to its order
+    tag: Any = None
+
+Event = Union[AmmUpdate, SlotTick, Fill]
+
+
+class Strategy:
+    # callbacks for one proposal run one at a time and in event order
+    async def on_amm(self, client: ProposalClient, event: AmmUpdate):
+        pass
+
+    async def on_slot(self, client: ProposalClient, event: SlotTick):
+        pass
+
+    async def on_fill(self, client: ProposalClient, event: Fill):
+        pass
+
+
+class ProposalQueue:
+    def __init__(self, client: ProposalClient):
+        self.client = client
+        self.strategies: List[Strategy] = []
+        # market events are keyed so a newer one replaces the queued one, fills
+        # are keyed by their seq and never replaced
+        self.events: "OrderedDict[Hashable, Event]" = OrderedDict()
+        self.ready = asyncio.Event()
+        self.idle = asyncio.Event()
+        self.idle.set()
+        # the last dispatched slot by event key
+        self.dispatched: Dict[Hashable, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.events)
+
+    def put(self, key: Hashable, event: Event) -> bool:
+        # returns whether a queued event was superseded
+        superseded = self.events.pop(key, None) is not None
+        self.events[key] = event
+        self.ready.set()
+        self.idle.clear()
+        return superseded
+
+
+class StrategyRuntime:
+    def __init__(
+        self,
+        clients: Iterable[ProposalClient] = (),
+        max_concurrency: Optional[int] = None,
+        max_slot_lag: Optional[int] = None,
+    ):
+        self.queues: Dict[Pubkey, ProposalQueue] = {}
+        # amm -> (proposal, outcome)
+        self.amms: Dict[Pubkey, Tuple[Pubkey, OutcomeType]] = {}
+        # bounds callbacks running at once across proposals, each proposal
+        # always runs its own one at a time
+        self.semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency is not None else None
+        # market events this many slots behind the newest slot are dropped
+        # instead of dispatched
+        self.max_slot_lag = max_slot_lag
+        # the newest slot seen in any event, and in a slot notification
+        self.slot = 0
+        self.tick_slot = 0
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self._seq = itertools.count()
+        self._tasks: Dict[Pubkey, asyncio.Task] = {}
+        self._caches: List[AmmCache] = []
+        for client in clients:
+            self.add_proposal(client)
+
+    def add_proposal(self, client: ProposalClient) -> ProposalQueue:
+        # the client has to have its proposal info loaded
+        queue = self.queues.get(client.proposal)
+        if queue is None:
+            queue = self.queues[client.proposal] = ProposalQueue(client)
+            self.amms[client.pass_amm] = (client.proposal, OutcomeType.PASS)
+            self.amms[client.fail_amm] = (client.proposal, OutcomeType.FAIL)
+            if self._tasks:
+                self._start_worker(client.proposal)
+        return queue
+
+    async def remove_proposal(self, proposal: Pubkey):
+        queue = self.queues.pop(proposal, None)
+        if queue is None:
+            return
+        self.amms = {amm: value for amm, value in self.amms.items() if value[0] != proposal}
+        task = self._tasks.pop(proposal, None)
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    def register(self, strategy: Strategy, proposals: Optional[Iterable[Pubkey]] = None):
+        # every proposal when none are given
+        for proposal in (self.queues if proposals is None else proposals):
+            self.queues[proposal].strategies.append(strategy)
+
+    def attach(self, amm_cache: AmmCache):
+        amm_cache.listeners.append(self.on_amm)
+        amm_cache.slot_listeners.append(self.on_slot)
+        self._caches.append(amm_cache)
+
+    def start(self):
+        for proposal in self.queues:
+            if proposal not in self._tasks:
+                self._start_worker(proposal)
+
+    def _start_worker(self, proposal: Pubkey):
+        self._tasks[proposal] = asyncio.create_task(self._run(self.queues[proposal]))
+
+    async def stop(self):
+        for amm_cache in self._caches:
+            amm_cache.listeners.remove(self.on_amm)
+            amm_cache.slot_listeners.remove(self.on_slot)
+        self._caches = []
+        tasks = list(self._tasks.values())
+        self._tasks = {}
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def drain(self):
+        # waits until every queued event was dispatched
+        for queue in list(self.queues.values()):
+            await queue.idle.wait()
+
+    def on_amm(self, pubkey: Pubkey, slot: int, amm: Amm):
+        value = self.amms.get(pubkey)
+        if value is None:
+            return
+        proposal, outcome_type = value
+        self.slot = max(self.slot, slot)
+        event = AmmUpdate(next(self._seq), slot, proposal, pubkey, outcome_type, amm)
+        self._put(self.queues[proposal], pubkey, event)
+
+    def on_slot(self, slot: int):
+        # every proposal gets the tick, a queued one is replaced by the newer one
+        if slot <= self.tick_slot:
+            return
+        self.tick_slot = slot
+        self.slot = max(self.slot, slot)
+        seq = next(self._seq)
+        for proposal, queue in self.queues.items():
+            self._put(queue, SlotTick, SlotTick(seq, slot, proposal))
+
+    def on_fill(
+        self,
+        proposal: Pubkey,
+        status: Optional[TransactionStatus],
+        error: Optional[BaseException] = None,
+        tag: Any = None,
+    ):
+        queue = self.queues.get(proposal)
+        if queue is None:
+            return
+        slot = status.slot if status is not None else self.slot
+        seq = next(self._seq)
+        queue.put((Fill, seq), Fill(seq, slot, proposal, status, error, tag))
+
+    def _put(self, queue: ProposalQueue, key: Hashable, event: Event):
+        if queue.put(key, event):
+            self.dropped += 1
+
+    def track(self, proposal: Pubkey, future: "asyncio.Future[TransactionStatus]", tag: Any = None):
+        # the outcome comes back as a Fill on the proposal's queue
+        def on_done(future: asyncio.Future):
+            if future.cancelled():
+                self.on_fill(proposal, None, asyncio.CancelledError(), tag)
+            elif future.exception() is not None:
+                self.on_fill(proposal, None, future.exception(), tag)
+            else:
+                self.on_fill(proposal, future.result(), None, tag)
+        future.add_done_callback(on_done)
+
+    async def send(
+        self,
+        proposal: Pubkey,
+        ix: Union[Instruction, Iterable[Instruction]],
+        tag: Any = None,
+        compute_unit_price: Optional[int] = 100_000,
+        compute_unit_limit: Optional[int] = 50_000,
+    ) -> "asyncio.Future[TransactionStatus]":
+        client = self.queues[proposal].client
+        future = await client.send_ix_tracked(ix, compute_unit_price, compute_unit_limit)
+        self.track(proposal, future, tag)
+        return future
+
+    def _is_stale(self, queue: ProposalQueue, key: Hashable, event: Event) -> bool:
+        if isinstance(event, Fill):
+            return False
+        if event.slot < queue.dispatched.get(key, 0):
+            return True
+        return self.max_slot_lag is not None and self.slot - event.slot > self.max_slot_lag
+
+    async def _run(self, queue: ProposalQueue):
+        while True:
+            await queue.ready.wait()
+            key, event = queue.events.popitem(last=False)
+            if not queue.events:
+                queue.ready.clear()
+            if self._is_stale(queue, key, event):
+                self.dropped += 1
+            else:
+                if not isinstance(event, Fill):
+                    queue.dispatched[key] = event.slot
+                if self.semaphore is None:
+                    await self._dispatch(queue, event)
+                else:
+                    async with self.semaphore:
+                        await self._dispatch(queue, event)
+            if not queue.events:
+                queue.idle.set()
+
+    async def _dispatch(self, queue: ProposalQueue, event: Event):
+        for strategy in queue.strategies:
+            try:
+                if isinstance(event, AmmUpdate):
+                    await strategy.on_amm(queue.client, event)
+                elif isinstance(event, SlotTick):
+                    await strategy.on_slot(queue.client, event)
+                else:
+                    await strategy.on_fill(queue.client, event)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                logger.warning("strategy %r failed on %s: %r", strategy, type(event).__name__, e)
+        self.processed += 1
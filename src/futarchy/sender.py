@@ -0,0 +1,32 @@
+import asyncio
+from typing import Iterable, List, Union
+from solders.instruction import Instruction
+from solders.signature import Signature
+
+from futarchy.client import ProposalClient
+
+
+class PipelinedSender:
+    def __init__(self, client: ProposalClient, max_in_flight: int = 16):
+        self.client = client
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+
+    async def send(self, ix: Union[Instruction, Iterable[Instruction]], **kwargs) -> Signature:
+        async with self._semaphore:
+            self.in_flight += 1
+            try:
+                return await self.client.send_ix(ix, **kwargs)
+            finally:
+                self.in_flight -= 1
+
+    async def send_many(
+        self, 
+        ixs: Iterable[Union[Instruction, Iterable[Instruction]]], 
+        **kwargs
+    ) -> List[Union[Signature, BaseException]]:
+        return await asyncio.gather(
+            *[self.send(ix, **kwargs) for ix in ixs], 
+            return_exceptions=True
+        )
@@ -0,0 +1,242 @@
+import asyncio
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set, Union
+from anchorpy import Wallet
+from solders.instruction import Instruction
+from solders.pubkey import Pubkey
+from solders.signature import Signature
+from solana.rpc.async_api import AsyncClient
+from solana.rpc.commitment import Commitment, Confirmed
+from solana.rpc.types import TxOpts
+from spl.token.constants import TOKEN_PROGRAM_ID
+from spl.token.instructions import create_associated_token_account, close_account, CloseAccountParams
+
+from futarchy.client import DEFAULT_TX_OPTIONS, ProposalClient, TokenType
+from futarchy.confirmation import ConfirmationTracker
+from futarchy.composer import Leg, TransactionComposer
+from futarchy.compute_units import ComputeUnitEstimator
+from futarchy.get_accounts import fetch_proposals_accounts, get_multiple_accounts_data_and_slot
+from futarchy.positions import decode_token_amount
+from futarchy.types import ConditionalVault, ProposalAccounts, is_variant
+
+
+@dataclass
+class VaultPosition:
+    client: ProposalClient
+    token_type: TokenType
+    vault: ConditionalVault
+    # None when the token account doesn't exist
+    pass_amount: Optional[int]
+    fail_amount: Optional[int]
+    underlying_amount: Optional[int]
+
+
+@dataclass
+class SettlementPlan:
+    wallet: Pubkey
+    legs: List[Leg] = field(default_factory=list)
+    # mints whose token accounts the plan creates, so later positions on the
+    # same mint don't create them again
+    created: Set[Pubkey] = field(default_factory=set)
+    creates: int = 0
+    redeems: int = 0
+    merges: int = 0
+    closes: int = 0
+
+    def __len__(self) -> int:
+        return len(self.legs)
+
+
+class SettlementEngine:
+    def __init__(
+        self,
+        connection: AsyncClient,
+        wallets: Iterable[Wallet],
+        proposals: Iterable[Pubkey] = (),
+        opts: TxOpts = DEFAULT_TX_OPTIONS,
+        max_concurrency: int = 8,
+        merge_active: bool = True,
+        close_active: bool = False,
+        commitment: Commitment = Confirmed,
+    ):
+        self.connection = connection
+        self.wallets = list(wallets)
+        if not self.wallets:
+            raise ValueError("at least one wallet is required")
+        self.proposals = list(proposals)
+        self.opts = opts
+        # wallets settle concurrently, a wallet's own transactions go in order
+        self.max_concurrency = max_concurrency
+        # paired pass and fail tokens of active vaults are merged back into
+        # the underlying, their emptied accounts are only closed with close_active
+        self.merge_active = merge_active
+        self.close_active = close_active
+        self.commitment = commitment
+        self.compute_unit_estimator = ComputeUnitEstimator()
+        self.confirmation_tracker: Optional[ConfirmationTracker] = None
+        self.clients: Dict[Pubkey, Dict[Pubkey, ProposalClient]] = {}
+        self.positions: Dict[Pubkey, List[VaultPosition]] = {}
+
+    async def stop(self):
+        if self.confirmation_tracker is not None:
+            await self.confirmation_tracker.stop()
+            self.confirmation_tracker = None
+
+    def new_client(self, wallet: Wallet, proposal: Pubkey) -> ProposalClient:
+        return ProposalClient(self.connection, wallet, proposal, self.opts)
+
+    async def load(self):
+        # one pass over the proposals and one over every token account involved
+        proposals_accounts = await fetch_proposals_accounts(self.connection, self.proposals, self.commitment)
+        self._build_clients(proposals_accounts)
+
+        positions = []
+        for wallet in self.wallets:
+            for proposal, accounts in zip(self.proposals, proposals_accounts):
+                client = self.clients[wallet.public_key][proposal]
+                positions.append((client, TokenType.BASE, accounts.base_vault))
+                positions.append((client, TokenType.QUOTE, accounts.quote_vault))
+        addresses = {}
+        for client, token_type, _ in positions:
+            vault_accounts = client.vault_accounts[token_type]
+            addresses[vault_accounts.user_conditional_on_finalize_token_account] = None
+            addresses[vault_accounts.user_conditional_on_revert_token_account] = None
+            addresses[vault_accounts.user_underlying_token_account] = None
+        addresses = list(addresses)
+        results = await get_multiple_accounts_data_and_slot(
+            self.connection,
+            addresses,
+            [decode_token_amount] * len(addresses),
+            self.commitment,
+        )
+        amounts = {
+            address: None if result is None else result.data
+            for address, result in zip(addresses, results)
+        }
+
+        self.positions = {wallet.public_key: [] for wallet in self.wallets}
+        for client, token_type, vault in positions:
+            vault_accounts = client.vault_accounts[token_type]
+            self.positions[client.authority].append(VaultPosition(
+                client,
+                token_type,
+                vault,
+                amounts[vault_accounts.user_conditional_on_finalize_token_account],
+                amounts[vault_accounts.user_conditional_on_revert_token_account],
+                amounts[vault_accounts.user_underlying_token_account],
+            ))
+
+    def _build_clients(self, proposals_accounts: List[ProposalAccounts]):
+        # the first client starts the services every other client shares
+        self.clients = {wallet.public_key: {} for wallet in self.wallets}
+        for proposal, accounts in zip(self.proposals, proposals_accounts):
+            client = self.new_client(self.wallets[0], proposal)
+            client.compute_unit_estimator = self.compute_unit_estimator
+            if self.confirmation_tracker is None:
+                self.confirmation_tracker = client.start_confirmation_tracker()
+            client.confirmation_tracker = self.confirmation_tracker
+            client.set_proposal_info(accounts)
+            self.clients[self.wallets[0].public_key][proposal] = client
+            for wallet in self.wallets[1:]:
+                self.clients[wallet.public_key][proposal] = client.for_wallet(wallet)
+
+    def plan_position(self, position: VaultPosition, plan: SettlementPlan):
+        client = position.client
+        vault_accounts = client.vault_accounts[position.token_type]
+        pass_amount = position.pass_amount or 0
+        fail_amount = position.fail_amount or 0
+        active = is_variant(position.vault.status, "Active")
+
+        ixs: List[Instruction] = []
+        if active:
+            merge_amount = min(pass_amount, fail_amount) if self.merge_active else 0
+            if merge_amount > 0:
+                ixs += self._create_missing(position, plan, underlying=True)
+                ixs.append(client.get_merge_conditional_tokens_ix(merge_amount, position.token_type))
+                plan.merges += 1
+                pass_amount -= merge_amount
+                fail_amount -= merge_amount
+            if not self.close_active:
+                if ixs:
+                    plan.legs.append(Leg(ixs))
+                return
+        elif pass_amount > 0 or fail_amount > 0:
+            # redeem burns both sides, so every account it touches has to exist
+            ixs += self._create_missing(position, plan, underlying=True, conditional=True)
+            ixs.append(client.get_redeem_conditional_tokens_ix(position.token_type))
+            plan.redeems += 1
+            pass_amount = fail_amount = 0
+        if ixs:
+            plan.legs.append(Leg(ixs))
+
+        closes = []
+        for account, exists, remaining in (
+            (vault_accounts.user_conditional_on_finalize_token_account, position.pass_amount is not None, pass_amount),
+            (vault_accounts.user_conditional_on_revert_token_account, position.fail_amount is not None, fail_amount),
+        ):
+            if remaining == 0 and (exists or not active and ixs):
+                closes.append(close_account(CloseAccountParams(
+                    program_id=TOKEN_PROGRAM_ID,
+                    account=account,
+                    dest=client.authority,
+                    owner=client.authority
+                )))
+        if closes:
+            plan.legs.append(Leg(closes))
+            plan.closes += len(closes)
+
+    def _create_missing(
+        self,
+        position: VaultPosition,
+        plan: SettlementPlan,
+        underlying: bool = False,
+        conditional: bool = False
+    ) -> List[Instruction]:
+        client = position.client
+        vault = position.vault
+        mints = []
+        if underlying and position.underlying_amount is None:
+            mints.append(vault.underlying_token_mint)
+        if conditional and position.pass_amount is None:
+            mints.append(vault.conditional_on_finalize_token_mint)
+        if conditional and position.fail_amount is None:
+            mints.append(vault.conditional_on_revert_token_mint)
+        mints = [mint for mint in mints if mint not in plan.created]
+        plan.created.update(mints)
+        plan.creates += len(mints)
+        return [create_associated_token_account(client.authority, client.authority, mint) for mint in mints]
+
+    def plan(self) -> Dict[Pubkey, SettlementPlan]:
+        # only wallets with something to do
+        plans = {}
+        for wallet, positions in self.positions.items():
+            plan = SettlementPlan(wallet)
+            for position in positions:
+                self.plan_position(position, plan)
+            if plan.legs:
+                plans[wallet] = plan
+        return plans
+
+    async def settle(
+        self,
+        compute_unit_price: Optional[int] = 100_000,
+    ) -> Dict[Pubkey, Union[List[Signature], BaseException]]:
+        if not self.positions:
+            await self.load()
+        plans = self.plan()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def settle_wallet(plan: SettlementPlan) -> List[Signature]:
+            async with semaphore:
+                # every client of a wallet signs the same way, any of them
+                # can pay for the packed transactions
+                client = next(iter(self.clients[plan.wallet].values()))
+                return await TransactionComposer(client).send(plan.legs, compute_unit_price)
+
+        results = await asyncio.gather(
+            *[settle_wallet(plan) for plan in plans.values()],
+            return_exceptions=True
+        )
+        # balances changed, the next settle reads them again
+        self.positions = {}
+        return dict(zip(plans, results))
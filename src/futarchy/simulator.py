@@ -0,0 +1,797 @@
+import asyncio
+import hashlib
+import json
+import struct
+from dataclasses import dataclass, fields, is_dataclass, replace
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from construct import Container
+from anchorpy import Program, Provider, Wallet
+from anchorpy.program.common import NamedInstruction
+from solders.account import Account
+from solders.address_lookup_table_account import ID as ADDRESS_LOOKUP_TABLE_PROGRAM_ID
+from solders.compute_budget import ID as COMPUTE_BUDGET_PROGRAM_ID
+from solders.hash import Hash
+from solders.instruction import AccountMeta, Instruction
+from solders.keypair import Keypair
+from solders.pubkey import Pubkey
+from solders.signature import Signature
+from solders.transaction import VersionedTransaction
+from solders.transaction_status import (
+    InstructionErrorCustom,
+    InstructionErrorFieldless,
+    TransactionConfirmationStatus,
+    TransactionErrorInstructionError,
+    TransactionStatus,
+)
+from solders.rpc.errors import SendTransactionPreflightFailureMessage
+from solders.rpc.responses import (
+    GetAccountInfoResp,
+    GetBlockHeightResp,
+    GetLatestBlockhashResp,
+    GetMultipleAccountsJsonParsedResp,
+    GetMultipleAccountsResp,
+    GetSignatureStatusesResp,
+    GetSlotResp,
+    RpcBlockhash,
+    RpcResponseContext,
+    RpcSimulateTransactionResult,
+    SendTransactionResp,
+    SimulateTransactionResp,
+)
+from solana.rpc.commitment import Confirmed
+from solana.rpc.core import RPCException
+from solana.rpc.types import TxOpts
+from spl.token.constants import TOKEN_PROGRAM_ID, ASSOCIATED_TOKEN_PROGRAM_ID
+from spl.token.instructions import get_associated_token_address
+
+from futarchy.client import DEFAULT_TX_OPTIONS, Programs, ProposalClient, get_programs
+from futarchy.confirmation import ConfirmationTracker, TransactionExpiredError, TransactionFailedError
+from futarchy.constants import AMM_PROGRAM_ID, AUTOCRAT_PROGRAM_ID, CONDITIONAL_VAULT_PROGRAM_ID
+from futarchy.lookup_tables import CREATE_LOOKUP_TABLE_TAG, EXTEND_LOOKUP_TABLE_TAG
+from futarchy.math import calculate_amm_output_exact
+from futarchy.twap import get_twap, passes_threshold, update_twap
+from futarchy.types import (
+    Amm,
+    ConditionalVault,
+    Dao,
+    Proposal,
+    ProposalInstruction,
+    ProposalState,
+    TwapOracle,
+    VaultStatus,
+    is_variant,
+)
+
+# units reported by simulate_transaction for every non compute budget instruction
+SIMULATED_UNITS_PER_IX = 30_000
+BLOCKHASH_VALIDITY = 150
+
+# spl token account layout, everything past the amount is left empty
+TOKEN_ACCOUNT = struct.Struct("<32s32sQI32sBIQQI32s")
+TOKEN_ACCOUNT_INITIALIZED = 1
+TOKEN_CLOSE_ACCOUNT_TAG = 9
+LOOKUP_TABLE_META = struct.Struct("<IQQB")
+
+# program error codes, from the idls and spl token
+TOKEN_INSUFFICIENT_FUNDS = 1
+TOKEN_MINT_MISMATCH = 3
+TOKEN_OWNER_MISMATCH = 4
+TOKEN_NON_NATIVE_HAS_BALANCE = 11
+ACCOUNT_NOT_INITIALIZED = 3012
+AMM_NO_RESERVES = 6001
+AMM_INPUT_AMOUNT_OVERFLOW = 6002
+AMM_SWAP_SLIPPAGE_EXCEEDED = 6006
+AMM_ZERO_SWAP_AMOUNT = 6014
+VAULT_INSUFFICIENT_UNDERLYING_TOKENS = 6000
+VAULT_INVALID_UNDERLYING_TOKEN_ACCOUNT = 6001
+VAULT_INVALID_CONDITIONAL_TOKEN_MINT = 6002
+VAULT_CANT_REDEEM_CONDITIONAL_TOKENS = 6003
+VAULT_ALREADY_SETTLED = 6004
+AUTOCRAT_PROPOSAL_TOO_YOUNG = 6004
+AUTOCRAT_PROPOSAL_ALREADY_FINALIZED = 6006
+
+
+class SimulationError(Exception):
+    def __init__(self, message: str, code: Optional[int] = None, fieldless: InstructionErrorFieldless = InstructionErrorFieldless.InvalidInstructionData):
+        super().__init__(message)
+        self.code = code
+        self.fieldless = fieldless
+
+    def to_transaction_error(self, ix_index: int) -> TransactionErrorInstructionError:
+        if self.code is None:
+            return TransactionErrorInstructionError(ix_index, self.fieldless)
+        return TransactionErrorInstructionError(ix_index, InstructionErrorCustom(self.code))
+
+
+@dataclass
+class TokenAccount:
+    mint: Pubkey
+    owner: Pubkey
+    amount: int = 0
+
+
+def derive_key(seed: int, *parts) -> Pubkey:
+    # deterministic stand-in addresses, so runs with the same seed line up
+    return Pubkey(hashlib.sha256(":".join(str(part) for part in (seed,) + parts).encode()).digest())
+
+def _to_container(value, program: Program):
+    if is_dataclass(value):
+        return Container(**{f.name: _to_container(getattr(value, f.name), program) for f in fields(value)})
+    if hasattr(value, "_sumtype_constructor_names"):
+        enum_name = type(value).__mro__[1].__name__
+        return getattr(program.type[enum_name], type(value).__name__)()
+    if isinstance(value, list):
+        return [_to_container(item, program) for item in value]
+    return value
+
+def pack_token_account(account: TokenAccount) -> bytes:
+    return TOKEN_ACCOUNT.pack(
+        bytes(account.mint), bytes(account.owner), account.amount,
+        0, bytes(32), TOKEN_ACCOUNT_INITIALIZED, 0, 0, 0, 0, bytes(32),
+    )
+
+
+class MarketSimulator:
+    # in-process v0.3 amm, conditional vault and autocrat state. Transactions are
+    # atomic and land in the current slot, time only moves through advance()
+    def __init__(self, seed: int = 0, slot: int = 1, programs: Optional[Programs] = None):
+        self.seed = seed
+        self.slot = slot
+        self.connection = SimulatedConnection(self)
+        if programs is None:
+            # account fetches go through the programs' provider
+            programs = get_programs(Provider(self.connection, Wallet(Keypair()), DEFAULT_TX_OPTIONS))
+        self.programs = programs
+        self.amms: Dict[Pubkey, Amm] = {}
+        self.vaults: Dict[Pubkey, ConditionalVault] = {}
+        self.proposals: Dict[Pubkey, Proposal] = {}
+        self.daos: Dict[Pubkey, Dao] = {}
+        self.token_accounts: Dict[Pubkey, TokenAccount] = {}
+        # conditional mint to the vault that issues it
+        self.mint_vaults: Dict[Pubkey, Pubkey] = {}
+        self.lookup_tables: Dict[Pubkey, Tuple[Pubkey, List[Pubkey]]] = {}
+        self.statuses: Dict[Signature, TransactionStatus] = {}
+        self._journal: Optional[List[Tuple[dict, Pubkey, object]]] = None
+        self._count = 0
+
+    # setup
+
+    def _new_key(self, name: str) -> Pubkey:
+        self._count += 1
+        return derive_key(self.seed, name, self._count)
+
+    def create_dao(
+        self,
+        pass_threshold_bps: int = 300,
+        # 5 days of 400ms slots, the v0.3 default
+        slots_per_proposal: int = 1_080_000,
+        twap_initial_observation: int = 10 ** 12,
+        twap_max_observation_change_per_update: int = 10 ** 10,
+    ) -> Pubkey:
+        dao = self._new_key("dao")
+        self.daos[dao] = Dao(
+            treasury_pda_bump=255,
+            treasury=self._new_key("treasury"),
+            token_mint=self._new_key("token_mint"),
+            usdc_mint=self._new_key("usdc_mint"),
+            proposal_count=0,
+            pass_threshold_bps=pass_threshold_bps,
+            slots_per_proposal=slots_per_proposal,
+            twap_initial_observation=twap_initial_observation,
+            twap_max_observation_change_per_update=twap_max_observation_change_per_update,
+            min_quote_futarchic_liquidity=1,
+            min_base_futarchic_liquidity=1,
+        )
+        return dao
+
+    def _create_vault(self, underlying_mint: Pubkey, decimals: int) -> Pubkey:
+        vault = self._new_key("vault")
+        underlying_token_account = get_associated_token_address(vault, underlying_mint)
+        self.vaults[vault] = ConditionalVault(
+            status=VaultStatus.Active(),
+            settlement_authority=self._new_key("settlement_authority"),
+            underlying_token_mint=underlying_mint,
+            underlying_token_account=underlying_token_account,
+            conditional_on_finalize_token_mint=self._new_key("finalize_mint"),
+            conditional_on_revert_token_mint=self._new_key("revert_mint"),
+            pda_bump=255,
+            decimals=decimals,
+        )
+        self.token_accounts[underlying_token_account] = TokenAccount(underlying_mint, vault)
+        self.mint_vaults[self.vaults[vault].conditional_on_finalize_token_mint] = vault
+        self.mint_vaults[self.vaults[vault].conditional_on_revert_token_mint] = vault
+        return vault
+
+    def _create_amm(self, base_mint: Pubkey, quote_mint: Pubkey, base_amount: int, quote_amount: int, dao: Dao) -> Pubkey:
+        amm = self._new_key("amm")
+        base_decimals = self.vaults[self.mint_vaults[base_mint]].decimals
+        quote_decimals = self.vaults[self.mint_vaults[quote_mint]].decimals
+        self.amms[amm] = Amm(
+            bump=255,
+            created_at_slot=self.slot,
+            lp_mint=self._new_key("lp_mint"),
+            base_mint=base_mint,
+            quote_mint=quote_mint,
+            base_mint_decimals=base_decimals,
+            quote_mint_decimals=quote_decimals,
+            base_amount=base_amount,
+            quote_amount=quote_amount,
+            oracle=TwapOracle(
+                last_updated_slot=self.slot,
+                last_price=0,
+                last_observation=dao.twap_initial_observation,
+                aggregator=0,
+                max_observation_change_per_update=dao.twap_max_observation_change_per_update,
+                initial_observation=dao.twap_initial_observation,
+            ),
+        )
+        self.token_accounts[get_associated_token_address(amm, base_mint)] = TokenAccount(base_mint, amm, base_amount)
+        self.token_accounts[get_associated_token_address(amm, quote_mint)] = TokenAccount(quote_mint, amm, quote_amount)
+        return amm
+
+    def create_proposal(
+        self,
+        dao: Optional[Pubkey] = None,
+        base_decimals: int = 9,
+        quote_decimals: int = 6,
+        pass_reserves: Tuple[int, int] = (10 ** 12, 10 ** 12),
+        fail_reserves: Tuple[int, int] = (10 ** 12, 10 ** 12),
+    ) -> Pubkey:
+        # reserves are (base, quote) in atoms
+        if dao is None:
+            dao = self.create_dao()
+        dao_account = self.daos[dao]
+        base_vault = self._create_vault(self._new_key("base_mint"), base_decimals)
+        quote_vault = self._create_vault(self._new_key("quote_mint"), quote_decimals)
+        base = self.vaults[base_vault]
+        quote = self.vaults[quote_vault]
+        # the liquidity was minted through the vaults, so they hold enough
+        # underlying to redeem either side
+        self.token_accounts[base.underlying_token_account].amount = max(pass_reserves[0], fail_reserves[0])
+        self.token_accounts[quote.underlying_token_account].amount = max(pass_reserves[1], fail_reserves[1])
+        pass_amm = self._create_amm(base.conditional_on_finalize_token_mint, quote.conditional_on_finalize_token_mint, *pass_reserves, dao_account)
+        fail_amm = self._create_amm(base.conditional_on_revert_token_mint, quote.conditional_on_revert_token_mint, *fail_reserves, dao_account)
+        proposal = self._new_key("proposal")
+        self.proposals[proposal] = Proposal(
+            number=dao_account.proposal_count,
+            proposer=self._new_key("proposer"),
+            description_url="",
+            slot_enqueued=self.slot,
+            state=ProposalState.Pending(),
+            instruction=ProposalInstruction(program_id=self._new_key("program"), accounts=[], data=b""),
+            pass_amm=pass_amm,
+            fail_amm=fail_amm,
+            base_vault=base_vault,
+            quote_vault=quote_vault,
+            dao=dao,
+            pass_lp_tokens_locked=0,
+            fail_lp_tokens_locked=0,
+            nonce=0,
+            pda_bump=255,
+        )
+        self.daos[dao] = replace(dao_account, proposal_count=dao_account.proposal_count + 1)
+        return proposal
+
+    def fund(self, owner: Pubkey, mint: Pubkey, amount: int) -> Pubkey:
+        account = get_associated_token_address(owner, mint)
+        current = self.token_accounts.get(account)
+        self.token_accounts[account] = TokenAccount(mint, owner, amount + (current.amount if current else 0))
+        return account
+
+    def balance(self, owner: Pubkey, mint: Pubkey) -> int:
+        account = self.token_accounts.get(get_associated_token_address(owner, mint))
+        return 0 if account is None else account.amount
+
+    def advance(self, slots: int = 1):
+        self.slot += slots
+
+    # state changes, every write goes through _set so a failed transaction rolls back
+
+    def _set(self, store: dict, key: Pubkey, value):
+        if self._journal is not None:
+            self._journal.append((store, key, store.get(key)))
+        if value is None:
+            store.pop(key, None)
+        else:
+            store[key] = value
+
+    def _token_account(self, address: Pubkey, mint: Optional[Pubkey] = None) -> TokenAccount:
+        account = self.token_accounts.get(address)
+        if account is None:
+            raise SimulationError(f"token account {address} isn't initialized", ACCOUNT_NOT_INITIALIZED)
+        if mint is not None and account.mint != mint:
+            raise SimulationError(f"token account {address} has the wrong mint", TOKEN_MINT_MISMATCH)
+        return account
+
+    def _transfer(self, source: Pubkey, dest: Pubkey, amount: int, authority: Pubkey, mint: Pubkey):
+        source_account = self._token_account(source, mint)
+        dest_account = self._token_account(dest, mint)
+        if source_account.owner != authority:
+            raise SimulationError(f"{authority} doesn't own {source}", TOKEN_OWNER_MISMATCH)
+        if source_account.amount < amount:
+            raise SimulationError(f"insufficient funds in {source}", TOKEN_INSUFFICIENT_FUNDS)
+        self._set(self.token_accounts, source, replace(source_account, amount=source_account.amount - amount))
+        dest_account = self.token_accounts[dest]
+        self._set(self.token_accounts, dest, replace(dest_account, amount=dest_account.amount + amount))
+
+    def _mint_to(self, dest: Pubkey, amount: int, mint: Pubkey):
+        account = self._token_account(dest, mint)
+        self._set(self.token_accounts, dest, replace(account, amount=account.amount + amount))
+
+    def _burn(self, source: Pubkey, amount: int, authority: Pubkey, mint: Pubkey):
+        account = self._token_account(source, mint)
+        if account.owner != authority:
+            raise SimulationError(f"{authority} doesn't own {source}", TOKEN_OWNER_MISMATCH)
+        if account.amount < amount:
+            raise SimulationError(f"insufficient funds in {source}", TOKEN_INSUFFICIENT_FUNDS)
+        self._set(self.token_accounts, source, replace(account, amount=account.amount - amount))
+
+    # programs
+
+    def _vault_ix(self, name: str, args, accounts: List[Pubkey]):
+        vault_key, finalize_mint, revert_mint, vault_underlying, authority, user_finalize, user_revert, user_underlying = accounts[:8]
+        vault = self.vaults.get(vault_key)
+        if vault is None:
+            raise SimulationError(f"vault {vault_key} isn't initialized", ACCOUNT_NOT_INITIALIZED)
+        if (finalize_mint, revert_mint) != (vault.conditional_on_finalize_token_mint, vault.conditional_on_revert_token_mint):
+            raise SimulationError("conditional token mints don't match the vault", VAULT_INVALID_CONDITIONAL_TOKEN_MINT)
+        if vault_underlying != vault.underlying_token_account:
+            raise SimulationError("wrong vault underlying token account", VAULT_INVALID_UNDERLYING_TOKEN_ACCOUNT)
+        underlying_mint = vault.underlying_token_mint
+        if name == "mint_conditional_tokens":
+            if not is_variant(vault.status, "Active"):
+                raise SimulationError("vault is already settled", VAULT_ALREADY_SETTLED)
+            if self._token_account(user_underlying, underlying_mint).amount < args.amount:
+                raise SimulationError("insufficient underlying tokens", VAULT_INSUFFICIENT_UNDERLYING_TOKENS)
+            self._transfer(user_underlying, vault_underlying, args.amount, authority, underlying_mint)
+            self._mint_to(user_finalize, args.amount, finalize_mint)
+            self._mint_to(user_revert, args.amount, revert_mint)
+        elif name == "merge_conditional_tokens_for_underlying_tokens":
+            if not is_variant(vault.status, "Active"):
+                raise SimulationError("vault is already settled", VAULT_ALREADY_SETTLED)
+            self._burn(user_finalize, args.amount, authority, finalize_mint)
+            self._burn(user_revert, args.amount, authority, revert_mint)
+            self._transfer(vault_underlying, user_underlying, args.amount, vault_key, underlying_mint)
+        elif name == "redeem_conditional_tokens_for_underlying_tokens":
+            if is_variant(vault.status, "Active"):
+                raise SimulationError("vault isn't settled", VAULT_CANT_REDEEM_CONDITIONAL_TOKENS)
+            finalize_amount = self._token_account(user_finalize, finalize_mint).amount
+            revert_amount = self._token_account(user_revert, revert_mint).amount
+            self._burn(user_finalize, finalize_amount, authority, finalize_mint)
+            self._burn(user_revert, revert_amount, authority, revert_mint)
+            payout = finalize_amount if is_variant(vault.status, "Finalized") else revert_amount
+            self._transfer(vault_underlying, user_underlying, payout, vault_key, underlying_mint)
+        else:
+            raise SimulationError(f"unsupported vault instruction {name}")
+
+    def _crank(self, amm_key: Pubkey) -> Amm:
+        amm = self.amms.get(amm_key)
+        if amm is None:
+            raise SimulationError(f"amm {amm_key} isn't initialized", ACCOUNT_NOT_INITIALIZED)
+        amm = replace(amm, oracle=replace(amm.oracle))
+        update_twap(amm.oracle, amm.base_amount, amm.quote_amount, self.slot)
+        self._set(self.amms, amm_key, amm)
+        return amm
+
+    def _swap(self, amm_key: Pubkey, is_buy: bool, input_amount: int, output_amount_min: int) -> int:
+        if input_amount == 0:
+            raise SimulationError("swap amount must be non-zero", AMM_ZERO_SWAP_AMOUNT)
+        amm = self._crank(amm_key)
+        if amm.base_amount == 0 or amm.quote_amount == 0:
+            raise SimulationError("amm has no reserves", AMM_NO_RESERVES)
+        try:
+            if is_buy:
+                output = calculate_amm_output_exact(input_amount, amm.quote_amount, amm.base_amount)
+            else:
+                output = calculate_amm_output_exact(input_amount, amm.base_amount, amm.quote_amount)
+        except ValueError as e:
+            raise SimulationError(str(e), AMM_INPUT_AMOUNT_OVERFLOW)
+        if output < output_amount_min:
+            raise SimulationError(f"swap output {output} is below the minimum {output_amount_min}", AMM_SWAP_SLIPPAGE_EXCEEDED)
+        if is_buy:
+            amm.quote_amount += input_amount
+            amm.base_amount -= output
+        else:
+            amm.base_amount += input_amount
+            amm.quote_amount -= output
+        return output
+
+    def _amm_ix(self, name: str, args, accounts: List[Pubkey]):
+        if name == "crank_that_twap":
+            self._crank(accounts[0])
+            return
+        if name != "swap":
+            raise SimulationError(f"unsupported amm instruction {name}")
+        user, amm_key, user_base, user_quote, vault_ata_base, vault_ata_quote = accounts[:6]
+        args = args.args
+        is_buy = is_variant(args.swap_type, "Buy")
+        output = self._swap(amm_key, is_buy, args.input_amount, args.output_amount_min)
+        amm = self.amms[amm_key]
+        if is_buy:
+            self._transfer(user_quote, vault_ata_quote, args.input_amount, user, amm.quote_mint)
+            self._transfer(vault_ata_base, user_base, output, amm_key, amm.base_mint)
+        else:
+            self._transfer(user_base, vault_ata_base, args.input_amount, user, amm.base_mint)
+            self._transfer(vault_ata_quote, user_quote, output, amm_key, amm.quote_mint)
+
+    def _finalize(self, proposal_key: Pubkey) -> bool:
+        proposal = self.proposals[proposal_key]
+        dao = self.daos[proposal.dao]
+        if not is_variant(proposal.state, "Pending"):
+            raise SimulationError("proposal is already finalized", AUTOCRAT_PROPOSAL_ALREADY_FINALIZED)
+        if self.slot < proposal.slot_enqueued + dao.slots_per_proposal:
+            raise SimulationError("proposal is too young", AUTOCRAT_PROPOSAL_TOO_YOUNG)
+        pass_amm = self.amms[proposal.pass_amm]
+        fail_amm = self.amms[proposal.fail_amm]
+        pass_twap = get_twap(pass_amm.oracle, pass_amm.created_at_slot)
+        fail_twap = get_twap(fail_amm.oracle, fail_amm.created_at_slot)
+        if pass_twap is None or fail_twap is None:
+            raise SimulationError("no twap observations")
+        passed = passes_threshold(pass_twap, fail_twap, dao.pass_threshold_bps)
+        status = VaultStatus.Finalized() if passed else VaultStatus.Reverted()
+        for vault in (proposal.base_vault, proposal.quote_vault):
+            self._set(self.vaults, vault, replace(self.vaults[vault], status=status))
+        state = ProposalState.Passed() if passed else ProposalState.Failed()
+        self._set(self.proposals, proposal_key, replace(proposal, state=state))
+        return passed
+
+    def _lookup_table_ix(self, data: bytes, accounts: List[Pubkey]):
+        tag = struct.unpack_from("<I", data)[0]
+        table = accounts[0]
+        if tag == CREATE_LOOKUP_TABLE_TAG:
+            self._set(self.lookup_tables, table, (accounts[1], []))
+        elif tag == EXTEND_LOOKUP_TABLE_TAG:
+            authority, addresses = self.lookup_tables[table]
+            count = struct.unpack_from("<Q", data, 4)[0]
+            new_addresses = [Pubkey.from_bytes(data[12 + 32 * i:44 + 32 * i]) for i in range(count)]
+            self._set(self.lookup_tables, table, (authority, addresses + new_addresses))
+        else:
+            raise SimulationError("unsupported lookup table instruction")
+
+    def _execute(self, ix: Instruction, signers: Set[Pubkey]):
+        accounts = [meta.pubkey for meta in ix.accounts]
+        for meta in ix.accounts:
+            if meta.is_signer and meta.pubkey not in signers:
+                raise SimulationError(f"{meta.pubkey} didn't sign", fieldless=InstructionErrorFieldless.MissingRequiredSignature)
+        data = bytes(ix.data)
+        program_id = ix.program_id
+        if program_id == COMPUTE_BUDGET_PROGRAM_ID:
+            return
+        if program_id == ASSOCIATED_TOKEN_PROGRAM_ID:
+            _, account, owner, mint = accounts[:4]
+            if account in self.token_accounts:
+                if data[:1] != b"\x01":
+                    raise SimulationError(f"token account {account} already exists", fieldless=InstructionErrorFieldless.AccountAlreadyInitialized)
+                return
+            self._set(self.token_accounts, account, TokenAccount(mint, owner))
+        elif program_id == TOKEN_PROGRAM_ID:
+            if data[:1] != bytes([TOKEN_CLOSE_ACCOUNT_TAG]):
+                raise SimulationError("unsupported token instruction")
+            account, _, owner = accounts[:3]
+            token_account = self._token_account(account)
+            if token_account.owner != owner:
+                raise SimulationError(f"{owner} doesn't own {account}", TOKEN_OWNER_MISMATCH)
+            if token_account.amount != 0:
+                raise SimulationError(f"token account {account} still has a balance", TOKEN_NON_NATIVE_HAS_BALANCE)
+            self._set(self.token_accounts, account, None)
+        elif program_id == CONDITIONAL_VAULT_PROGRAM_ID:
+            named = self.programs.vault.coder.instruction.parse(data)
+            self._vault_ix(named.name, named.data, accounts)
+        elif program_id == AMM_PROGRAM_ID:
+            named = self.programs.amm.coder.instruction.parse(data)
+            self._amm_ix(named.name, named.data, accounts)
+        elif program_id == AUTOCRAT_PROGRAM_ID:
+            named = self.programs.autocrat.coder.instruction.parse(data)
+            if named.name != "finalize_proposal":
+                raise SimulationError(f"unsupported autocrat instruction {named.name}")
+            self._finalize(accounts[0])
+        elif program_id == ADDRESS_LOOKUP_TABLE_PROGRAM_ID:
+            self._lookup_table_ix(data, accounts)
+        else:
+            raise SimulationError(f"unsupported program {program_id}", fieldless=InstructionErrorFieldless.UnsupportedProgramId)
+
+    def _run_atomic(self, fn: Callable[[], object]):
+        self._journal = []
+        try:
+            result = fn()
+        except Exception:
+            for store, key, value in reversed(self._journal):
+                if value is None:
+                    store.pop(key, None)
+                else:
+                    store[key] = value
+            raise
+        finally:
+            self._journal = None
+        return result
+
+    def decompile(self, tx: VersionedTransaction) -> List[Instruction]:
+        message = tx.message
+        keys = list(message.account_keys)
+        writable = []
+        readonly = []
+        for lookup in getattr(message, "address_table_lookups", []):
+            table = self.lookup_tables.get(lookup.account_key)
+            if table is None:
+                raise SimulationError(f"lookup table {lookup.account_key} doesn't exist")
+            addresses = table[1]
+            writable += [addresses[i] for i in bytes(lookup.writable_indexes)]
+            readonly += [addresses[i] for i in bytes(lookup.readonly_indexes)]
+        keys += writable + readonly
+        header = message.header
+        num_signers = header.num_required_signatures
+        num_static = len(message.account_keys)
+        num_writable_signers = num_signers - header.num_readonly_signed_accounts
+        num_writable_static = num_static - header.num_readonly_unsigned_accounts
+
+        def is_writable(index: int) -> bool:
+            if index < num_signers:
+                return index < num_writable_signers
+            if index < num_static:
+                return index < num_writable_static
+            return index < num_static + len(writable)
+
+        ixs = []
+        for compiled in message.instructions:
+            ixs.append(Instruction(
+                keys[compiled.program_id_index],
+                bytes(compiled.data),
+                [AccountMeta(keys[i], i < num_signers, is_writable(i)) for i in bytes(compiled.accounts)],
+            ))
+        return ixs
+
+    def execute(self, tx: VersionedTransaction, commit: bool = True) -> Optional[TransactionErrorInstructionError]:
+        # returns the transaction error, state only changes on success and commit
+        signers = set(tx.message.account_keys[:tx.message.header.num_required_signatures])
+        ixs = self.decompile(tx)
+        failed_ix = [0]
+
+        def run():
+            for i, ix in enumerate(ixs):
+                failed_ix[0] = i
+                self._execute(ix, signers)
+            if not commit:
+                raise _DryRun()
+
+        try:
+            self._run_atomic(run)
+        except _DryRun:
+            return None
+        except SimulationError as e:
+            return e.to_transaction_error(failed_ix[0])
+        return None
+
+    def process(self, tx: VersionedTransaction) -> Signature:
+        signature = tx.signatures[0]
+        if signature in self.statuses:
+            return signature
+        err = self.execute(tx)
+        self.statuses[signature] = TransactionStatus(
+            self.slot,
+            None,
+            None,
+            err,
+            TransactionConfirmationStatus.Finalized,
+        )
+        return signature
+
+    # outside order flow and lifecycle
+
+    def swap(self, amm: Pubkey, is_buy: bool, input_amount: int, output_amount_min: int = 0) -> int:
+        # a trade by someone outside the simulation. Their input is treated as
+        # freshly minted, so the vault gets the underlying that backs it
+        def run():
+            output = self._swap(amm, is_buy, input_amount, output_amount_min)
+            amm_account = self.amms[amm]
+            input_mint = amm_account.quote_mint if is_buy else amm_account.base_mint
+            vault = self.vaults[self.mint_vaults[input_mint]]
+            self._mint_to(vault.underlying_token_account, input_amount, vault.underlying_token_mint)
+            for mint, amount in ((amm_account.base_mint, amm_account.base_amount), (amm_account.quote_mint, amm_account.quote_amount)):
+                account = get_associated_token_address(amm, mint)
+                self._set(self.token_accounts, account, replace(self.token_accounts[account], amount=amount))
+            return output
+        return self._run_atomic(run)
+
+    def crank(self, amm: Pubkey):
+        self._run_atomic(lambda: self._crank(amm))
+
+    def finalize_proposal(self, proposal: Pubkey) -> bool:
+        return self._run_atomic(lambda: self._finalize(proposal))
+
+    def replay(self, flow: Iterable[Tuple[int, Pubkey, bool, int]]) -> int:
+        # (slot, amm, is_buy, input_amount) in slot order, swaps that would fail
+        # on chain are skipped
+        count = 0
+        for slot, amm, is_buy, input_amount in flow:
+            if slot > self.slot:
+                self.slot = slot
+            try:
+                self.swap(amm, is_buy, input_amount)
+                count += 1
+            except SimulationError:
+                pass
+        return count
+
+    # account encoding
+
+    def get_blockhash(self, slot: Optional[int] = None) -> Hash:
+        slot = self.slot if slot is None else slot
+        return Hash(hashlib.sha256(f"{self.seed}:blockhash:{slot}".encode()).digest())
+
+    def get_account(self, pubkey: Pubkey) -> Optional[Account]:
+        if pubkey in self.amms:
+            program = self.programs.amm
+            data = program.coder.accounts.build(NamedInstruction(data=_to_container(self.amms[pubkey], program), name="Amm"))
+            return Account(lamports=1, data=data, owner=AMM_PROGRAM_ID, executable=False, rent_epoch=0)
+        if pubkey in self.vaults:
+            program = self.programs.vault
+            data = program.coder.accounts.build(NamedInstruction(data=_to_container(self.vaults[pubkey], program), name="ConditionalVault"))
+            return Account(lamports=1, data=data, owner=CONDITIONAL_VAULT_PROGRAM_ID, executable=False, rent_epoch=0)
+        if pubkey in self.proposals:
+            program = self.programs.autocrat
+            data = program.coder.accounts.build(NamedInstruction(data=_to_container(self.proposals[pubkey], program), name="Proposal"))
+            return Account(lamports=1, data=data, owner=AUTOCRAT_PROGRAM_ID, executable=False, rent_epoch=0)
+        if pubkey in self.daos:
+            program = self.programs.autocrat
+            data = program.coder.accounts.build(NamedInstruction(data=_to_container(self.daos[pubkey], program), name="Dao"))
+            return Account(lamports=1, data=data, owner=AUTOCRAT_PROGRAM_ID, executable=False, rent_epoch=0)
+        if pubkey in self.token_accounts:
+            data = pack_token_account(self.token_accounts[pubkey])
+            return Account(lamports=1, data=data, owner=TOKEN_PROGRAM_ID, executable=False, rent_epoch=0)
+        if pubkey in self.lookup_tables:
+            authority, addresses = self.lookup_tables[pubkey]
+            # extended addresses are active right away, the simulator has no slot hashes
+            data = (
+                LOOKUP_TABLE_META.pack(1, 2 ** 64 - 1, 0, 0) + bytes([1]) + bytes(authority) + bytes(2)
+                + b"".join(bytes(address) for address in addresses)
+            )
+            return Account(lamports=1, data=data, owner=ADDRESS_LOOKUP_TABLE_PROGRAM_ID, executable=False, rent_epoch=0)
+        return None
+
+
+class _DryRun(Exception):
+    pass
+
+
+class SimulatedProvider:
+    def __init__(self, simulator: MarketSimulator):
+        self.simulator = simulator
+
+    async def make_request(self, body, parser):
+        tx_bytes, opts = body
+        tx = VersionedTransaction.from_bytes(tx_bytes)
+        if not opts.skip_preflight:
+            err = self.simulator.execute(tx, commit=False)
+            if err is not None:
+                # shaped like the rpc's answer, so callers handle it the same way
+                raise RPCException(SendTransactionPreflightFailureMessage(
+                    message=f"Transaction simulation failed: {err}",
+                    data=RpcSimulateTransactionResult(err=err),
+                ))
+        return SendTransactionResp(self.simulator.process(tx))
+
+    async def make_request_unparsed(self, body) -> str:
+        # no competing fee market, the only json request made directly is for fees
+        return json.dumps({"jsonrpc": "2.0", "id": 0, "result": []})
+
+
+class SimulatedConnection:
+    # the subset of AsyncClient the sdk uses, answered from the simulator
+    def __init__(self, simulator: MarketSimulator):
+        self.simulator = simulator
+        self._provider = SimulatedProvider(simulator)
+
+    def _context(self) -> RpcResponseContext:
+        return RpcResponseContext(self.simulator.slot)
+
+    async def get_account_info(self, pubkey: Pubkey, commitment=None, encoding="base64", data_slice=None) -> GetAccountInfoResp:
+        return GetAccountInfoResp(self.simulator.get_account(pubkey), self._context())
+
+    async def get_multiple_accounts(self, pubkeys: List[Pubkey], commitment=None, encoding="base64", data_slice=None) -> GetMultipleAccountsResp:
+        return GetMultipleAccountsResp([self.simulator.get_account(pubkey) for pubkey in pubkeys], self._context())
+
+    async def get_multiple_accounts_json_parsed(self, pubkeys: List[Pubkey], commitment=None) -> GetMultipleAccountsJsonParsedResp:
+        value = []
+        for pubkey in pubkeys:
+            account = self.simulator.token_accounts.get(pubkey)
+            if account is None:
+                value.append(None)
+                continue
+            value.append({
+                "data": {
+                    "parsed": {
+                        "info": {
+                            "isNative": False,
+                            "mint": str(account.mint),
+                            "owner": str(account.owner),
+                            "state": "initialized",
+                            "tokenAmount": {"amount": str(account.amount), "decimals": 0, "uiAmount": None, "uiAmountString": str(account.amount)},
+                        },
+                        "type": "account",
+                    },
+                    "program": "spl-token",
+                    "space": TOKEN_ACCOUNT.size,
+                },
+                "executable": False,
+                "lamports": 1,
+                "owner": str(TOKEN_PROGRAM_ID),
+                "rentEpoch": 0,
+                "space": TOKEN_ACCOUNT.size,
+            })
+        return GetMultipleAccountsJsonParsedResp.from_json(json.dumps({
+            "jsonrpc": "2.0",
+            "id": 0,
+            "result": {"context": {"slot": self.simulator.slot}, "value": value},
+        }))
+
+    async def get_latest_blockhash(self, commitment=None) -> GetLatestBlockhashResp:
+        blockhash = RpcBlockhash(self.simulator.get_blockhash(), self.simulator.slot + BLOCKHASH_VALIDITY)
+        return GetLatestBlockhashResp(blockhash, self._context())
+
+    async def get_block_height(self, commitment=None) -> GetBlockHeightResp:
+        return GetBlockHeightResp(self.simulator.slot)
+
+    async def get_slot(self, commitment=None) -> GetSlotResp:
+        return GetSlotResp(self.simulator.slot)
+
+    async def simulate_transaction(self, txn: VersionedTransaction, sig_verify: bool = False, commitment=None) -> SimulateTransactionResp:
+        err = self.simulator.execute(txn, commit=False)
+        num_ixs = sum(1 for ix in txn.message.instructions if txn.message.account_keys[ix.program_id_index] != COMPUTE_BUDGET_PROGRAM_ID)
+        result = RpcSimulateTransactionResult(err=err, units_consumed=None if err else SIMULATED_UNITS_PER_IX * num_ixs)
+        return SimulateTransactionResp(result, self._context())
+
+    async def get_signature_statuses(self, signatures: List[Signature], search_transaction_history: bool = False) -> GetSignatureStatusesResp:
+        return GetSignatureStatusesResp([self.simulator.statuses.get(s) for s in signatures], self._context())
+
+    def _send_raw_transaction_body(self, txn: bytes, opts: TxOpts):
+        return txn, opts
+
+    async def send_raw_transaction(self, txn: bytes, opts: Optional[TxOpts] = None) -> SendTransactionResp:
+        return await self._provider.make_request((txn, opts or DEFAULT_TX_OPTIONS), SendTransactionResp)
+
+
+class SimulatedConfirmationTracker(ConfirmationTracker):
+    # transactions execute when they're sent, so the outcome is known right away
+    def __init__(self, simulator: MarketSimulator):
+        super().__init__(simulator.connection, Confirmed)
+        self.simulator = simulator
+
+    def track(self, tx: VersionedTransaction, last_valid_block_height: int) -> "asyncio.Future[TransactionStatus]":
+        signature = tx.signatures[0]
+        future = asyncio.get_running_loop().create_future()
+        status = self.simulator.statuses.get(signature)
+        if status is None:
+            future.set_exception(TransactionExpiredError(signature))
+        elif status.err is not None:
+            future.set_exception(TransactionFailedError(signature, status.err))
+        else:
+            future.set_result(status)
+        return future
+
+
+class SimulatedProposalClient(ProposalClient):
+    def __init__(self, simulator: MarketSimulator, wallet: Wallet, proposal: Pubkey, opts: TxOpts = DEFAULT_TX_OPTIONS):
+        super().__init__(simulator.connection, wallet, proposal, opts, simulator.programs)
+        self.simulator = simulator
+
+    def start_confirmation_tracker(self, poll_interval: float = 0.5, resend_interval: float = 2.0) -> ConfirmationTracker:
+        self.confirmation_tracker = SimulatedConfirmationTracker(self.simulator)
+        return self.confirmation_tracker
+
+
+async def run_backtest(
+    simulator: MarketSimulator,
+    end_slot: int,
+    on_slot: Callable[[int], Awaitable[None]],
+    flow: Iterable[Tuple[int, Pubkey, bool, int]] = (),
+    step: int = 1,
+):
+    # outside flow for a slot lands before the strategy sees it
+    flow = iter(flow)
+    pending = next(flow, None)
+    while simulator.slot <= end_slot:
+        while pending is not None and pending[0] <= simulator.slot:
+            simulator.replay([pending])
+            pending = next(flow, None)
+        await on_slot(simulator.slot)
+        simulator.advance(step)
@@ -0,0 +1,83 @@
+import asyncio
+import logging
+from typing import Callable, Optional, Sequence, Union
+from solders.pubkey import Pubkey
+from solders.rpc.responses import AccountNotification, ProgramNotification, SlotNotification
+from solana.rpc.commitment import Commitment, Processed
+from solana.rpc.types import MemcmpOpts
+from solana.rpc.websocket_api import connect
+
+logger = logging.getLogger(__name__)
+
+
+async def subscribe_accounts(
+    ws_url: str,
+    pubkeys: Sequence[Pubkey],
+    on_account: Callable[[Pubkey, int, bytes], None],
+    on_slot: Optional[Callable[[int], None]] = None,
+    commitment: Commitment = Processed,
+    reconnect_delay: float = 1.0,
+    on_connect: Optional[Callable[[], None]] = None,
+):
+    # runs until cancelled, resubscribing after every disconnect, on_connect is
+    # called once the subscriptions are made since changes while disconnected
+    # are never notified
+    while True:
+        try:
+            async with connect(ws_url) as websocket:
+                for pubkey in pubkeys:
+                    await websocket.account_subscribe(pubkey, commitment, "base64")
+                if on_slot is not None:
+                    await websocket.slot_subscribe()
+                if on_connect is not None:
+                    on_connect()
+                async for messages in websocket:
+                    for message in messages:
+                        if isinstance(message, AccountNotification):
+                            if message.result.value is None:
+                                continue
+                            request = websocket.subscriptions[message.subscription]
+                            on_account(
+                                request.account, 
+                                message.result.context.slot, 
+                                message.result.value.data
+                            )
+                        elif isinstance(message, SlotNotification) and on_slot is not None:
+                            on_slot(message.result.slot)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("account subscription to %s failed: %r", ws_url, e)
+        await asyncio.sleep(reconnect_delay)
+
+
+async def subscribe_program(
+    ws_url: str,
+    program_id: Pubkey,
+    on_account: Callable[[Pubkey, int, bytes], None],
+    filters: Sequence[Union[int, MemcmpOpts]] = (),
+    on_connect: Optional[Callable[[], None]] = None,
+    commitment: Commitment = Processed,
+    reconnect_delay: float = 1.0,
+):
+    # like subscribe_accounts, on_connect is called once each subscription is
+    # made so the caller can catch up on what it missed while disconnected
+    while True:
+        try:
+            async with connect(ws_url) as websocket:
+                await websocket.program_subscribe(program_id, commitment, "base64", filters=list(filters) or None)
+                if on_connect is not None:
+                    on_connect()
+                async for messages in websocket:
+                    for message in messages:
+                        if isinstance(message, ProgramNotification):
+                            on_account(
+                                message.result.value.pubkey,
+                                message.result.context.slot,
+                                message.result.value.account.data
+                            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("program subscription to %s failed: %r", ws_url, e)
+        await asyncio.sleep(reconnect_delay)
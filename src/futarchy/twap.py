@@ -0,0 +1,204 @@
+from dataclasses import dataclass, replace
+from typing import Dict, List, Optional, Tuple
+from solders.pubkey import Pubkey
+
+from futarchy.types import Amm, Dao, Proposal, TwapOracle
+
+# mirrors the v0.3 amm program
+PRICE_SCALE = 10 ** 12
+ONE_MINUTE_IN_SLOTS = 150
+U128_MAX = 2 ** 128 - 1
+MAX_BPS = 100 * 100
+
+
+def get_price(base_amount: int, quote_amount: int) -> int:
+    return quote_amount * PRICE_SCALE // base_amount
+
+def get_next_observation(last_observation: int, price: int, max_change: int) -> int:
+    if price > last_observation:
+        return min(price, min(last_observation + max_change, U128_MAX))
+    return max(price, max(last_observation - max_change, 0))
+
+def update_twap(oracle: TwapOracle, base_amount: int, quote_amount: int, slot: int) -> bool:
+    # the program updates before every swap and on cranks, at most once a minute
+    if slot < oracle.last_updated_slot + ONE_MINUTE_IN_SLOTS:
+        return False
+    if base_amount == 0 or quote_amount == 0:
+        return False
+    price = get_price(base_amount, quote_amount)
+    observation = get_next_observation(oracle.last_observation, price, oracle.max_observation_change_per_update)
+    oracle.aggregator = (oracle.aggregator + observation * (slot - oracle.last_updated_slot)) & U128_MAX
+    oracle.last_updated_slot = slot
+    oracle.last_price = price
+    oracle.last_observation = observation
+    return True
+
+def get_twap(oracle: TwapOracle, created_at_slot: int) -> Optional[int]:
+    slots_passed = oracle.last_updated_slot - created_at_slot
+    if slots_passed == 0 or oracle.aggregator == 0:
+        return None
+    return oracle.aggregator // slots_passed
+
+def sum_observations(last_observation: int, price: int, max_change: int, updates: int) -> int:
+    # sum of the next `updates` clamped observations if the price holds, each
+    # step moves max_change towards the price until it's reached
+    if updates <= 0:
+        return 0
+    distance = abs(price - last_observation)
+    if distance == 0:
+        return price * updates
+    if max_change == 0:
+        return last_observation * updates
+    steps_to_price = -(-distance // max_change)
+    clamped = min(updates, steps_to_price - 1)
+    direction = 1 if price > last_observation else -1
+    total = clamped * last_observation + direction * max_change * clamped * (clamped + 1) // 2
+    return total + (updates - clamped) * price
+
+
+class TwapTracker:
+    def __init__(self, amm: Amm, slot: int = 0):
+        self.created_at_slot = amm.created_at_slot
+        self.oracle = replace(amm.oracle) if isinstance(amm.oracle, TwapOracle) else TwapOracle(
+            amm.oracle.last_updated_slot,
+            amm.oracle.last_price,
+            amm.oracle.last_observation,
+            amm.oracle.aggregator,
+            amm.oracle.max_observation_change_per_update,
+            amm.oracle.initial_observation,
+        )
+        self.base_amount = amm.base_amount
+        self.quote_amount = amm.quote_amount
+        self.slot = slot
+
+    def update(self, amm: Amm, slot: int):
+        # on-chain state always wins, it already includes every update up to slot
+        if slot < self.slot:
+            return
+        oracle = amm.oracle
+        self.oracle.last_updated_slot = oracle.last_updated_slot
+        self.oracle.last_price = oracle.last_price
+        self.oracle.last_observation = oracle.last_observation
+        self.oracle.aggregator = oracle.aggregator
+        self.oracle.max_observation_change_per_update = oracle.max_observation_change_per_update
+        self.base_amount = amm.base_amount
+        self.quote_amount = amm.quote_amount
+        self.slot = slot
+
+    def crank(self, slot: int) -> bool:
+        # what a crank or swap landing at slot would do
+        return update_twap(self.oracle, self.base_amount, self.quote_amount, slot)
+
+    @property
+    def price(self) -> Optional[int]:
+        if self.base_amount == 0 or self.quote_amount == 0:
+            return None
+        return get_price(self.base_amount, self.quote_amount)
+
+    @property
+    def twap(self) -> Optional[int]:
+        return get_twap(self.oracle, self.created_at_slot)
+
+    def project(self, end_slot: int, price: Optional[int] = None) -> Optional[int]:
+        # twap at end_slot if the price holds and the oracle is updated every
+        # minute until then
+        if price is None:
+            price = self.price
+        if price is None:
+            return self.twap
+        oracle = self.oracle
+        updates = max(0, end_slot - oracle.last_updated_slot) // ONE_MINUTE_IN_SLOTS
+        aggregator = oracle.aggregator + ONE_MINUTE_IN_SLOTS * sum_observations(
+            oracle.last_observation, price, oracle.max_observation_change_per_update, updates
+        )
+        slots_passed = oracle.last_updated_slot + updates * ONE_MINUTE_IN_SLOTS - self.created_at_slot
+        if slots_passed == 0 or aggregator == 0:
+            return None
+        return (aggregator & U128_MAX) // slots_passed
+
+
+def passes_threshold(pass_twap: int, fail_twap: int, pass_threshold_bps: int) -> bool:
+    # same comparison as finalize_proposal
+    return pass_twap > fail_twap * (MAX_BPS + pass_threshold_bps) // MAX_BPS
+
+@dataclass
+class TwapForecast:
+    slot: int
+    end_slot: int
+    pass_twap: Optional[int]
+    fail_twap: Optional[int]
+    projected_pass_twap: Optional[int]
+    projected_fail_twap: Optional[int]
+    # pass/fail twap ratio in bps above 1, less the threshold, positive passes
+    margin_bps: Optional[float]
+    passing: Optional[bool]
+
+
+class ProposalTwapTracker:
+    def __init__(self, pass_amm: Amm, fail_amm: Amm, end_slot: int, pass_threshold_bps: int, slot: int = 0):
+        self.pass_tracker = TwapTracker(pass_amm, slot)
+        self.fail_tracker = TwapTracker(fail_amm, slot)
+        self.end_slot = end_slot
+        self.pass_threshold_bps = pass_threshold_bps
+
+    @classmethod
+    def from_proposal(cls, proposal: Proposal, dao: Dao, pass_amm: Amm, fail_amm: Amm, slot: int = 0) -> "ProposalTwapTracker":
+        return cls(pass_amm, fail_amm, proposal.slot_enqueued + dao.slots_per_proposal, dao.pass_threshold_bps, slot)
+
+    def forecast(self, slot: int) -> TwapForecast:
+        end_slot = max(self.end_slot, slot)
+        projected_pass_twap = self.pass_tracker.project(end_slot)
+        projected_fail_twap = self.fail_tracker.project(end_slot)
+        margin_bps = None
+        passing = None
+        if projected_pass_twap is not None and projected_fail_twap:
+            margin_bps = (projected_pass_twap / projected_fail_twap - 1) * MAX_BPS - self.pass_threshold_bps
+            passing = passes_threshold(projected_pass_twap, projected_fail_twap, self.pass_threshold_bps)
+        return TwapForecast(
+            slot=slot,
+            end_slot=self.end_slot,
+            pass_twap=self.pass_tracker.twap,
+            fail_twap=self.fail_tracker.twap,
+            projected_pass_twap=projected_pass_twap,
+            projected_fail_twap=projected_fail_twap,
+            margin_bps=margin_bps,
+            passing=passing,
+        )
+
+
+class TwapForecaster:
+    # routes a stream of amm updates from many proposals to their trackers
+    def __init__(self):
+        self.proposals: Dict[Pubkey, ProposalTwapTracker] = {}
+        self.trackers: Dict[Pubkey, TwapTracker] = {}
+        self.slot = 0
+
+    def add(self, proposal: Pubkey, pass_amm: Pubkey, fail_amm: Pubkey, tracker: ProposalTwapTracker):
+        self.proposals[proposal] = tracker
+        self.trackers[pass_amm] = tracker.pass_tracker
+        self.trackers[fail_amm] = tracker.fail_tracker
+
+    def remove(self, proposal: Pubkey):
+        tracker = self.proposals.pop(proposal, None)
+        if tracker is None:
+            return
+        self.trackers = {
+            amm: t for amm, t in self.trackers.items()
+            if t is not tracker.pass_tracker and t is not tracker.fail_tracker
+        }
+
+    def on_amm(self, pubkey: Pubkey, slot: int, amm: Amm):
+        tracker = self.trackers.get(pubkey)
+        if tracker is not None:
+            tracker.update(amm, slot)
+        self.slot = max(self.slot, slot)
+
+    def on_slot(self, slot: int):
+        self.slot = max(self.slot, slot)
+
+    def forecast(self, proposal: Pubkey, slot: Optional[int] = None) -> TwapForecast:
+        return self.proposals[proposal].forecast(self.slot if slot is None else slot)
+
+    def forecast_all(self, slot: Optional[int] = None) -> List[Tuple[Pubkey, TwapForecast]]:
+        slot = self.slot if slot is None else slot
+        return [(proposal, tracker.forecast(slot)) for proposal, tracker in self.proposals.items()]
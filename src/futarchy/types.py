@@ -172,4 +172,13 @@ class Proposal:
     pass_lp_tokens_locked: int
     fail_lp_tokens_locked: int
     nonce: int
-    pda_bump: int
\ No newline at end of file
+    pda_bump: int
+
+@dataclass
+class ProposalAccounts:
+    slot: int
+    proposal: Proposal
+    base_vault: ConditionalVault
+    quote_vault: ConditionalVault
+    pass_amm: Amm
+    fail_amm: Amm
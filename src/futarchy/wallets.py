@@ -0,0 +1,196 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+from anchorpy import Wallet
+from solders.instruction import Instruction
+from solders.pubkey import Pubkey
+from solders.transaction_status import TransactionStatus
+from solana.rpc.commitment import Confirmed
+
+from futarchy.client import ProposalClient
+from futarchy.constants import MAX_MULTIPLE_ACCOUNTS
+from futarchy.get_accounts import fetch_proposals_accounts
+from futarchy.keypair import load_keypair
+
+Instructions = Union[Instruction, Iterable[Instruction]]
+
+
+@dataclass
+class WalletState:
+    client: ProposalClient
+    # held from building to sending, so one wallet's transactions go out in order
+    lock: asyncio.Lock
+    in_flight: asyncio.Semaphore
+    sent: int = 0
+    confirmed: int = 0
+    failed: int = 0
+
+    @property
+    def pending(self) -> int:
+        return self.sent - self.confirmed - self.failed
+
+
+class WalletEngine:
+    def __init__(
+        self,
+        client: ProposalClient,
+        wallets: Iterable[Wallet] = (),
+        max_in_flight_per_wallet: int = 4,
+    ):
+        # the client holds the shared state, its wallet only has to pay for
+        # the lookup table when one is set up
+        self.client = client
+        self.max_in_flight_per_wallet = max_in_flight_per_wallet
+        self.wallets: Dict[Pubkey, WalletState] = {}
+        for wallet in wallets:
+            self.add_wallet(wallet)
+
+    @classmethod
+    def from_private_keys(
+        cls,
+        client: ProposalClient,
+        private_keys: Iterable[str],
+        max_in_flight_per_wallet: int = 4,
+    ) -> "WalletEngine":
+        wallets = [Wallet(load_keypair(private_key)) for private_key in private_keys]
+        return cls(client, wallets, max_in_flight_per_wallet)
+
+    def add_wallet(self, wallet: Wallet) -> ProposalClient:
+        if wallet.public_key not in self.wallets:
+            self.wallets[wallet.public_key] = WalletState(
+                self.client.for_wallet(wallet),
+                asyncio.Lock(),
+                asyncio.Semaphore(self.max_in_flight_per_wallet),
+            )
+        return self.wallets[wallet.public_key].client
+
+    def remove_wallet(self, wallet: Pubkey):
+        self.wallets.pop(wallet, None)
+
+    def __getitem__(self, wallet: Pubkey) -> ProposalClient:
+        return self.wallets[wallet].client
+
+    def __iter__(self) -> Iterator[ProposalClient]:
+        return iter(state.client for state in self.wallets.values())
+
+    def __len__(self) -> int:
+        return len(self.wallets)
+
+    async def start(self, ws_url: Optional[str] = None, priority_fees: bool = False):
+        # started on the shared client before the wallets are used, so none
+        # of them starts its own. Without priority_fees, sending with
+        # compute_unit_price=None starts an oracle per wallet
+        client = self.client
+        if not hasattr(client, "proposal_account"):
+            await self.get_proposal_info()
+        if client.blockhash_manager is None:
+            client.start_blockhash_manager()
+        if client.confirmation_tracker is None:
+            client.start_confirmation_tracker()
+        if client.amm_cache is None and ws_url is not None:
+            client.start_amm_cache(ws_url)
+        if client.priority_fee_oracle is None and priority_fees:
+            await client.start_priority_fee_oracle()
+        self._share_services()
+
+    async def stop(self):
+        client = self.client
+        if client.confirmation_tracker is not None:
+            await client.confirmation_tracker.stop()
+        if client.blockhash_manager is not None:
+            await client.blockhash_manager.stop()
+        if client.amm_cache is not None:
+            await client.amm_cache.stop()
+        if client.priority_fee_oracle is not None:
+            await client.priority_fee_oracle.stop()
+
+    def _share_services(self):
+        client = self.client
+        for state in self.wallets.values():
+            state.client.amm_cache = client.amm_cache
+            state.client.blockhash_manager = client.blockhash_manager
+            state.client.confirmation_tracker = client.confirmation_tracker
+            state.client.priority_fee_oracle = client.priority_fee_oracle
+            state.client.lookup_table_manager = client.lookup_table_manager
+            state.client.address_lookup_tables = client.address_lookup_tables
+
+    async def get_proposal_info(self):
+        # one fetch for every wallet
+        accounts = (await fetch_proposals_accounts(self.client.connection, [self.client.proposal]))[0]
+        self.client.set_proposal_info(accounts)
+        for state in self.wallets.values():
+            state.client.set_proposal_info(accounts)
+
+    async def get_create_token_accounts_ixs(self) -> Dict[Pubkey, List[Instruction]]:
+        # every wallet's token accounts are checked with getMultipleAccounts
+        # instead of a request per wallet
+        wallets = list(self.wallets)
+        account_mints = [self.wallets[wallet].client.get_token_account_mints() for wallet in wallets]
+        accounts = [account for mints in account_mints for account, _ in mints]
+        responses = await asyncio.gather(*[
+            self.client.connection.get_multiple_accounts_json_parsed(
+                accounts[i:i + MAX_MULTIPLE_ACCOUNTS],
+                commitment=Confirmed
+            )
+            for i in range(0, len(accounts), MAX_MULTIPLE_ACCOUNTS)
+        ])
+        statuses = [status for resp in responses for status in resp.value]
+        ixs = {}
+        offset = 0
+        for wallet, mints in zip(wallets, account_mints):
+            client = self.wallets[wallet].client
+            wallet_ixs = client.get_missing_token_accounts_ixs(mints, statuses[offset:offset + len(mints)])
+            offset += len(mints)
+            if wallet_ixs:
+                ixs[wallet] = wallet_ixs
+        return ixs
+
+    async def create_token_accounts(self) -> Dict[Pubkey, TransactionStatus]:
+        ixs = await self.get_create_token_accounts_ixs()
+        results = await self.send_many(list(ixs.items()), compute_unit_limit=None)
+        return dict(zip(ixs, results))
+
+    async def send(
+        self,
+        wallet: Pubkey,
+        ix: Instructions,
+        **kwargs
+    ) -> "asyncio.Future[TransactionStatus]":
+        # returns once the transaction is sent, the future resolves on confirmation.
+        # kwargs are passed to send_ix_tracked
+        state = self.wallets[wallet]
+        await state.in_flight.acquire()
+        try:
+            async with state.lock:
+                future = await state.client.send_ix_tracked(ix, **kwargs)
+        except BaseException:
+            state.in_flight.release()
+            raise
+        state.sent += 1
+        future.add_done_callback(lambda f: self._on_done(state, f))
+        return future
+
+    def _on_done(self, state: WalletState, future: asyncio.Future):
+        state.in_flight.release()
+        if future.cancelled() or future.exception() is not None:
+            state.failed += 1
+        else:
+            state.confirmed += 1
+
+    async def send_and_confirm(self, wallet: Pubkey, ix: Instructions, **kwargs) -> TransactionStatus:
+        return await (await self.send(wallet, ix, **kwargs))
+
+    async def send_many(
+        self,
+        orders: Sequence[Tuple[Pubkey, Instructions]],
+        **kwargs
+    ) -> List[Union[TransactionStatus, BaseException]]:
+        # orders of different wallets run concurrently, a wallet's own orders
+        # are sent in the order given
+        return await asyncio.gather(
+            *[self.send_and_confirm(wallet, ix, **kwargs) for wallet, ix in orders],
+            return_exceptions=True
+        )
+
+    def get_in_flight(self) -> Dict[Pubkey, int]:
+        return {wallet: state.pending for wallet, state in self.wallets.items()}
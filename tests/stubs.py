@@ -0,0 +1,131 @@
+import asyncio
+import base64
+import inspect
+import json
+import time
+from typing import Callable, Dict, Optional
+
+import websockets
+from solana.rpc.async_api import AsyncClient
+from solana.rpc.providers.core import _parse_raw
+
+
+class StubError(Exception):
+    # raised by a handler to answer with a json-rpc error
+    def __init__(self, code: int = -32000, message: str = "stub error"):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+class StubProvider:
+    # stands in for the http provider of an AsyncClient and answers every
+    # request from a handler by method name, handlers get the request params
+    # and may be coroutine functions
+    def __init__(self, handlers: Dict[str, Callable[[list], object]]):
+        self.handlers = handlers
+        self.requests = []
+
+    def count(self, method: str) -> int:
+        return sum(request["method"] == method for request in self.requests)
+
+    async def make_request_unparsed(self, body) -> str:
+        request = json.loads(body.to_json())
+        self.requests.append(request)
+        try:
+            result = self.handlers[request["method"]](request.get("params"))
+            if inspect.isawaitable(result):
+                result = await result
+        except StubError as e:
+            return json.dumps({"jsonrpc": "2.0", "id": request["id"], "error": {"code": e.code, "message": e.message}})
+        return json.dumps({"jsonrpc": "2.0", "id": request["id"], "result": result})
+
+    async def make_request(self, body, parser):
+        return _parse_raw(await self.make_request_unparsed(body), parser=parser)
+
+    async def close(self):
+        pass
+
+
+def stub_client(handlers: Dict[str, Callable[[list], object]]) -> AsyncClient:
+    client = AsyncClient("http://stub")
+    client._provider = StubProvider(handlers)
+    return client
+
+
+def account_json(data: Optional[bytes], owner: str = "11111111111111111111111111111111", lamports: int = 1) -> Optional[dict]:
+    if data is None:
+        return None
+    return {
+        "data": [base64.b64encode(data).decode(), "base64"],
+        "executable": False,
+        "lamports": lamports,
+        "owner": owner,
+        "rentEpoch": 0,
+        "space": len(data),
+    }
+
+
+def context(slot: int = 1, value=None) -> dict:
+    return {"context": {"slot": slot}, "value": value}
+
+
+class WsStub:
+    # a local websocket rpc that accepts accountSubscribe and slotSubscribe and
+    # pushes notifications on demand
+    def __init__(self):
+        self.subscriptions = {}
+        self.connects = 0
+        self._next_id = 0
+        self._server = None
+        self.url = None
+
+    async def start(self) -> "WsStub":
+        self._server = await websockets.serve(self._handler, "127.0.0.1", 0)
+        self.url = "ws://127.0.0.1:%d" % self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def close(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handler(self, websocket):
+        self.connects += 1
+        try:
+            async for raw in websocket:
+                request = json.loads(raw)
+                self._next_id += 1
+                params = request.get("params") or [None]
+                self.subscriptions[self._next_id] = (request["method"], params[0], websocket)
+                await websocket.send(json.dumps({"jsonrpc": "2.0", "id": request["id"], "result": self._next_id}))
+        finally:
+            for key, (_, _, subscribed) in list(self.subscriptions.items()):
+                if subscribed is websocket:
+                    del self.subscriptions[key]
+
+    async def _notify(self, method: str, param, notification: str, result: dict):
+        for key, (subscribed_method, subscribed_param, websocket) in list(self.subscriptions.items()):
+            if subscribed_method == method and subscribed_param == param:
+                await websocket.send(json.dumps({
+                    "jsonrpc": "2.0",
+                    "method": notification,
+                    "params": {"result": result, "subscription": key},
+                }))
+
+    async def push_account(self, pubkey, slot: int, data: bytes):
+        await self._notify("accountSubscribe", str(pubkey), "accountNotification", context(slot, account_json(data)))
+
+    async def push_slot(self, slot: int):
+        await self._notify("slotSubscribe", None, "slotNotification", {"parent": slot - 1, "root": max(slot - 32, 0), "slot": slot})
+
+    async def disconnect(self):
+        for _, _, websocket in list(self.subscriptions.values()):
+            await websocket.close()
+
+
+async def wait_until(condition: Callable[[], bool], timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError("condition not met")
+        await asyncio.sleep(0.005)
@@ -0,0 +1,110 @@
+import asyncio
+import functools
+from dataclasses import replace
+from types import SimpleNamespace
+
+import pytest
+
+from futarchy import amm_cache as amm_cache_module
+from futarchy.amm_cache import AmmCache
+from futarchy.constants import AMM_PROGRAM_ID
+from futarchy.simulator import MarketSimulator
+from stubs import WsStub, account_json, context, stub_client, wait_until
+
+
+class Chain:
+    # the rpc view of one amm, get_multiple_accounts records what the cache
+    # held when the refetch was made
+    def __init__(self):
+        self.sim = MarketSimulator(seed=0)
+        self.amm = self.sim.proposals[self.sim.create_proposal()].pass_amm
+        self.slot = 5
+        self.data = self.amm_data(100)
+        self.cache = None
+        self.held_at_refetch = []
+
+    def amm_data(self, base_amount: int) -> bytes:
+        self.sim.amms[self.amm] = replace(self.sim.amms[self.amm], base_amount=base_amount)
+        return self.sim.get_account(self.amm).data
+
+    def handlers(self) -> dict:
+        return {
+            "getAccountInfo": lambda params: context(self.slot, account_json(self.data, str(AMM_PROGRAM_ID))),
+            "getMultipleAccounts": self.get_multiple_accounts,
+        }
+
+    def get_multiple_accounts(self, params):
+        self.held_at_refetch.append(self.cache.amms[self.amm])
+        return context(self.slot, [account_json(self.data, str(AMM_PROGRAM_ID))])
+
+
+@pytest.fixture
+async def setup(monkeypatch):
+    monkeypatch.setattr(
+        amm_cache_module,
+        "subscribe_accounts",
+        functools.partial(amm_cache_module.subscribe_accounts, reconnect_delay=0.01),
+    )
+    ws = await WsStub().start()
+    chain = Chain()
+    connection = stub_client(chain.handlers())
+    program = SimpleNamespace(provider=SimpleNamespace(connection=connection))
+    chain.cache = AmmCache(program, ws.url, [chain.amm], max_lag=0.2)
+    yield ws, chain, chain.cache, connection._provider
+    await chain.cache.stop()
+    await ws.close()
+
+
+async def connected(ws: WsStub, cache: AmmCache, amm):
+    cache.start()
+    # subscribed to the amm and slots, and the initial refetch landed
+    await wait_until(lambda: len(ws.subscriptions) == 2 and cache.amms[amm] is not None)
+
+
+async def test_updates_are_ordered_by_slot(setup):
+    ws, chain, cache, _ = setup
+    updates = []
+    cache.listeners.append(lambda pubkey, slot, amm: updates.append((slot, amm.base_amount)))
+    await connected(ws, cache, chain.amm)
+    await ws.push_account(chain.amm, 12, chain.amm_data(200))
+    await ws.push_account(chain.amm, 11, chain.amm_data(300))
+    await ws.push_account(chain.amm, 13, chain.amm_data(400))
+    await wait_until(lambda: cache.amms[chain.amm].slot == 13)
+    assert updates == [(5, 100), (12, 200), (13, 400)]
+
+
+async def test_stale_cache_reads_over_rpc(setup):
+    ws, chain, cache, provider = setup
+    await connected(ws, cache, chain.amm)
+    # no slot notification yet
+    assert cache.is_stale and cache.get(chain.amm) is None
+    await cache.get_amm(chain.amm)
+    assert provider.count("getAccountInfo") == 1
+
+    await ws.push_slot(6)
+    await wait_until(lambda: not cache.is_stale)
+    assert (await cache.get_amm(chain.amm)).base_amount == 100
+    assert provider.count("getAccountInfo") == 1
+
+    await asyncio.sleep(0.25)
+    assert cache.is_stale
+    await cache.get_amm(chain.amm)
+    assert provider.count("getAccountInfo") == 2
+
+
+async def test_reconnect_refetches(setup):
+    ws, chain, cache, provider = setup
+    await connected(ws, cache, chain.amm)
+    await ws.push_account(chain.amm, 12, chain.amm_data(200))
+    await wait_until(lambda: cache.amms[chain.amm].slot == 12)
+
+    # the amm changes while disconnected, which is never notified
+    chain.slot = 20
+    chain.data = chain.amm_data(500)
+    await ws.disconnect()
+    await wait_until(lambda: provider.count("getMultipleAccounts") == 2 and cache.amms[chain.amm] is not None)
+    assert ws.connects == 2
+    # the pre-disconnect state was dropped before the refetch was made
+    assert chain.held_at_refetch == [None, None]
+    assert cache.amms[chain.amm].slot == 20
+    assert cache.amms[chain.amm].data.base_amount == 500
@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+from solders.hash import Hash
+
+from futarchy.blockhash import BlockhashManager
+from stubs import StubError, context, stub_client
+
+
+class Chain:
+    # getLatestBlockhash answers with the current blockhash, once the gate is
+    # open, or fails while failing is set
+    def __init__(self):
+        self.blockhash = Hash.new_unique()
+        self.block_height = 1000
+        self.gate = asyncio.Event()
+        self.gate.set()
+        self.failing = False
+
+    def handlers(self) -> dict:
+        return {
+            "getLatestBlockhash": self.get_latest_blockhash,
+            "getBlockHeight": lambda params: self.block_height,
+        }
+
+    async def get_latest_blockhash(self, params):
+        await self.gate.wait()
+        if self.failing:
+            raise StubError(message="node is behind")
+        value = {"blockhash": str(self.blockhash), "lastValidBlockHeight": self.block_height + 150}
+        return context(value=value)
+
+
+@pytest.fixture
+def setup():
+    chain = Chain()
+    connection = stub_client(chain.handlers())
+    return chain, BlockhashManager(connection), connection._provider
+
+
+async def test_refresh(setup):
+    chain, manager, _ = setup
+    latest = await manager.refresh()
+    assert latest.blockhash == chain.blockhash
+    assert latest.last_valid_block_height == 1150
+    assert manager.block_height == 1000
+    assert manager.get_blockhash_nowait() == latest
+
+
+async def test_concurrent_refreshes_share_one_request(setup):
+    chain, manager, provider = setup
+    chain.gate.clear()
+    refreshes = [asyncio.create_task(manager.refresh()) for _ in range(5)]
+    await asyncio.sleep(0)
+    chain.gate.set()
+    results = await asyncio.gather(*refreshes)
+    assert provider.count("getLatestBlockhash") == 1
+    assert all(result.blockhash == chain.blockhash for result in results)
+    # the next refresh makes a new request
+    await manager.refresh()
+    assert provider.count("getLatestBlockhash") == 2
+
+
+async def test_cancelled_refresh_is_not_reused(setup):
+    chain, manager, provider = setup
+    chain.gate.clear()
+    waiter = asyncio.create_task(manager.refresh())
+    await asyncio.sleep(0)
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    # the shared refresh still finishes with the old blockhash
+    old = chain.blockhash
+    chain.gate.set()
+    await asyncio.sleep(0.01)
+    assert manager.latest.blockhash == old
+
+    chain.blockhash = Hash.new_unique()
+    assert (await manager.refresh()).blockhash == chain.blockhash
+    assert provider.count("getLatestBlockhash") == 2
+
+
+async def test_cancelled_failed_refresh_is_not_reraised(setup):
+    chain, manager, _ = setup
+    chain.gate.clear()
+    chain.failing = True
+    waiter = asyncio.create_task(manager.refresh())
+    await asyncio.sleep(0)
+    waiter.cancel()
+    chain.gate.set()
+    await asyncio.sleep(0.01)
+
+    chain.failing = False
+    assert (await manager.refresh()).blockhash == chain.blockhash
+    # and a failure of its own still reaches its caller
+    chain.failing = True
+    with pytest.raises(Exception):
+        await manager.refresh()
+
+
+async def test_get_blockhash_refreshes_when_expired(setup):
+    chain, manager, provider = setup
+    first = await manager.get_blockhash()
+    assert await manager.get_blockhash() == first
+    assert provider.count("getLatestBlockhash") == 1
+    # the chain moved past the hash's validity
+    manager.block_height += 150
+    chain.blockhash = Hash.new_unique()
+    assert (await manager.get_blockhash()).blockhash == chain.blockhash
+    assert provider.count("getLatestBlockhash") == 2
@@ -0,0 +1,55 @@
+from types import SimpleNamespace
+
+from solders.instruction import Instruction
+from solders.transaction_status import InstructionErrorFieldless, TransactionErrorInstructionError
+
+from futarchy.client import ProposalClient
+from futarchy.compute_units import SWAP_DISCRIMINATOR, ComputeUnitEstimator, is_compute_budget_exceeded
+from futarchy.confirmation import TransactionFailedError
+from futarchy.constants import AMM_PROGRAM_ID, CONDITIONAL_VAULT_PROGRAM_ID
+from futarchy.instructions import instruction_discriminator
+
+MINT = Instruction(CONDITIONAL_VAULT_PROGRAM_ID, instruction_discriminator("mint_conditional_tokens"), [])
+BUY = Instruction(AMM_PROGRAM_ID, SWAP_DISCRIMINATOR + b"\x00", [])
+
+BUDGET_EXCEEDED = TransactionErrorInstructionError(2, InstructionErrorFieldless.ComputationalBudgetExceeded)
+
+
+def test_sole_unknown_type_gets_the_unexplained_units():
+    estimator = ComputeUnitEstimator(margin=0)
+    estimator.record([MINT], 30_000)
+    estimator.record([MINT, BUY], 100_000)
+    assert estimator.get_limit([BUY]) == 70_000
+    assert estimator.get_limit([MINT, BUY, BUY]) == 170_000
+
+
+def test_several_unknown_types_are_cached_as_a_whole():
+    # splitting 100k evenly would put the swap at 50k and under-size it
+    estimator = ComputeUnitEstimator(margin=0)
+    estimator.record([MINT, BUY], 100_000)
+    assert estimator.get_limit([MINT]) is None
+    assert estimator.get_limit([BUY]) is None
+    assert estimator.get_limit([BUY, MINT]) == 100_000
+    assert estimator.get_limit([MINT, BUY, BUY]) is None
+
+
+def test_evict_drops_types_and_transactions():
+    estimator = ComputeUnitEstimator(margin=0)
+    estimator.record([MINT, BUY], 100_000)
+    estimator.record([MINT], 30_000)
+    estimator.evict([BUY])
+    assert estimator.get_limit([MINT]) == 30_000
+    assert estimator.get_limit([MINT, BUY]) is None
+
+
+def test_budget_exceeded_failure_evicts():
+    estimator = ComputeUnitEstimator(margin=0)
+    estimator.record([BUY], 40_000)
+    client = SimpleNamespace(compute_unit_estimator=estimator)
+
+    ProposalClient.evict_if_budget_exceeded(client, [BUY], TransactionFailedError(None, "other"))
+    assert estimator.get_limit([BUY]) == 40_000
+
+    assert is_compute_budget_exceeded(BUDGET_EXCEEDED)
+    ProposalClient.evict_if_budget_exceeded(client, [BUY], TransactionFailedError(None, BUDGET_EXCEEDED))
+    assert estimator.get_limit([BUY]) is None
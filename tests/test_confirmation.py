@@ -0,0 +1,90 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from solders.hash import Hash
+from solders.keypair import Keypair
+from solders.message import MessageV0
+from solders.transaction import VersionedTransaction
+from solders.transaction_status import TransactionConfirmationStatus, TransactionStatus
+
+from futarchy.confirmation import ConfirmationTracker, TransactionExpiredError
+
+
+class FakeConnection:
+    def __init__(self, block_height: int):
+        self.block_height = block_height
+        # statuses only found when searching the history
+        self.history = {}
+        self.block_height_requests = 0
+
+    async def get_signature_statuses(self, signatures, search_transaction_history=False):
+        if not search_transaction_history:
+            return SimpleNamespace(value=[None] * len(signatures))
+        return SimpleNamespace(value=[self.history.get(signature) for signature in signatures])
+
+    async def get_block_height(self, commitment=None):
+        self.block_height_requests += 1
+        return SimpleNamespace(value=self.block_height)
+
+    async def send_raw_transaction(self, txn, opts=None):
+        pass
+
+
+class FakeBlockhashManager:
+    def __init__(self, estimate: int):
+        self.estimate = estimate
+        self.block_height_time = 1.0
+
+    def estimated_block_height(self) -> int:
+        return self.estimate
+
+
+def make_tx() -> VersionedTransaction:
+    payer = Keypair()
+    return VersionedTransaction(MessageV0.try_compile(payer.pubkey(), [], [], Hash.default()), [payer])
+
+
+def confirmed_status(slot: int) -> TransactionStatus:
+    return TransactionStatus(slot, None, None, None, TransactionConfirmationStatus.Confirmed)
+
+
+async def test_estimate_ahead_of_real_height_doesnt_expire():
+    # skipped slots put the estimate past the deadline, the chain isn't there yet
+    connection = FakeConnection(block_height=100)
+    tracker = ConfirmationTracker(connection, blockhash_manager=FakeBlockhashManager(200))
+    future = tracker.track(make_tx(), last_valid_block_height=150)
+    await tracker.poll()
+    assert not future.done()
+    assert connection.block_height_requests == 1
+    await tracker.stop()
+
+
+async def test_estimate_behind_deadline_skips_block_height_request():
+    connection = FakeConnection(block_height=100)
+    tracker = ConfirmationTracker(connection, blockhash_manager=FakeBlockhashManager(120))
+    tracker.track(make_tx(), last_valid_block_height=150)
+    await tracker.poll()
+    assert connection.block_height_requests == 0
+    await tracker.stop()
+
+
+async def test_landed_after_poll_resolves_instead_of_expiring():
+    connection = FakeConnection(block_height=200)
+    tracker = ConfirmationTracker(connection)
+    tx = make_tx()
+    future = tracker.track(tx, last_valid_block_height=150)
+    connection.history[tx.signatures[0]] = confirmed_status(42)
+    await tracker.poll()
+    assert (await future).slot == 42
+    await tracker.stop()
+
+
+async def test_missing_past_deadline_expires():
+    connection = FakeConnection(block_height=200)
+    tracker = ConfirmationTracker(connection)
+    future = tracker.track(make_tx(), last_valid_block_height=150)
+    await tracker.poll()
+    with pytest.raises(TransactionExpiredError):
+        await asyncio.wait_for(future, 1)
+    await tracker.stop()
@@ -0,0 +1,120 @@
+from dataclasses import fields, is_dataclass
+
+import pytest
+from anchorpy.program.common import NamedInstruction
+from hypothesis import given, strategies as st
+from solders.pubkey import Pubkey
+
+from futarchy.decoders import (
+    AmmView,
+    ConditionalVaultView,
+    decode_amm,
+    decode_conditional_vault,
+    decode_dao,
+    decode_proposal,
+)
+from futarchy.simulator import MarketSimulator, _to_container
+from futarchy.types import (
+    Amm,
+    ConditionalVault,
+    Dao,
+    Proposal,
+    ProposalAccount,
+    ProposalInstruction,
+    ProposalState,
+    TwapOracle,
+    VaultStatus,
+)
+
+u8 = st.integers(min_value=0, max_value=2 ** 8 - 1)
+u16 = st.integers(min_value=0, max_value=2 ** 16 - 1)
+u32 = st.integers(min_value=0, max_value=2 ** 32 - 1)
+u64 = st.integers(min_value=0, max_value=2 ** 64 - 1)
+u128 = st.integers(min_value=0, max_value=2 ** 128 - 1)
+pubkeys = st.binary(min_size=32, max_size=32).map(Pubkey.from_bytes)
+
+twap_oracles = st.builds(TwapOracle, u64, u128, u128, u128, u128, u128)
+amms = st.builds(Amm, u8, u64, pubkeys, pubkeys, pubkeys, u8, u8, u64, u64, twap_oracles)
+vault_statuses = st.sampled_from([VaultStatus.Active, VaultStatus.Finalized, VaultStatus.Reverted]).map(lambda variant: variant())
+conditional_vaults = st.builds(ConditionalVault, vault_statuses, pubkeys, pubkeys, pubkeys, pubkeys, pubkeys, u8, u8)
+daos = st.builds(Dao, u8, pubkeys, pubkeys, pubkeys, u32, u16, u64, u128, u128, u64, u64)
+proposal_states = st.sampled_from([
+    ProposalState.Pending, ProposalState.Passed, ProposalState.Failed, ProposalState.Executed,
+]).map(lambda variant: variant())
+proposal_instructions = st.builds(
+    ProposalInstruction,
+    pubkeys,
+    st.lists(st.builds(ProposalAccount, pubkeys, st.booleans(), st.booleans()), max_size=8),
+    st.binary(max_size=64),
+)
+proposals = st.builds(
+    Proposal, u32, pubkeys, st.text(max_size=40), u64, proposal_states, proposal_instructions,
+    pubkeys, pubkeys, pubkeys, pubkeys, pubkeys, u64, u64, u64, u8,
+)
+
+
+@pytest.fixture(scope="module")
+def programs():
+    return MarketSimulator().programs
+
+
+def encode(program, name: str, value) -> bytes:
+    return program.coder.accounts.build(NamedInstruction(data=_to_container(value, program), name=name))
+
+
+def assert_same(decoded, reference, path: str):
+    # the struct decoder's value against the anchorpy coder's, field by field
+    if is_dataclass(decoded):
+        for f in fields(decoded):
+            assert_same(getattr(decoded, f.name), getattr(reference, f.name), f"{path}.{f.name}")
+    elif hasattr(decoded, "_sumtype_constructor_names"):
+        assert type(decoded).__name__ == type(reference).__name__, path
+    elif isinstance(decoded, list):
+        assert len(decoded) == len(reference), path
+        for i, (item, reference_item) in enumerate(zip(decoded, reference)):
+            assert_same(item, reference_item, f"{path}[{i}]")
+    else:
+        assert decoded == reference, path
+
+
+@given(amm=amms)
+def test_amm_matches_idl_coder(programs, amm):
+    data = encode(programs.amm, "Amm", amm)
+    decoded = decode_amm(data)
+    assert decoded == amm
+    assert_same(decoded, programs.amm.coder.accounts.decode(data), "Amm")
+    view = AmmView(data)
+    assert_same(decoded, view, "AmmView")
+    assert view.to_amm() == amm
+
+
+@given(vault=conditional_vaults)
+def test_conditional_vault_matches_idl_coder(programs, vault):
+    data = encode(programs.vault, "ConditionalVault", vault)
+    decoded = decode_conditional_vault(data)
+    assert_same(decoded, vault, "ConditionalVault")
+    assert_same(decoded, programs.vault.coder.accounts.decode(data), "ConditionalVault")
+    assert_same(decoded, ConditionalVaultView(data), "ConditionalVaultView")
+
+
+@given(dao=daos)
+def test_dao_matches_idl_coder(programs, dao):
+    data = encode(programs.autocrat, "Dao", dao)
+    decoded = decode_dao(data)
+    assert decoded == dao
+    assert_same(decoded, programs.autocrat.coder.accounts.decode(data), "Dao")
+
+
+@given(proposal=proposals)
+def test_proposal_matches_idl_coder(programs, proposal):
+    data = encode(programs.autocrat, "Proposal", proposal)
+    decoded = decode_proposal(data)
+    assert_same(decoded, proposal, "Proposal")
+    assert_same(decoded, programs.autocrat.coder.accounts.decode(data), "Proposal")
+
+
+def test_wrong_discriminator_raises(programs):
+    dao = Dao(0, Pubkey.default(), Pubkey.default(), Pubkey.default(), 0, 0, 0, 0, 0, 0, 0)
+    data = encode(programs.autocrat, "Dao", dao)
+    with pytest.raises(ValueError):
+        decode_amm(data)
@@ -0,0 +1,138 @@
+import asyncio
+from dataclasses import replace
+
+from solders.pubkey import Pubkey
+
+from futarchy.constants import AUTOCRAT_PROGRAM_ID
+from futarchy.discovery import ProposalDiscovery, ProposalIndex
+from futarchy.simulator import MarketSimulator
+from futarchy.types import DataAndSlot, ProposalState
+from stubs import account_json, stub_client
+
+
+def make_proposals():
+    # two daos, proposals enqueued at consecutive slots, the last one passed
+    sim = MarketSimulator(seed=0)
+    daos = [sim.create_dao(), sim.create_dao()]
+    proposals = []
+    for dao in (daos[0], daos[1], daos[0]):
+        proposals.append(sim.create_proposal(dao))
+        sim.advance()
+    sim.proposals[proposals[2]] = replace(sim.proposals[proposals[2]], state=ProposalState.Passed())
+    return sim, daos, proposals
+
+
+class Chain:
+    # canned getProgramAccounts answers, the accounts can change between scans
+    def __init__(self, sim: MarketSimulator, proposals, slot: int = 10):
+        self.accounts = {pubkey: sim.get_account(pubkey).data for pubkey in proposals}
+        self.slot = slot
+        self.filters = None
+
+    def handlers(self) -> dict:
+        return {"getSlot": self.get_slot, "getProgramAccounts": self.get_program_accounts}
+
+    def get_slot(self, params):
+        return self.slot
+
+    def get_program_accounts(self, params):
+        assert params[0] == str(AUTOCRAT_PROGRAM_ID)
+        self.filters = params[1]["filters"]
+        return [
+            {"pubkey": str(pubkey), "account": account_json(data, str(AUTOCRAT_PROGRAM_ID))}
+            for pubkey, data in self.accounts.items()
+        ]
+
+
+def test_index_filters():
+    sim, daos, proposals = make_proposals()
+    index = ProposalIndex()
+    for pubkey in proposals:
+        assert index.update(pubkey, DataAndSlot(5, sim.proposals[pubkey]))
+    assert len(index) == 3
+    assert index.find() == proposals
+    assert index.find(dao=daos[0]) == [proposals[0], proposals[2]]
+    assert index.find(dao=Pubkey.new_unique()) == []
+    assert index.find(state=ProposalState.Pending()) == proposals[:2]
+    assert index.find(dao=daos[0], state=ProposalState.Pending()) == [proposals[0]]
+    second = sim.proposals[proposals[1]].slot_enqueued
+    assert index.find(min_slot_enqueued=second) == proposals[1:]
+    assert index.find(max_slot_enqueued=second) == proposals[:2]
+    assert index.find(min_slot_enqueued=second, max_slot_enqueued=second) == [proposals[1]]
+
+
+def test_index_update_reindexes_and_ignores_older_slots():
+    sim, daos, proposals = make_proposals()
+    index = ProposalIndex()
+    pubkey = proposals[0]
+    pending = sim.proposals[pubkey]
+    failed = replace(pending, state=ProposalState.Failed())
+    index.update(pubkey, DataAndSlot(5, pending))
+    assert not index.update(pubkey, DataAndSlot(4, failed))
+    assert index.find(state=ProposalState.Pending()) == [pubkey]
+    assert index.update(pubkey, DataAndSlot(6, failed))
+    assert index.find(state=ProposalState.Pending()) == []
+    assert index.find(state=ProposalState.Failed()) == [pubkey]
+    assert index.find() == [pubkey]
+    index.remove(pubkey)
+    assert pubkey not in index
+    assert index.find() == [] and index.find(dao=daos[0]) == []
+
+
+async def test_start_without_ws_url_scans():
+    sim, daos, proposals = make_proposals()
+    chain = Chain(sim, proposals)
+    discovery = ProposalDiscovery(stub_client(chain.handlers()))
+    updates = []
+    discovery.listeners.append(lambda pubkey, slot, proposal: updates.append((pubkey, slot)))
+    discovery.start()
+    await discovery._scan_task
+    assert chain.filters is not None
+    assert discovery.find() == proposals
+    assert sorted(updates) == sorted((pubkey, 10) for pubkey in proposals)
+    await discovery.stop()
+
+
+async def test_dao_filter():
+    sim, daos, proposals = make_proposals()
+    chain = Chain(sim, proposals)
+    discovery = ProposalDiscovery(stub_client(chain.handlers()), dao=daos[1])
+    await discovery.scan()
+    assert discovery.find() == [proposals[1]]
+
+
+async def test_rescan_applies_changes():
+    sim, daos, proposals = make_proposals()
+    chain = Chain(sim, proposals)
+    discovery = ProposalDiscovery(stub_client(chain.handlers()))
+    await discovery.scan()
+
+    # one proposal is closed, one fails, and a subscription update newer
+    # than the next scan is kept even though the scan doesn't see it
+    del chain.accounts[proposals[0]]
+    sim.proposals[proposals[1]] = replace(sim.proposals[proposals[1]], state=ProposalState.Failed())
+    chain.accounts[proposals[1]] = sim.get_account(proposals[1]).data
+    newer = sim.create_proposal(daos[0])
+    discovery._on_account(newer, 30, sim.get_account(newer).data)
+    chain.slot = 20
+    await discovery.scan()
+    assert proposals[0] not in discovery.index
+    assert discovery.find(state=ProposalState.Failed()) == [proposals[1]]
+    assert newer in discovery.index
+
+
+async def test_closed_account_is_removed():
+    sim, daos, proposals = make_proposals()
+    discovery = ProposalDiscovery(stub_client(Chain(sim, proposals).handlers()))
+    await discovery.scan()
+    discovery._on_account(proposals[0], 11, bytes(8))
+    assert discovery.find() == proposals[1:]
+
+
+async def test_stop_cancels_scan():
+    sim, daos, proposals = make_proposals()
+    discovery = ProposalDiscovery(stub_client(Chain(sim, proposals).handlers()))
+    discovery.start()
+    await discovery.stop()
+    await asyncio.sleep(0)
+    assert discovery._scan_task is None
@@ -0,0 +1,98 @@
+import json
+from pathlib import Path
+
+import pytest
+from solders.pubkey import Pubkey
+from solders.rpc.responses import GetSignaturesForAddressResp, GetTransactionResp
+from solders.signature import Signature
+
+from futarchy.history import SwapIngestor, SwapLog, decode_swaps
+from futarchy.simulator import MarketSimulator
+
+FIXTURE = Path(__file__).parent / "fixtures" / "swap_transaction.json"
+
+AMM = Pubkey.from_bytes(bytes([1]) * 32)
+USER = "GmaDrppBC7P5ARKV8g3djiwP89vz1jLK23V2GBjuAEGB"
+
+
+@pytest.fixture(scope="module")
+def amm_program():
+    return MarketSimulator().programs.amm
+
+
+def load_transaction():
+    return GetTransactionResp.from_json(FIXTURE.read_text()).value
+
+
+class FakeConnection:
+    # every signature returns the fixture transaction, newest first
+    def __init__(self, count: int):
+        self.signatures = [Signature(bytes([i + 1]) * 64) for i in range(count)]
+        self.fixture = FIXTURE.read_text()
+
+    async def get_signatures_for_address(self, address, before=None, until=None, limit=None, commitment=None):
+        signatures = self.signatures
+        if before is not None:
+            signatures = signatures[signatures.index(before) + 1:]
+        if until is not None and until in signatures:
+            signatures = signatures[:signatures.index(until)]
+        page = [
+            {"signature": str(signature), "slot": 1, "err": None, "memo": None, "blockTime": None}
+            for signature in signatures[:limit]
+        ]
+        return GetSignaturesForAddressResp.from_json(json.dumps({"jsonrpc": "2.0", "id": 1, "result": page}))
+
+    async def get_transaction(self, signature, encoding=None, commitment=None, max_supported_transaction_version=None):
+        return GetTransactionResp.from_json(self.fixture)
+
+
+def test_decode_outer_and_inner_swaps(amm_program):
+    records = decode_swaps(amm_program, load_transaction())
+    assert [(r.instruction_index, r.inner_instruction_index) for r in records] == [(1, None), (2, 0)]
+    buy, sell = records
+    assert buy.slot == 291_234_567
+    assert buy.block_time == 1_727_000_000
+    assert buy.signature == sell.signature
+    assert buy.amm == str(AMM)
+    assert buy.user == USER
+    assert (buy.swap_type, buy.input_amount, buy.output_amount_min) == (0, 2_000_000, 9_000_000_000)
+    assert (sell.swap_type, sell.input_amount, sell.output_amount_min) == (1, 5_000_000_000, 990_000)
+    # reserve deltas cover the whole transaction
+    assert (buy.base_delta, buy.quote_delta) == (-4_940_000_000, 1_005_000)
+
+
+def test_decode_filters_other_amms(amm_program):
+    assert decode_swaps(amm_program, load_transaction(), Pubkey.default()) == []
+
+
+async def test_ingest_writes_every_page(amm_program, tmp_path):
+    ingestor = SwapIngestor(FakeConnection(3), amm_program, SwapLog(tmp_path), [AMM], page_size=1)
+    assert await ingestor.run() == 6
+    assert SwapLog(tmp_path).read().num_rows == 6
+    # nothing new, nothing written
+    ingestor = SwapIngestor(FakeConnection(3), amm_program, SwapLog(tmp_path), [AMM], page_size=1)
+    assert await ingestor.run() == 0
+
+
+async def test_resume_after_crash_doesnt_duplicate(amm_program, tmp_path):
+    log = SwapLog(tmp_path)
+    append = log.append
+    appends = 0
+
+    def crashing_append(records, cursors=None):
+        nonlocal appends
+        append(records, cursors)
+        appends += 1
+        if appends == 2:
+            raise RuntimeError("crash")
+
+    log.append = crashing_append
+    with pytest.raises(RuntimeError):
+        await SwapIngestor(FakeConnection(3), amm_program, log, [AMM], page_size=1).run()
+    assert SwapLog(tmp_path).read().num_rows == 4
+
+    ingestor = SwapIngestor(FakeConnection(3), amm_program, SwapLog(tmp_path), [AMM], page_size=1)
+    assert await ingestor.run() == 2
+    table = SwapLog(tmp_path).read()
+    assert table.num_rows == 6
+    assert table.column("inner_instruction_index").to_pylist() == [None, 0] * 3
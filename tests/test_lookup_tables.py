@@ -0,0 +1,83 @@
+import struct
+
+import pytest
+from anchorpy import Wallet
+from solders.address_lookup_table_account import ID as ADDRESS_LOOKUP_TABLE_PROGRAM_ID, derive_lookup_table_address
+from solders.keypair import Keypair
+from solders.pubkey import Pubkey
+from solders.system_program import ID as SYSTEM_PROGRAM_ID
+
+from futarchy.client import ProposalClient
+from futarchy.lookup_tables import (
+    MAX_EXTEND_ADDRESSES,
+    LookupTableManager,
+    create_lookup_table_ix,
+    extend_lookup_table_ix,
+)
+from stubs import account_json, context, stub_client
+
+AUTHORITY = Pubkey.from_bytes(bytes([1]) * 32)
+PAYER = Pubkey.from_bytes(bytes([2]) * 32)
+TABLE = Pubkey.from_bytes(bytes([3]) * 32)
+
+
+def key(i: int) -> Pubkey:
+    return Pubkey.from_bytes(i.to_bytes(32, "big"))
+
+
+def table_data(addresses) -> bytes:
+    # the on-chain layout: type, deactivation slot, last extended slot and its
+    # start index, the authority option, padding, then the addresses
+    meta = struct.pack("<IQQB", 1, 2 ** 64 - 1, 7, 0) + bytes([1]) + bytes(AUTHORITY) + bytes(2)
+    return meta + b"".join(bytes(address) for address in addresses)
+
+
+def test_create_ix_encoding():
+    ix = create_lookup_table_ix(AUTHORITY, PAYER, 123_456_789)
+    table, bump = derive_lookup_table_address(AUTHORITY, 123_456_789)
+    assert ix.program_id == ADDRESS_LOOKUP_TABLE_PROGRAM_ID
+    # bincode ProgramInstruction::CreateLookupTable { recent_slot, bump_seed }
+    assert ix.data == bytes.fromhex("00000000" "15cd5b0700000000") + bytes([bump])
+    assert [(meta.pubkey, meta.is_signer, meta.is_writable) for meta in ix.accounts] == [
+        (table, False, True),
+        (AUTHORITY, True, False),
+        (PAYER, True, True),
+        (SYSTEM_PROGRAM_ID, False, False),
+    ]
+
+
+def test_extend_ix_encoding():
+    ix = extend_lookup_table_ix(TABLE, AUTHORITY, PAYER, [key(1), key(2)])
+    # bincode ProgramInstruction::ExtendLookupTable { new_addresses: Vec<Pubkey> }
+    assert ix.data == bytes.fromhex("02000000" "0200000000000000") + bytes(key(1)) + bytes(key(2))
+    assert [meta.pubkey for meta in ix.accounts] == [TABLE, AUTHORITY, PAYER, SYSTEM_PROGRAM_ID]
+
+
+async def test_extend_skips_existing_and_chunks():
+    existing = [key(i) for i in range(3)]
+    connection = stub_client({
+        "getAccountInfo": lambda params: context(value=account_json(table_data(existing), str(ADDRESS_LOOKUP_TABLE_PROGRAM_ID))),
+    })
+    manager = LookupTableManager(connection, TABLE)
+    assert (await manager.load()).addresses == existing
+    addresses = existing + [key(i) for i in range(3, 48)] + [key(5)]
+    ixs = manager.get_extend_ixs(AUTHORITY, PAYER, addresses)
+    chunks = [ix.data[12:] for ix in ixs]
+    assert [len(chunk) // 32 for chunk in chunks] == [MAX_EXTEND_ADDRESSES, MAX_EXTEND_ADDRESSES, 5]
+    assert b"".join(chunks) == b"".join(bytes(key(i)) for i in range(3, 48))
+
+
+async def test_load_missing_table_returns_none():
+    connection = stub_client({"getAccountInfo": lambda params: context(value=None)})
+    manager = LookupTableManager(connection, TABLE)
+    assert await manager.load() is None
+    assert manager.get_account() is None
+    assert manager.addresses == []
+
+
+async def test_setup_with_missing_table_raises():
+    connection = stub_client({"getAccountInfo": lambda params: context(value=None)})
+    client = ProposalClient(connection, Wallet(Keypair()), Pubkey.default())
+    with pytest.raises(ValueError, match="not found"):
+        await client.setup_lookup_table(TABLE)
+    assert connection._provider.count("sendTransaction") == 0
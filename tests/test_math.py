@@ -0,0 +1,199 @@
+import pytest
+from hypothesis import assume, given, settings, strategies as st
+from solders.pubkey import Pubkey
+
+from futarchy.math import (
+    FEE_BPS,
+    GRID_ERROR_ULPS,
+    MAX_BPS,
+    MAX_SWAP_INPUT,
+    U64_MAX,
+    apply_slippage,
+    calculate_amm_input_exact,
+    calculate_amm_output_exact,
+    calculate_amm_output_grid,
+    get_output_tokens_buy,
+    get_output_tokens_sell,
+)
+from futarchy.types import Amm
+
+U128_MAX = 2 ** 128 - 1
+# relative error allowed to the float path, it rounds a handful of times in
+# doubles, 2 ** -45 leaves a wide margin over that
+APPROXIMATE_RELATIVE_ERROR = 2.0 ** -45
+
+reserves = st.integers(min_value=1, max_value=2 ** 63)
+amounts = st.integers(min_value=1, max_value=2 ** 62)
+u64s = st.integers(min_value=0, max_value=U64_MAX)
+decimals = st.integers(min_value=0, max_value=18)
+slippages = st.integers(min_value=0, max_value=MAX_BPS)
+
+
+def make_amm(base_amount: int, quote_amount: int, base_decimals: int = 9, quote_decimals: int = 6) -> Amm:
+    # only the reserves and decimals are read by the quotes
+    key = Pubkey.default()
+    return Amm(0, 0, key, key, key, base_decimals, quote_decimals, base_amount, quote_amount, None)
+
+
+def checked(value: int, max_value: int) -> int:
+    if value > max_value:
+        raise OverflowError
+    return value
+
+
+def onchain_output(input_amount: int, input_reserves: int, output_reserves: int) -> int:
+    # the v0.3 amm swap step by step with checked u64 and u128 arithmetic
+    input_amount_minus_fee = checked(input_amount * (MAX_BPS - FEE_BPS), U64_MAX) // MAX_BPS
+    k = checked(input_reserves * output_reserves, U128_MAX)
+    new_input_reserves = checked(input_reserves + input_amount_minus_fee, U64_MAX)
+    new_output_reserves = -(-k // new_input_reserves)
+    # the whole input, fee included, is then added to the reserves
+    checked(input_reserves + input_amount, U64_MAX)
+    return output_reserves - new_output_reserves
+
+
+@given(amounts, reserves, reserves)
+def test_output_matches_onchain(input_amount, input_reserves, output_reserves):
+    try:
+        expected = onchain_output(input_amount, input_reserves, output_reserves)
+    except OverflowError:
+        with pytest.raises(ValueError):
+            calculate_amm_output_exact(input_amount, input_reserves, output_reserves)
+        return
+    assert calculate_amm_output_exact(input_amount, input_reserves, output_reserves) == expected
+
+
+@settings(max_examples=500)
+@given(u64s, u64s, u64s)
+def test_exact_raises_only_where_onchain_fails(input_amount, input_reserves, output_reserves):
+    # over all of u64, the program rejects empty pools and zero swaps too
+    if input_amount == 0 or input_reserves == 0 or output_reserves == 0:
+        with pytest.raises(ValueError):
+            calculate_amm_output_exact(input_amount, input_reserves, output_reserves)
+        return
+    try:
+        expected = onchain_output(input_amount, input_reserves, output_reserves)
+    except OverflowError:
+        with pytest.raises(ValueError):
+            calculate_amm_output_exact(input_amount, input_reserves, output_reserves)
+        return
+    assert calculate_amm_output_exact(input_amount, input_reserves, output_reserves) == expected
+    amm = make_amm(output_reserves, input_reserves)
+    assert get_output_tokens_buy(input_amount, amm, 0) == expected
+    amm = make_amm(input_reserves, output_reserves)
+    assert get_output_tokens_sell(input_amount, amm, 0) == expected
+
+
+def approximate_error_bound(input_amount: int, input_reserves: int, output_reserves: int, exact: int) -> float:
+    # the float path doesn't floor the fee off the input, which is worth up to
+    # the output of one more atom of input, at most output / input reserves,
+    # and rounds neither the output nor the slippage down, an atom each
+    new_input_reserves = input_reserves + input_amount * (MAX_BPS - FEE_BPS) // MAX_BPS
+    return exact * APPROXIMATE_RELATIVE_ERROR + output_reserves / new_input_reserves + 2
+
+
+@settings(max_examples=500)
+@given(u64s, u64s, u64s, decimals, decimals, slippages)
+def test_approximate_within_bound(input_amount, base_amount, quote_amount, base_decimals, quote_decimals, slippage_bps):
+    assume(base_amount > 0 and quote_amount > 0)
+    amm = make_amm(base_amount, quote_amount, base_decimals, quote_decimals)
+    for quote, input_reserves, output_reserves in (
+        (get_output_tokens_buy, quote_amount, base_amount),
+        (get_output_tokens_sell, base_amount, quote_amount),
+    ):
+        try:
+            exact = quote(input_amount, amm, slippage_bps)
+        except ValueError:
+            continue
+        approximate = quote(input_amount, amm, slippage_bps, approximate=True)
+        bound = approximate_error_bound(input_amount, input_reserves, output_reserves, exact)
+        assert abs(approximate - exact) <= bound
+
+
+@given(amounts, reserves, reserves)
+def test_output_never_decreases_k(input_amount, input_reserves, output_reserves):
+    assume(input_amount * (MAX_BPS - FEE_BPS) <= U64_MAX)
+    assume(input_reserves + input_amount <= U64_MAX)
+    output = calculate_amm_output_exact(input_amount, input_reserves, output_reserves)
+    assert 0 <= output < output_reserves
+    k = input_reserves * output_reserves
+    assert (input_reserves + input_amount) * (output_reserves - output) >= k
+
+
+@settings(max_examples=500)
+@given(reserves, reserves, st.floats(min_value=0.0, max_value=0.99))
+def test_input_round_trip(input_reserves, output_reserves, fraction):
+    output_amount = int(output_reserves * fraction)
+    assume(0 < output_amount < output_reserves)
+    try:
+        input_amount = calculate_amm_input_exact(output_amount, input_reserves, output_reserves)
+    except ValueError:
+        # the input needed doesn't fit in a u64 swap
+        return
+    assert calculate_amm_output_exact(input_amount, input_reserves, output_reserves) >= output_amount
+    # and it's the smallest input that gets there
+    if input_amount > 1:
+        assert calculate_amm_output_exact(input_amount - 1, input_reserves, output_reserves) < output_amount
+
+
+@given(reserves, reserves)
+def test_output_round_trip(input_reserves, output_reserves):
+    input_amount = max(1, input_reserves // 1000)
+    assume(input_amount * (MAX_BPS - FEE_BPS) <= U64_MAX)
+    assume(input_reserves + input_amount <= U64_MAX)
+    output_amount = calculate_amm_output_exact(input_amount, input_reserves, output_reserves)
+    assume(output_amount > 0)
+    assert calculate_amm_input_exact(output_amount, input_reserves, output_reserves) <= input_amount
+
+
+def test_fee_overflow_boundary():
+    # the fee multiplication is the first u64 overflow on chain
+    largest = U64_MAX // (MAX_BPS - FEE_BPS)
+    assert calculate_amm_output_exact(largest, 10 ** 6, 10 ** 12) == onchain_output(largest, 10 ** 6, 10 ** 12)
+    with pytest.raises(ValueError):
+        calculate_amm_output_exact(largest + 1, 10 ** 6, 10 ** 12)
+    with pytest.raises(OverflowError):
+        onchain_output(largest + 1, 10 ** 6, 10 ** 12)
+
+
+def test_reserves_overflow_boundary():
+    input_reserves = U64_MAX - 1000
+    assert calculate_amm_output_exact(1000, input_reserves, 10 ** 12) == onchain_output(1000, input_reserves, 10 ** 12)
+    with pytest.raises(ValueError):
+        calculate_amm_output_exact(1001, input_reserves, 10 ** 12)
+    with pytest.raises(OverflowError):
+        onchain_output(1001, input_reserves, 10 ** 12)
+
+
+def test_input_overflow_raises():
+    # nearly the whole pool needs an input beyond what a u64 swap can carry
+    with pytest.raises(ValueError):
+        calculate_amm_input_exact(10 ** 18 - 1, 10 ** 18, 10 ** 18)
+
+
+def test_empty_pool_and_zero_input():
+    with pytest.raises(ValueError):
+        calculate_amm_output_exact(1, 0, 10)
+    with pytest.raises(ValueError):
+        calculate_amm_output_exact(0, 10, 10)
+    assert calculate_amm_input_exact(0, 10, 10) == 0
+
+
+@settings(max_examples=300)
+@given(
+    st.integers(min_value=10 ** 6, max_value=10 ** 18),
+    st.integers(min_value=10 ** 6, max_value=10 ** 18),
+    st.lists(st.integers(min_value=1, max_value=MAX_SWAP_INPUT), min_size=1, max_size=20),
+    st.integers(min_value=0, max_value=1000),
+)
+def test_grid_within_error_bound(input_reserves, output_reserves, input_amounts, slippage_bps):
+    input_amounts = [amount for amount in input_amounts if input_reserves + amount <= U64_MAX]
+    assume(input_amounts)
+    expected_output, min_output = calculate_amm_output_grid(
+        input_amounts, input_reserves, output_reserves, slippage_bps
+    )
+    for amount, expected, minimum in zip(input_amounts, expected_output, min_output):
+        exact = calculate_amm_output_exact(amount, input_reserves, output_reserves)
+        assert abs(int(expected) - exact) <= exact * GRID_ERROR_ULPS * 2.0 ** -53 + 1
+        # never asks for more than the program pays
+        assert int(minimum) <= apply_slippage(exact, slippage_bps)
@@ -0,0 +1,92 @@
+import asyncio
+import json
+
+from solders.pubkey import Pubkey
+from solders.rpc.requests import GetAccountInfo, GetBalance, SendRawTransaction
+
+from futarchy.constants import MAX_MULTIPLE_ACCOUNTS
+from futarchy.rpc import RpcRouter
+
+
+class FakeProvider:
+    # answers every request once release is set
+    def __init__(self):
+        self.requests = []
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def make_request_unparsed(self, body) -> str:
+        request = json.loads(body.to_json())
+        self.requests.append(request)
+        await self.release.wait()
+        if request["method"] == "getMultipleAccounts":
+            result = {"context": {"slot": 1}, "value": [None] * len(request["params"][0])}
+        else:
+            result = {"context": {"slot": 1}, "value": 0}
+        return json.dumps({"jsonrpc": "2.0", "id": request["id"], "result": result})
+
+    async def close(self):
+        pass
+
+
+async def concurrently(router, provider, body):
+    provider.release.clear()
+    calls = asyncio.gather(router.make_request_unparsed(body), router.make_request_unparsed(body))
+    await asyncio.sleep(0.01)
+    provider.release.set()
+    return await calls
+
+
+def make_router(**kwargs):
+    router = RpcRouter(["http://localhost:8899"], rate=10_000, **kwargs)
+    provider = router.endpoints[0].provider = FakeProvider()
+    return router, provider
+
+
+async def test_reads_are_coalesced():
+    router, provider = make_router()
+    await concurrently(router, provider, GetBalance(Pubkey.default()))
+    assert len(provider.requests) == 1
+    assert router.coalesced == 1
+
+
+async def test_sends_are_never_coalesced():
+    router, provider = make_router()
+    await concurrently(router, provider, SendRawTransaction(bytes(64)))
+    assert len(provider.requests) == 2
+    assert router.coalesced == 0
+
+
+async def test_cancelled_caller_doesnt_cancel_the_others():
+    router, provider = make_router()
+    provider.release.clear()
+    body = GetBalance(Pubkey.default())
+    first = asyncio.ensure_future(router.make_request_unparsed(body))
+    second = asyncio.ensure_future(router.make_request_unparsed(body))
+    await asyncio.sleep(0)
+    first.cancel()
+    await asyncio.sleep(0)
+    provider.release.set()
+    assert json.loads(await second)["result"]["value"] == 0
+    assert first.cancelled()
+    assert not router.in_flight
+
+
+async def test_stale_timer_doesnt_flush_the_next_batch():
+    router, provider = make_router(batch_window=0.2)
+    full = [
+        router.make_request_unparsed(GetAccountInfo(Pubkey.from_bytes(i.to_bytes(32, "little"))))
+        for i in range(MAX_MULTIPLE_ACCOUNTS)
+    ]
+    await asyncio.gather(*full)
+    assert len(provider.requests) == 1
+
+    await asyncio.sleep(0.1)
+    late = asyncio.ensure_future(router.make_request_unparsed(GetAccountInfo(Pubkey.default())))
+    # the full batch's timer fires here, the new batch has another 0.1s to go
+    await asyncio.sleep(0.15)
+    assert not late.done()
+    assert len(router.batches) == 1
+    await asyncio.wait_for(late, 1)
+    assert len(provider.requests) == 2
+
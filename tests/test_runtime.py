@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+from anchorpy import Wallet
+from solders.keypair import Keypair
+from solana.rpc.types import TxOpts
+
+from futarchy.runtime import AmmUpdate, Fill, SlotTick, Strategy, StrategyRuntime
+from futarchy.simulator import MarketSimulator, SimulatedProposalClient
+
+
+class Recorder(Strategy):
+    def __init__(self):
+        self.events = []
+
+    async def on_amm(self, client, event):
+        self.events.append(event)
+
+    async def on_slot(self, client, event):
+        self.events.append(event)
+
+    async def on_fill(self, client, event):
+        self.events.append(event)
+
+
+async def make_client(opts=None):
+    sim = MarketSimulator(seed=0)
+    wallet = Wallet(Keypair())
+    client = SimulatedProposalClient(sim, wallet, sim.create_proposal(), *([opts] if opts else []))
+    await client.get_proposal_info()
+    return sim, client
+
+
+@pytest.fixture
+async def setup():
+    return await make_client()
+
+
+def make_runtime(client, **kwargs):
+    runtime = StrategyRuntime([client], **kwargs)
+    recorder = Recorder()
+    runtime.register(recorder)
+    return runtime, recorder
+
+
+async def test_superseded_updates_and_ticks_are_dropped(setup):
+    sim, client = setup
+    runtime, recorder = make_runtime(client)
+    amm = sim.amms[client.pass_amm]
+    for slot in (1, 2, 3):
+        runtime.on_amm(client.pass_amm, slot, amm)
+        runtime.on_slot(slot)
+    runtime.start()
+    await runtime.drain()
+    assert [(type(event), event.slot) for event in recorder.events] == [(AmmUpdate, 3), (SlotTick, 3)]
+    assert runtime.dropped == 4
+    await runtime.stop()
+
+
+async def test_update_older_than_dispatched_is_stale(setup):
+    sim, client = setup
+    runtime, recorder = make_runtime(client)
+    amm = sim.amms[client.pass_amm]
+    runtime.start()
+    runtime.on_amm(client.pass_amm, 10, amm)
+    await runtime.drain()
+    runtime.on_amm(client.pass_amm, 5, amm)
+    # the other amm has its own key
+    runtime.on_amm(client.fail_amm, 5, sim.amms[client.fail_amm])
+    await runtime.drain()
+    assert [(event.amm, event.slot) for event in recorder.events] == [(client.pass_amm, 10), (client.fail_amm, 5)]
+    assert runtime.dropped == 1
+    await runtime.stop()
+
+
+async def test_max_slot_lag_drops_lagging_updates(setup):
+    sim, client = setup
+    runtime, recorder = make_runtime(client, max_slot_lag=5)
+    runtime.on_amm(client.pass_amm, 1, sim.amms[client.pass_amm])
+    runtime.on_amm(client.fail_amm, 8, sim.amms[client.fail_amm])
+    runtime.on_slot(10)
+    runtime.start()
+    await runtime.drain()
+    assert [(type(event), event.slot) for event in recorder.events] == [(AmmUpdate, 8), (SlotTick, 10)]
+    assert runtime.dropped == 1
+    await runtime.stop()
+
+
+async def test_fills_are_never_dropped():
+    # failures land on chain and come back as fills instead of raising in send
+    sim, client = await make_client(TxOpts(skip_preflight=True))
+    runtime, recorder = make_runtime(client, max_slot_lag=0)
+    sim.fund(client.authority, client.quote_underlying_token_mint, 10 ** 6)
+    create = await client.get_create_token_accounts_ixs()
+    mint = client.get_mint_quote_conditional_tokens_ix(10 ** 6)
+    runtime.start()
+    landed = await runtime.send(client.proposal, create + [mint], tag="mint", compute_unit_limit=400_000)
+    # nothing left to mint with, so this one fails
+    failed = await runtime.send(client.proposal, mint, tag="again", compute_unit_limit=400_000)
+    await landed
+    with pytest.raises(Exception):
+        await failed
+    # the fills are put from the futures' done callbacks
+    await asyncio.sleep(0)
+    # fills of old slots, far behind the runtime's slot
+    runtime.on_slot(sim.slot + 100)
+    for i in range(50):
+        runtime.on_fill(client.proposal, None, None, tag=i)
+    await runtime.drain()
+    fills = [event for event in recorder.events if isinstance(event, Fill)]
+    assert [fill.tag for fill in fills] == ["mint", "again"] + list(range(50))
+    assert fills[0].status is not None and fills[0].error is None
+    assert fills[1].error is not None
+    assert runtime.dropped == 0
+    await runtime.stop()
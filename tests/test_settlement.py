@@ -0,0 +1,44 @@
+from dataclasses import replace
+
+from anchorpy import Wallet
+from solders.keypair import Keypair
+from solders.pubkey import Pubkey
+
+from futarchy.client import TokenType
+from futarchy.settlement import SettlementEngine, VaultPosition
+from futarchy.simulator import MarketSimulator, SimulatedProposalClient
+from futarchy.types import VaultStatus
+
+
+async def make_positions():
+    # two finalized vaults on one underlying mint, neither underlying account exists
+    sim = MarketSimulator(seed=0)
+    wallet = Wallet(Keypair())
+    underlying_mint = Pubkey.new_unique()
+    positions = []
+    for pass_amount, fail_amount in ((5, None), (None, 7)):
+        client = SimulatedProposalClient(sim, wallet, sim.create_proposal())
+        await client.get_proposal_info()
+        vault = replace(sim.vaults[client.base_vault], status=VaultStatus.Finalized(), underlying_token_mint=underlying_mint)
+        positions.append(VaultPosition(client, TokenType.BASE, vault, pass_amount, fail_amount, None))
+    engine = SettlementEngine(sim.connection, [wallet])
+    engine.positions = {wallet.public_key: positions}
+    return engine, wallet, positions
+
+
+async def test_shared_underlying_account_is_created_once():
+    engine, wallet, _ = await make_positions()
+    plan = engine.plan()[wallet.public_key]
+    # the shared underlying account, then each vault's missing conditional account
+    assert plan.creates == 3
+    assert plan.redeems == 2
+
+
+async def test_plan_has_no_side_effects():
+    engine, wallet, positions = await make_positions()
+    before = [replace(position) for position in positions]
+    first = engine.plan()[wallet.public_key]
+    assert positions == before
+    second = engine.plan()[wallet.public_key]
+    assert (second.creates, second.redeems, second.closes) == (first.creates, first.redeems, first.closes)
+    assert [leg.ixs for leg in second.legs] == [leg.ixs for leg in first.legs]
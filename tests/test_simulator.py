@@ -0,0 +1,97 @@
+import pytest
+from anchorpy import Wallet
+from solders.keypair import Keypair
+from solders.rpc.errors import SendTransactionPreflightFailureMessage
+from solders.transaction_status import InstructionErrorCustom, TransactionErrorInstructionError
+from solana.rpc.core import RPCException
+
+from futarchy.client import OutcomeType
+from futarchy.composer import Leg, TransactionComposer
+from futarchy.settlement import SettlementEngine
+from futarchy.simulator import AMM_SWAP_SLIPPAGE_EXCEEDED, MarketSimulator, SimulatedProposalClient
+from futarchy.twap import ONE_MINUTE_IN_SLOTS
+
+SLOTS_PER_PROPOSAL = 10 * ONE_MINUTE_IN_SLOTS
+
+
+class SimulatedSettlementEngine(SettlementEngine):
+    def __init__(self, simulator: MarketSimulator, *args, **kwargs):
+        super().__init__(simulator.connection, *args, **kwargs)
+        self.simulator = simulator
+
+    def new_client(self, wallet, proposal):
+        return SimulatedProposalClient(self.simulator, wallet, proposal, self.opts)
+
+
+async def make_client():
+    # pass trades at twice the price of fail, and the oracles start at the fail
+    # price and can reach the pass price in one observation, so it passes
+    sim = MarketSimulator(seed=1)
+    dao = sim.create_dao(
+        slots_per_proposal=SLOTS_PER_PROPOSAL,
+        twap_initial_observation=10 ** 9,
+        twap_max_observation_change_per_update=10 ** 9,
+    )
+    proposal = sim.create_proposal(dao, pass_reserves=(10 ** 12, 2 * 10 ** 9), fail_reserves=(10 ** 12, 10 ** 9))
+    client = SimulatedProposalClient(sim, Wallet(Keypair()), proposal)
+    await client.get_proposal_info()
+    sim.fund(client.authority, client.quote_underlying_token_mint, 10 ** 9)
+    await client.create_token_accounts()
+    await client.send_ix(client.get_mint_quote_conditional_tokens_ix(10 ** 8))
+    return sim, client
+
+
+def assert_slippage_exceeded(error: RPCException):
+    message = error.args[0]
+    assert isinstance(message, SendTransactionPreflightFailureMessage)
+    assert isinstance(message.data.err, TransactionErrorInstructionError)
+    assert message.data.err.err == InstructionErrorCustom(AMM_SWAP_SLIPPAGE_EXCEEDED)
+
+
+async def test_swap():
+    sim, client = await make_client()
+    ix, min_output = await client.get_buy_pass_ix(10 ** 7, return_min_out=True)
+    signature = await client.send_ix(ix)
+    assert sim.statuses[signature].err is None
+    assert sim.balance(client.authority, client.base_pass_token_mint) >= min_output > 0
+    assert sim.balance(client.authority, client.quote_pass_token_mint) == 9 * 10 ** 7
+
+
+async def test_slippage_failure_is_a_preflight_error():
+    sim, client = await make_client()
+    amm = await client.get_amm(client.pass_amm)
+    ix = client.get_buy_ix(10 ** 7, OutcomeType.PASS, amm, 0)
+    # someone else's buy moves the price first
+    sim.swap(client.pass_amm, True, 10 ** 8)
+    statuses = len(sim.statuses)
+
+    with pytest.raises(RPCException) as raised:
+        await client.send_ix(ix, compute_unit_limit=None)
+    assert_slippage_exceeded(raised.value)
+    with pytest.raises(RPCException) as raised:
+        await TransactionComposer(client).send([Leg(ix)])
+    assert_slippage_exceeded(raised.value)
+    # neither transaction was sent
+    assert len(sim.statuses) == statuses
+    assert sim.balance(client.authority, client.quote_pass_token_mint) == 10 ** 8
+
+
+async def test_settlement():
+    sim, client = await make_client()
+    await client.send_ix(await client.get_buy_pass_ix(10 ** 7))
+    base_pass = sim.balance(client.authority, client.base_pass_token_mint)
+    for _ in range(10):
+        sim.advance(ONE_MINUTE_IN_SLOTS)
+        sim.crank(client.pass_amm)
+        sim.crank(client.fail_amm)
+    assert sim.finalize_proposal(client.proposal)
+
+    engine = SimulatedSettlementEngine(sim, [client.wallet], [client.proposal])
+    results = await engine.settle(compute_unit_price=0)
+    await engine.stop()
+    assert all(isinstance(signatures, list) for signatures in results.values())
+    # the pass tokens redeem one for one, the fail tokens for nothing
+    for mint in (client.base_pass_token_mint, client.base_fail_token_mint, client.quote_pass_token_mint, client.quote_fail_token_mint):
+        assert sim.balance(client.authority, mint) == 0
+    assert sim.balance(client.authority, client.base_underlying_token_mint) == base_pass
+    assert sim.balance(client.authority, client.quote_underlying_token_mint) == 10 ** 9 - 10 ** 7